@@ -1,16 +1,21 @@
 from lib.umodbus.serial import ModbusRTU
-from machine import Pin, lightsleep, Timer
+from machine import Pin, lightsleep
 import time
 from modules import analog_sensor, sht30_sensor
+from modules.valves import ValveScheduler, OPEN, CLOSE
+from modules.io_map import IOMap, Pulse, Command
+from modules.runtime import Runtime
+from modules.counters import Counters, make_counter
+
+try:
+    # firmware of the ASYNC board variant
+    import asyncio
+except ImportError:
+    asyncio = None
 
 # RTU Client/Slave setup
 
-# --- MODIFICATION: Global variables for the counters ---
-counter_1 = 0
-counter_2 = 0
-last_pulse_time_1 = 0
-last_pulse_time_2 = 0
-DEBOUNCE_MS_COUNTERS = 150 # Ignore pulses faster than 150ms for counters
+DEBOUNCE_MS_COUNTERS = 150 # Default, configurable per channel in HREG 110/112
 
 print("Starting ISURNODE RTU slave...")
 
@@ -35,7 +40,10 @@ server = ModbusRTU(
     ctrl_pin=Pin("PA4"),  
     uart_id=uart_id,
     rx_led_pin=rx_led, # New argument for RX LED
-    tx_led_pin=tx_led  # New argument for TX LED
+    tx_led_pin=tx_led, # New argument for TX LED
+    # Frames are detected by the RX idle interrupt, with asyncio they are
+    # awaited on the UART stream instead
+    use_irq=asyncio is None
 )
 
 # --- Init SHT30 sensor ---
@@ -47,6 +55,16 @@ except Exception as e:
 
 analog_module = analog_sensor.AnalogInput()
 
+# MCU pin wired to ALERT/RDY of the ADS1115. With None the end of each
+# conversion is timed by a Timer instead.
+ADS_ALERT_PIN = None
+# background sampling period of the analog channels and scans averaged
+ANALOG_PERIOD_MS = 2000
+ANALOG_WINDOW = 8
+# measurements per second of the SHT30 and period the latest one is fetched
+SHT30_MPS = 0.5
+SHT30_PERIOD_MS = 5000
+
 re = Pin("PA5", Pin.OUT)
 tps_mode = Pin("PB14", Pin.OUT)
 tps_en = Pin("PB13", Pin.OUT)
@@ -83,36 +101,68 @@ ev3_in1.off()
 ev3_in2.off()
 
 # --- MODBUS MAP REGISTERS ---
+# Contiguous ranges live in compact register banks
+server.add_bank('IREGS', 0, 10)
+server.add_bank('ISTS', 6, 2)
+server.add_bank('HREGS', 100, 2)
+server.add_bank('HREGS', 200, 8)
+server.add_bank('IREGS', 20, 4)
+server.add_bank('IREGS', 30, 6)
+server.add_bank('HREGS', 110, 4)
+server.add_bank('IREGS', 40, 16)
+
 # 4 analog sensors
 for i in range(4):
     server.add_ireg(address=i, value=i)
 
-server.add_ireg(address=4, value=0)  # Counter 1
-server.add_ireg(address=5, value=0)  # Counter 2
-
-server.add_ist(address=6, value=False) #State 1
-server.add_ist(address=7, value=False) #State 2
+# Counters (IREG 4/5) and digital input states (IST 6/7) are bound to
+# their live values below, they are only evaluated when a master reads them
 
 # SHT30
 server.add_ireg(address=8, value=0)  # Temperature 
 server.add_ireg(address=9, value=0) #Humidity
 
-# Command register
-server.add_hreg(address=100, value=0)  # Write '1' to trigger ADC
-server.add_hreg(address=101, value=0)  # Write '1' to trigger SHT30
-
-# Valve outputs
-for i in range(200, 208):
-    server.add_hreg(address=i, value=0)
+# Command registers (100-101) and valve outputs (200-207) are created by
+# the I/O map below
+
+# The analog channels are scanned in the background, each result in mV is
+# published to IREG 0-3 when its conversion completes. The SHT30 measures
+# in its periodic mode, the latest values are fetched by a task. HREG 100/101
+# still trigger a read.
+analog_scan = analog_sensor.AnalogScan(analog_module, server, address=0,
+                                       rdy_pin=ADS_ALERT_PIN)
+# last, mean, min and max of the last scans of channel n at IREG 40 + 4 * n
+analog_history = analog_sensor.AnalogHistory(analog_scan, server, address=40,
+                                             window=ANALOG_WINDOW)
+
+# temperature and humidity x100 at IREG 8/9
+sht30_periodic = None
+if sht30 is not None:
+    sht30_periodic = sht30_sensor.SHT30Periodic(sht30, server, address=8,
+                                                mps=SHT30_MPS)
+
+# The main loop only runs when a frame, an input edge or a task is pending,
+# otherwise the MCU is in lightsleep. Awake/asleep time is in IREG 20-23.
+runtime = Runtime(server)
+runtime.add_registers(20)
+runtime.add_task(analog_scan.start, period_ms=ANALOG_PERIOD_MS)
+# conversions are timed by the system tick, which stops in lightsleep
+runtime.add_guard(analog_scan.busy)
+if sht30_periodic is not None:
+    runtime.add_task(sht30_periodic.poll, period_ms=SHT30_PERIOD_MS)
 
 print("Registers set up complete.")
 
+power_event = False
+
 def power_fail_handler(pin):
     """
     Interrupt Service Routine (ISR) for power failure.
-    This function will be executed when power_good pin goes low.
+    This function will be executed when power_good pin changes. Handling
+    the event writes to flash and sleeps, neither of which may happen in an
+    ISR, so it only flags the event for on_power_event() in the main loop.
     """
-    global last_interrupt_time
+    global last_interrupt_time, power_event
 
     current_time = time.ticks_ms()
     
@@ -120,12 +170,26 @@ def power_fail_handler(pin):
         
         return
     
-    if pin.value() == 0:
+    power_event = True
+    runtime.notify()
+
+def on_power_event():
+    """
+    Event task of the main loop handling a change of power_good.
+    """
+    global power_event
+
+    if not power_event:
+        return
+    power_event = False
+
+    if power_good.value() == 0:
     
         print("External power failed, switching to internal supercapacitor")
         server._itf._ctrlPin.off()
         re.on()
-        pin.irq(trigger=Pin.IRQ_RISING, handler=power_fail_handler)
+        counters.save()
+        power_good.irq(trigger=Pin.IRQ_RISING, handler=power_fail_handler)
         time.sleep_ms(100)
         lightsleep()
         
@@ -134,7 +198,7 @@ def power_fail_handler(pin):
         re.off()
         print("Woke up: External power restored.")
         
-def blinky_LED(timer):
+def blinky_LED():
     
     num_micro_pulses = 10
     pause_pulses_ms = 15
@@ -145,174 +209,84 @@ def blinky_LED(timer):
         time.sleep_ms(pause_pulses_ms)
 
 
-# --- Interrupt handler functions for the counters ---
-def pulse_counter_1_handler(pin):
-    """ISR to increment counter 1 with debounce."""
-    global counter_1, last_pulse_time_1
-    
-    current_time = time.ticks_ms()
-    # If the time since the last pulse is too short, it's a bounce. Ignore it.
-    if time.ticks_diff(current_time, last_pulse_time_1) < DEBOUNCE_MS_COUNTERS:
-        return
-        
-    # If enough time has passed, it's a valid pulse.
-    last_pulse_time_1 = current_time
-    counter_1 += 1
-
-def pulse_counter_2_handler(pin):
-    """ISR to increment counter 2 with debounce."""
-    global counter_2, last_pulse_time_2
-
-    current_time = time.ticks_ms()
-    # If the time since the last pulse is too short, it's a bounce. Ignore it.
-    if time.ticks_diff(current_time, last_pulse_time_2) < DEBOUNCE_MS_COUNTERS:
-        return
 
-    # If enough time has passed, it's a valid pulse.
-    last_pulse_time_2 = current_time
-    counter_2 += 1
-    
-    
 #Power good pin indicator with interrupt
 power_good = Pin('PB2', Pin.IN, Pin.PULL_UP)
 blinky = Pin('PB12', Pin.OUT)
 #power_good.irq(trigger=Pin.IRQ_FALLING, handler=power_fail_handler)
+#runtime.add_task(on_power_event)
 
-# --- Setup pins and interrupts for the counters ---
+# --- Setup the pulse counters ---
 print("Setting up pulse counters...")
-# We use PULL_DOWN to ensure the state is 0 if nothing is connected.
-pin_counter_1 = Pin('PB1', Pin.IN, Pin.PULL_DOWN)
-pin_counter_2 = Pin('PB5', Pin.IN, Pin.PULL_DOWN)
-
-# Every time the pin rises from 0V to 3.3V (rising edge), the handler is called.
-pin_counter_1.irq(trigger=Pin.IRQ_RISING, handler=pulse_counter_1_handler)
-pin_counter_2.irq(trigger=Pin.IRQ_RISING, handler=pulse_counter_2_handler)
+# PB1 and PB5 are LPTIM inputs, but the contacts bounce for milliseconds and
+# the LPTIM input filter only rejects glitches of 244 us. With a debounce
+# time the rising edges are counted from the pin interrupt, with a debounce
+# of 0 make_counter() counts them in hardware with the LPTIM.
+counter_1 = make_counter('PB1', debounce_ms=DEBOUNCE_MS_COUNTERS)
+counter_2 = make_counter('PB5', debounce_ms=DEBOUNCE_MS_COUNTERS)
+
+# 32 bit values in IREG 30/31 and 32/33 (high word first), saved to flash
+# at most every 10 minutes if they changed and restored at boot
+counters = Counters([counter_1, counter_2], path='/flash/counters.dat',
+                    save_every=60, rate_window=7, ticks_ms=runtime.ticks)
+counters.load()
+counters.add_registers(server, 30)
+# pulses per minute over the last minute in IREG 34/35
+counters.add_rate_registers(server, 34)
+# debounce ms and edge (1 rising, 2 falling, 3 both) in HREG 110/111, 112/113
+counters.add_config_registers(server, 110)
+runtime.add_task(counters.poll, period_ms=10000)
 print("Pulse counters ready.")
 
-#Set Blinky blinking.
-tim = Timer(-1)
-tim.init(period=5000, mode=Timer.PERIODIC, callback=blinky_LED)
-
-# --- Pulse generator helper ---
-def pulse_ev(pin1, pin2, duration_ms=100):
-    """Generates a pulse in driver."""
-    print(f"Enabling pulse {pin1} y {pin2} for {duration_ms}ms...")
-    pin1.on()
-    pin2.off()
-    time.sleep_ms(duration_ms)
-    pin1.off()
-    pin2.off()
-    print("Pulse finished.")
+# IREG 4/5 keep the low 16 bits for existing masters
+server.add_binding('IREGS', 4, counter_1.value)
+server.add_binding('IREGS', 5, counter_2.value)
+server.add_binding('ISTS', 6, digital_in_1)
+server.add_binding('ISTS', 7, digital_in_2)
 
+#Set Blinky blinking.
+runtime.add_task(blinky_LED, period_ms=5000)
+
+# --- Valve pulses run from timers, Modbus is served while a valve is driven ---
+valves = ValveScheduler([(ev0_in1, ev0_in2),
+                         (ev1_in1, ev1_in2),
+                         (ev2_in1, ev2_in2),
+                         (ev3_in1, ev3_in2)])
+
+def read_adc_command(value):
+    # the results are published to IREG 0-3 as the conversions complete
+    if not analog_scan.start():
+        print("  ADC scan already running")
+
+def read_sht_command(value):
+    # the sensor measures on its own, this fetches its latest measurement
+    if sht30_periodic is None or not sht30_periodic.poll():
+        print("  SHT30: no new measurement")
+        return
+    print(f"  SHT30: Temp={sht30_periodic.temperature}/100 C , Hum={sht30_periodic.humidity}/100 % ")
+
+# --- Register to action map, writing '1' runs the action and clears it ---
+io_map = IOMap(server, valves, (
+    Command(100, read_adc_command),     # Trigger ADC
+    Command(101, read_sht_command),     # Trigger SHT30
+    Pulse(200, valve=0, direction=OPEN),
+    Pulse(201, valve=0, direction=CLOSE),
+    Pulse(202, valve=1, direction=OPEN),
+    Pulse(203, valve=1, direction=CLOSE),
+    Pulse(204, valve=2, direction=OPEN),
+    Pulse(205, valve=2, direction=CLOSE),
+    Pulse(206, valve=3, direction=OPEN),
+    Pulse(207, valve=3, direction=CLOSE),
+))
+
+
+# Valve pulses are timed by the system tick, which stops in lightsleep
+runtime.add_guard(valves.busy)
 
 # --- MAIN LOOP ---
-while True:
-        
-    server.set_ireg(address=4, value=counter_1)
-    server.set_ireg(address=5, value=counter_2)
-    
-    state_1 = bool(digital_in_1.value())
-    server.set_ist(address=6, value=state_1)
-    state_2 = bool(digital_in_2.value())
-    server.set_ist(address=7, value=state_2)
-            
-    server.process()
-    
-    read_adc = server.get_hreg(100)
-    read_sht = server.get_hreg(101)
-    open_ev0 = server.get_hreg(200)
-    close_ev0 = server.get_hreg(201)
-    open_ev1 = server.get_hreg(202)
-    close_ev1 = server.get_hreg(203)
-    open_ev2 = server.get_hreg(204)
-    close_ev2 = server.get_hreg(205)
-    open_ev3 = server.get_hreg(206)
-    close_ev3 = server.get_hreg(207)
-    
-    if open_ev0 == 1:
-        print("Pulse open EV0")
-        pulse_ev(ev0_in1, ev0_in2)
-        server.set_hreg(address=200, value=0)
-        server._itf._uart.read()  # Clears buffer
-
-    if close_ev0 == 1:
-        print("Pulse close EV0")
-        pulse_ev(ev0_in2, ev0_in1)
-        server.set_hreg(address=201, value=0)
-        server._itf._uart.read()  # Clears buffer
-
-    if open_ev1 == 1:
-        print("Pulse open EV1")
-        pulse_ev(ev1_in1, ev1_in2)
-        server.set_hreg(address=202, value=0)
-        server._itf._uart.read()  # Clears buffer
-        
-    if close_ev1 == 1:
-        print("Pulse close EV1")
-        pulse_ev(ev1_in2, ev1_in1)
-        server.set_hreg(address=203, value=0)
-        server._itf._uart.read()  # Clears buffer
-
-    if open_ev2 == 1:
-        print("Pulse open EV2")
-        pulse_ev(ev2_in1, ev2_in2)
-        server.set_hreg(address=204, value=0)
-        server._itf._uart.read()  # Clears buffer
-
-    if close_ev2 == 1:
-        print("Pulse close EV2")
-        pulse_ev(ev2_in2, ev2_in1)
-        server.set_hreg(address=205, value=0)
-        server._itf._uart.read()  # Clears buffer
-        
-    if open_ev3 == 1:
-        print("Pulse open EV3")
-        pulse_ev(ev3_in1, ev3_in2)
-        server.set_hreg(address=206, value=0)
-        server._itf._uart.read()  # Clears buffer
-
-    if close_ev3 == 1:
-        print("Pulse close EV3")
-        pulse_ev(ev3_in2, ev3_in1)
-        server.set_hreg(address=207, value=0)
-        server._itf._uart.read()  # Clears buffer
-
-    if read_adc == 1:
-
-        for i in range(4):
-            # Read ADC value in mV 
-            adc_mV = int(analog_module.read_analog(i)*1000)
-
-            # Update input registers
-            server.set_ireg(address=i, value=adc_mV)
-            print(f"  ADC[{i}] = {adc_mV}")
-
-        server.set_hreg(address=100, value=0)
-        server._itf._uart.read()
-
-    if read_sht == 1:
-
-        try:
-            #Read SHT30 data
-            sht30_data = sht30.read_data()
-            temp_int = int(sht30_data['temperature'] * 100)
-            hum_int = int(sht30_data['humidity'] * 100)
-
-            # Update input registers
-            server.set_ireg(address=8, value=temp_int)
-            server.set_ireg(address=9, value=hum_int)
-            print(f"  SHT30: Temp={sht30_data['temperature']:.2f}C , Hum={sht30_data['humidity']:.2f}% ")
-            server.set_hreg(address=101, value=0)
-            
-        except Exception as e:
-            
-            print(f"Error reading SHT30 sensor: {e}")
-
-        server._itf._uart.read()  # Clears buffer
-
-    time.sleep_ms(100)
-
-
-
-
-
+# writes to mapped registers run their action from within process()
+if asyncio is None:
+    runtime.run()
+else:
+    # Modbus service and the tasks run as cooperative asyncio tasks
+    asyncio.run(runtime.run_async())
@@ -0,0 +1,42 @@
+# Compare the pure Python and the native CRC16 of umodbus on the unix port.
+#
+# Build the unix port with the board's user C modules, then run from this
+# directory:
+#
+#   make -C ports/unix USER_C_MODULES=../stm32/boards/ISURNODE/cmodules
+#   ../../../../unix/build-standard/micropython crc16.py
+import sys
+import time
+
+sys.path.append((sys.path[0] or ".") + "/../frozen_code")
+
+from lib.umodbus.functions import crc16_modbus as crc16_python
+
+try:
+    from _umodbus import crc16_modbus as crc16_native
+except ImportError:
+    crc16_native = None
+
+
+def run(name, crc16, buf, length, n):
+    t = time.ticks_us()
+    for _ in range(n):
+        crc16(buf, 0xFFFF, 0, length)
+    dt = time.ticks_diff(time.ticks_us(), t)
+    print("{:7} {:4} bytes: {:8.2f} us/frame".format(name, length, dt / n))
+
+
+def main():
+    buf = bytearray(range(256))
+    # request, 125 register FC03 response, longest RTU frame
+    for length in (6, 253, 254):
+        run("python", crc16_python, buf, length, 2000)
+        if crc16_native is None:
+            print("native  not available, build with the _umodbus module")
+        else:
+            run("native", crc16_native, buf, length, 2000)
+            if crc16_native(buf, 0xFFFF, 0, length) != crc16_python(buf, 0xFFFF, 0, length):
+                print("MISMATCH")
+
+
+main()
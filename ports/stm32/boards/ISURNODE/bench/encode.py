@@ -0,0 +1,73 @@
+# Time and heap use of encoding FC03 responses with 1, 10 and 125 registers.
+#
+# "struct" is the former format string encoder plus a new ADU bytearray per
+# frame, "list" encodes a value list in place into the reusable transmit
+# buffer and "bank" packs the registers straight from a register bank.
+#
+# Run on the unix port from this directory:
+#
+#   ../../../../unix/build-standard/micropython encode.py
+import gc
+import struct
+import sys
+import time
+
+sys.path.append((sys.path[0] or ".") + "/../frozen_code")
+
+from lib.umodbus import functions
+from lib.umodbus.bank import RegisterBank
+from lib.umodbus.functions import crc16_modbus
+
+N = 1000
+
+
+def encode_struct(buf, values, bank, quantity):
+    pdu = struct.pack(">BB" + "h" * quantity, 3, quantity * 2, *values)
+    adu = bytearray()
+    adu.append(1)
+    adu.extend(pdu)
+    adu.extend(struct.pack("<H", crc16_modbus(adu)))
+    return len(adu)
+
+
+def encode_list(buf, values, bank, quantity):
+    buf[0] = 1
+    length = 1 + functions.response_into(buf, 1, 3, 0, quantity, None, values)
+    crc = crc16_modbus(buf, 0xFFFF, 0, length)
+    buf[length] = crc & 0xFF
+    buf[length + 1] = crc >> 8
+    return length + 2
+
+
+def encode_bank(buf, values, bank, quantity):
+    buf[0] = 1
+    buf[1] = 3
+    buf[2] = quantity * 2
+    length = 3 + bank.pack_into(buf, 3, 0, quantity)
+    crc = crc16_modbus(buf, 0xFFFF, 0, length)
+    buf[length] = crc & 0xFF
+    buf[length + 1] = crc >> 8
+    return length + 2
+
+
+def run(name, encode, quantity):
+    buf = bytearray(256)
+    values = [i * 100 for i in range(quantity)]
+    bank = RegisterBank("HREGS", 0, quantity, values)
+
+    gc.collect()
+    gc.disable()
+    mem = gc.mem_alloc()
+    t = time.ticks_us()
+    for _ in range(N):
+        encode(buf, values, bank, quantity)
+    dt = time.ticks_diff(time.ticks_us(), t)
+    mem = gc.mem_alloc() - mem
+    gc.enable()
+    print("{:6} {:3} regs: {:8.2f} us/frame {:6} bytes/frame".format(name, quantity, dt / N, mem // N))
+
+
+for quantity in (1, 10, 125):
+    run("struct", encode_struct, quantity)
+    run("list", encode_list, quantity)
+    run("bank", encode_bank, quantity)
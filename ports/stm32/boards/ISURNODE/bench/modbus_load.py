@@ -0,0 +1,187 @@
+# Load generator for the umodbus RTU slave on the unix port.
+#
+# A master sends requests of one function code or a mix of them to a
+# ModbusRTU slave running in interrupt mode. Both sides are on fake UARTs of
+# the test fakes, joined in process: a request is served by the slave before
+# the master's write() returns, so no serial timing is involved except the
+# short end of frame delays of the chosen baudrate.
+#
+# Reported per run:
+#   req/s       complete master requests per second
+#   rtt p50/p99 round trip of a master request in us
+#   srv p50/p99 time of the slave's process() per request in us
+#   alloc/req   heap bytes allocated per request by master and slave
+#   srv alloc   heap bytes of that allocated by the slave
+#
+# Run on the unix port from this directory, optionally with the name of a
+# single run and the number of requests:
+#
+#   ../../../../unix/build-standard/micropython modbus_load.py [run] [count]
+import gc
+import sys
+import time
+
+base = sys.path[0] or "."
+sys.path.append(base + "/../tests")
+
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import Link
+from lib.umodbus.serial import ModbusRTU, Serial
+
+BAUDRATE = 1000000
+UNIT = 1
+N = 2000
+# requests between heap collections, the heap must hold them all
+BATCH = 100
+
+
+def fc01(master):
+    master.read_coils(UNIT, 0, 16)
+
+
+def fc02(master):
+    master.read_discrete_inputs(UNIT, 0, 16)
+
+
+def fc03(master):
+    master.read_holding_registers(UNIT, 0, 10)
+
+
+def fc04(master):
+    master.read_input_registers(UNIT, 0, 10)
+
+
+def fc05(master):
+    master.write_single_coil(UNIT, 3, True)
+
+
+def fc06(master):
+    master.write_single_register(UNIT, 3, 1234)
+
+
+def fc15(master):
+    master.write_multiple_coils(UNIT, 0, [1, 0, 1, 1, 0, 0, 1, 0])
+
+
+def fc16(master):
+    master.write_multiple_registers(UNIT, 0, [1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+
+
+# a polling master reads far more often than it writes
+RUNS = (
+    ("fc01", (fc01,)),
+    ("fc02", (fc02,)),
+    ("fc03", (fc03,)),
+    ("fc04", (fc04,)),
+    ("fc05", (fc05,)),
+    ("fc06", (fc06,)),
+    ("fc15", (fc15,)),
+    ("fc16", (fc16,)),
+    ("read", (fc01, fc02, fc03, fc04)),
+    ("write", (fc05, fc06, fc15, fc16)),
+    ("poll", (fc03, fc04, fc03, fc04, fc02, fc03, fc04, fc06)),
+)
+
+
+def make_slave():
+    slave = ModbusRTU(addr=UNIT, uart_id=1, baudrate=BAUDRATE, use_irq=True)
+    slave.add_bank("COILS", 0, 16)
+    slave.add_bank("ISTS", 0, 16)
+    slave.add_bank("HREGS", 0, 16)
+    slave.add_bank("IREGS", 0, 16, value=list(range(16)))
+    return slave
+
+
+def percentile(samples, p):
+    return samples[(len(samples) - 1) * p // 100]
+
+
+def timed(master, link, requests, count):
+    # gc.mem_alloc() walks the heap, it is not called between the requests
+    rtt = []
+    srv = []
+    total_us = 0
+    done = 0
+    while done < count:
+        gc.collect()
+        gc.disable()
+        for idx in range(done, min(done + BATCH, count)):
+            request = requests[idx % len(requests)]
+            start = time.ticks_us()
+            request(master)
+            dt = time.ticks_diff(time.ticks_us(), start)
+            total_us += dt
+            rtt.append(dt)
+            srv.append(link.process_us)
+            done += 1
+        gc.enable()
+
+    rtt.sort()
+    srv.sort()
+    return count * 1000000 / total_us, rtt, srv
+
+
+def allocated(master, slave, requests, count):
+    process = slave.process
+    srv_alloc = [0]
+
+    def measured_process():
+        mem = gc.mem_alloc()
+        result = process()
+        srv_alloc[0] += gc.mem_alloc() - mem
+        return result
+
+    slave.process = measured_process
+
+    alloc = 0
+    gc.collect()
+    gc.disable()
+    for idx in range(count):
+        mem = gc.mem_alloc()
+        requests[idx % len(requests)](master)
+        alloc += gc.mem_alloc() - mem
+        if idx % BATCH == BATCH - 1:
+            gc.enable()
+            gc.collect()
+            gc.disable()
+    gc.enable()
+
+    slave.process = process
+    return alloc // count, srv_alloc[0] // count
+
+
+def run(name, requests, count):
+    slave = make_slave()
+    master = Serial(uart_id=2, baudrate=BAUDRATE)
+    link = Link(master, slave)
+
+    # warm up, e.g. the cached transmit views
+    for request in requests:
+        request(master)
+
+    rate, rtt, srv = timed(master, link, requests, count)
+    alloc, srv_alloc = allocated(master, slave, requests, len(requests) * 10)
+
+    print("{:6} {:9.0f} {:8} {:8} {:8} {:8} {:9} {:9}".format(
+        name, rate,
+        percentile(rtt, 50), percentile(rtt, 99),
+        percentile(srv, 50), percentile(srv, 99),
+        alloc, srv_alloc))
+
+
+def main():
+    only = sys.argv[1] if len(sys.argv) > 1 else None
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else N
+
+    print("{:6} {:>9} {:>8} {:>8} {:>8} {:>8} {:>9} {:>9}".format(
+        "run", "req/s", "rtt p50", "rtt p99", "srv p50", "srv p99",
+        "alloc/req", "srv alloc"))
+    for name, requests in RUNS:
+        if only is None or only == name:
+            run(name, requests, count)
+
+
+main()
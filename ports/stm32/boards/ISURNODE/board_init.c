@@ -0,0 +1,93 @@
+/*
+ * This file is part of the MicroPython project, http://micropython.org/
+ *
+ * The MIT License (MIT)
+ *
+ * Copyright (c) 2025 Isurki Tecnica
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+ * THE SOFTWARE.
+ */
+
+#include "py/mphal.h"
+#include "boardctrl.h"
+
+void ISURNODE_board_early_init(void) {
+    #if defined(STM32L4)
+    // LPUART1 carries Modbus. In Stop mode it can only run from HSI16, which
+    // the LPUART requests by itself, so HSI16 is kept ready for it.
+    __HAL_RCC_HSI_ENABLE();
+    while (!__HAL_RCC_GET_FLAG(RCC_FLAG_HSIRDY)) {
+    }
+    #endif
+}
+
+void ISURNODE_board_end_soft_reset(boardctrl_state_t *state) {
+    #if defined(STM32L4)
+    // The UARTs are deinitialised by now. The baudrate check of the UART
+    // driver assumes PCLK1, so LPUART1 is returned to it for the next UART().
+    __HAL_RCC_LPUART1_CONFIG(RCC_LPUART1CLKSOURCE_PCLK1);
+    #endif
+    boardctrl_end_soft_reset(state);
+}
+
+#if defined(STM32L4)
+// Move the running LPUART1 from PCLK1 to HSI16, keeping its baudrate. This
+// is done before the first Stop mode instead of at start-up, as the UART
+// driver checks the baudrate against PCLK1. Afterwards print(uart) reports a
+// wrong baudrate and UART.init() is not supported until a soft reset.
+static void lpuart_clock_to_hsi(void) {
+    if (__HAL_RCC_GET_LPUART1_SOURCE() == RCC_LPUART1CLKSOURCE_HSI) {
+        return;
+    }
+    if (!(LPUART1->ISR & USART_ISR_TC) || (LPUART1->ISR & USART_ISR_BUSY)) {
+        // a character is on the line, try again before the next Stop mode
+        return;
+    }
+    uint32_t pclk1 = HAL_RCC_GetPCLK1Freq();
+    LPUART1->CR1 &= ~USART_CR1_UE;
+    __HAL_RCC_LPUART1_CONFIG(RCC_LPUART1CLKSOURCE_HSI);
+    LPUART1->BRR = (uint32_t)((uint64_t)LPUART1->BRR * HSI_VALUE / pclk1);
+    LPUART1->CR1 |= USART_CR1_UE;
+}
+#endif
+
+void ISURNODE_board_lpuart_wakeup(int enable) {
+    #if defined(STM32L4)
+    if (!(LPUART1->CR1 & USART_CR1_UE)) {
+        // Modbus is not running, nothing to wake up for
+        return;
+    }
+
+    if (enable) {
+        // wake up from Stop mode on the start bit of the next character
+        lpuart_clock_to_hsi();
+        LPUART1->ICR = USART_ICR_WUCF;
+        LPUART1->CR3 = (LPUART1->CR3 & ~USART_CR3_WUS) | USART_CR3_WUS_1 | USART_CR3_WUFIE;
+        LPUART1->CR1 |= USART_CR1_UESM;
+    } else {
+        // the byte itself is handled by the RXNE interrupt, the wake-up flag
+        // must not raise another interrupt once the IRQs are enabled again
+        LPUART1->CR1 &= ~USART_CR1_UESM;
+        LPUART1->CR3 &= ~USART_CR3_WUFIE;
+        LPUART1->ICR = USART_ICR_WUCF;
+    }
+    #else
+    (void)enable;
+    #endif
+}
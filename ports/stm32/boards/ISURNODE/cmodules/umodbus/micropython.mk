@@ -0,0 +1,4 @@
+UMODBUS_MOD_DIR := $(USERMOD_DIR)
+
+# Native helpers used by the frozen umodbus package when available.
+SRC_USERMOD += $(UMODBUS_MOD_DIR)/modumodbus.c
@@ -120,8 +120,15 @@ class ADS1115(object):
     __voltageRange = 2048
     __measureMode = ADS1115_SINGLE
     
-    def __init__(self, address = __ADS1115_DEFAULT_ADDR, i2c = None):
+    def __init__(self, address = __ADS1115_DEFAULT_ADDR, i2c = None, cached = False):
         self.__address = address
+        # with cached set the config register is kept in a shadow copy, single
+        # shot settings are only written together with the start of the next
+        # conversion
+        self.__cached = cached
+        self.__confReg = __ADS1115_REG_RESET_VAL & 0x7FFF
+        # number of I2C transactions issued to the ADS1115
+        self.transactions = 0
         if i2c is None:
             try:
                 i2c = I2C(0)
@@ -267,7 +274,8 @@ class ADS1115(object):
         self.setCompareChannels((ADS1115_COMP_0_GND + ADS1115_COMP_INC) * channel)
         
     def isBusy(self):
-        currentConfReg = self.__getConfReg()
+        # the OS bit is only known by the device
+        currentConfReg = self.__readADS1115(__ADS1115_CONFIG_REG)
         return not((currentConfReg>>15) & 1)
     
     def startSingleMeasurement(self):
@@ -321,10 +329,21 @@ class ADS1115(object):
     def clearAlert(self):
         self.__readADS1115(__ADS1115_CONV_REG)    
     
+    def getConfig(self):
+        return self.__getConfReg()
+
     def __setConfReg(self, regVal):
+        if self.__cached:
+            self.__confReg = regVal & 0x7FFF
+            # in single shot mode the new settings go out with the start bit,
+            # a reset or continuous mode needs the write right away
+            if not (regVal & 0x8000) and (regVal & ADS1115_SINGLE):
+                return
         self.__writeADS1115(__ADS1115_CONFIG_REG, regVal)
     
     def __getConfReg(self):
+        if self.__cached:
+            return self.__confReg
         return self.__readADS1115(__ADS1115_CONFIG_REG)
         
     def __getConvRate(self):
@@ -356,9 +375,11 @@ class ADS1115(object):
             sleep_ms(2)
     
     def __writeADS1115(self, reg, val):
+        self.transactions += 1
         self.__i2c.writeto_mem(self.__address, reg, self.__toBytearray(val))
         
     def __readADS1115(self, reg):
+        self.transactions += 1
         regVal = self.__i2c.readfrom_mem(self.__address, reg, 2)
         return self.__bytesToInt(regVal)
     
@@ -371,6 +392,6 @@ class ADS1115(object):
         return intVal
 
 class ADS1015(ADS1115):
-     def __init__(self, address = __ADS1115_DEFAULT_ADDR, i2c = None):
-        super().__init__(address, i2c)
+     def __init__(self, address = __ADS1115_DEFAULT_ADDR, i2c = None, cached = False):
+        super().__init__(address, i2c, cached)
    
@@ -37,6 +37,17 @@ class SHT30:
     ENABLE_HEATER_CMD = b'\x30\x6D'
     DISABLE_HEATER_CMD = b'\x30\x66'
 
+    # Periodic acquisition, repeatability = High, by measurements per second
+    PERIODIC_CMDS = {
+        0.5: b'\x20\x32',
+        1: b'\x21\x30',
+        2: b'\x22\x36',
+        4: b'\x23\x34',
+        10: b'\x27\x37',
+    }
+    FETCH_CMD = b'\xE0\x00'
+    BREAK_CMD = b'\x30\x93'
+
     def __init__(self, i2c_addr=DEFAULT_I2C_ADDRESS, i2c_device=None, delta_temp=0, delta_hum=0):
         self.i2c = i2c_device
         self.i2c_addr = i2c_addr
@@ -171,6 +182,77 @@ class SHT30:
         return t_int, t_dec, h_int, h_dec
 
 
+    def start_periodic(self, mps=1):
+        """
+        Start the periodic acquisition mode, the sensor measures mps times per
+        second on its own until stop_periodic() is called.
+        Measurements are read with fetch().
+        """
+        cmd = SHT30.PERIODIC_CMDS.get(mps)
+        if cmd is None:
+            raise ValueError('mps must be one of {}'.format(sorted(SHT30.PERIODIC_CMDS)))
+        self.send_cmd(cmd, None)
+
+    def stop_periodic(self):
+        """
+        Stop the periodic acquisition mode, the sensor goes back to single shot
+        """
+        self.send_cmd(SHT30.BREAK_CMD, None)
+
+    def fetch(self, buf):
+        """
+        Read the latest periodic measurement into buf, a bytearray(6), without
+        waiting. It returns False if the sensor has no new measurement since the
+        last fetch, the data is then read again after the next one.
+        """
+        try:
+            self.i2c.writeto(self.i2c_addr, SHT30.FETCH_CMD)
+        except OSError:
+            raise SHT30Error(SHT30Error.BUS_ERROR)
+
+        try:
+            self.i2c.readfrom_into(self.i2c_addr, buf)
+        except OSError:
+            # the read is not acknowledged while there is no new measurement
+            return False
+
+        if not (self._check_crc_at(buf, 0) and self._check_crc_at(buf, 3)):
+            # an all zero response fails the CRC as well
+            raise SHT30Error(SHT30Error.CRC_ERROR)
+        return True
+
+    def _check_crc_at(self, data, start):
+        # same as _check_crc() for the word at data[start:start + 3], no slice
+        crc = 0xFF
+        for b in range(start, start + 2):
+            crc ^= data[b]
+            for _ in range(8):
+                if crc & 0x80:
+                    crc = ((crc << 1) ^ SHT30.POLYNOMIAL) & 0xFF
+                else:
+                    crc = (crc << 1) & 0xFF
+        return data[start + 2] == crc
+
+    @staticmethod
+    def temperature_x100(data):
+        """
+        Temperature of a raw measurement in hundredths of Celsius, only integers
+        are used. For instance 24.0512 C returns 2405.
+        Delta values are not applied in this method
+        """
+        # split so that no intermediate value exceeds a small int
+        aux = (data[0] << 8 | data[1]) * 175
+        return (aux // 0xffff) * 100 + (aux % 0xffff * 100) // 0xffff - 4500
+
+    @staticmethod
+    def humidity_x100(data):
+        """
+        Relative humidity of a raw measurement in hundredths of percent, only
+        integers are used. Delta values are not applied in this method
+        """
+        return ((data[3] << 8 | data[4]) * 10000) // 0xffff
+
+
 class SHT30Error(Exception):
     """
     Custom exception for errors on sensor management
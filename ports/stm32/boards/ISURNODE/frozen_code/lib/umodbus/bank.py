@@ -0,0 +1,132 @@
+from array import array
+
+# typing not natively supported on MicroPython
+from .typing import Callable, List, Optional, Union
+
+
+class RegisterBank(object):
+    """Contiguous range of registers held in a single preallocated buffer"""
+    def __init__(self,
+                 reg_type: str,
+                 address: int,
+                 length: int,
+                 value: Union[None, bool, int, List[bool], List[int]] = None,
+                 signed: bool = False) -> None:
+        if length < 1:
+            raise ValueError('bank length must be at least 1')
+
+        self.reg_type = reg_type
+        self.address = address
+        self.length = length
+        self.end = address + length
+        self.is_bit = reg_type in ('COILS', 'ISTS')
+
+        if self.is_bit:
+            # one bit per coil/discrete input, LSB of byte 0 is the first one
+            self._buf = bytearray((length + 7) // 8)
+        else:
+            self._buf = array('h' if signed else 'H', bytearray(2 * length))
+
+        # sparse callback tables, only addresses with a callback are stored
+        self.on_set_cb = dict()
+        self.on_get_cb = dict()
+
+        # incremented whenever a value changes, an encoded response of the
+        # bank is only reused while its generation is unchanged
+        self.generation = 0
+
+        if isinstance(value, (list, tuple)):
+            for idx, val in enumerate(value):
+                self.set(address + idx, val)
+        elif value is not None:
+            for addr in range(address, self.end):
+                self.set(addr, value)
+
+    def __contains__(self, address: int) -> bool:
+        return self.address <= address < self.end
+
+    def covers(self, address: int, quantity: int) -> bool:
+        return self.address <= address and address + quantity <= self.end
+
+    def get(self, address: int) -> Union[bool, int]:
+        idx = address - self.address
+
+        if self.is_bit:
+            return bool(self._buf[idx >> 3] & (1 << (idx & 7)))
+
+        return self._buf[idx]
+
+    def set(self, address: int, value: Union[bool, int]) -> None:
+        idx = address - self.address
+
+        if self.is_bit:
+            old = self._buf[idx >> 3]
+            if value:
+                self._buf[idx >> 3] |= 1 << (idx & 7)
+            else:
+                self._buf[idx >> 3] &= ~(1 << (idx & 7)) & 0xFF
+            changed = self._buf[idx >> 3] != old
+        else:
+            old = self._buf[idx]
+            self._buf[idx] = value
+            changed = self._buf[idx] != old
+
+        if changed:
+            # kept a small int, wrapping around after 2**30 changes
+            self.generation = (self.generation + 1) & 0x3FFFFFFF
+
+    def set_callbacks(self,
+                      address: int,
+                      on_set_cb: Optional[Callable] = None,
+                      on_get_cb: Optional[Callable] = None) -> None:
+        # an already registered callback takes precedence, same as the
+        # behaviour of the per address register dict
+        if callable(on_set_cb) and address not in self.on_set_cb:
+            self.on_set_cb[address] = on_set_cb
+
+        if callable(on_get_cb) and address not in self.on_get_cb:
+            self.on_get_cb[address] = on_get_cb
+
+    def byte_count(self, quantity: int) -> int:
+        if self.is_bit:
+            return ((quantity - 1) // 8) + 1
+
+        return quantity * 2
+
+    def pack_into(self,
+                  buf: bytearray,
+                  offset: int,
+                  address: int,
+                  quantity: int) -> int:
+        """
+        Write the response data of a read request into buf at offset
+
+        The byte layout is identical to the one of functions.response, so
+        registers served from a bank look the same on the wire as registers
+        served from the register dict.
+        """
+        data = self._buf
+        idx = address - self.address
+
+        if not self.is_bit:
+            for i in range(idx, idx + quantity):
+                val = data[i]
+                buf[offset] = (val >> 8) & 0xFF
+                buf[offset + 1] = val & 0xFF
+                offset += 2
+            return quantity * 2
+
+        # every group of up to 8 bits is packed with its first bit as the
+        # most significant one
+        count = ((quantity - 1) // 8) + 1
+        for byte_idx in range(count):
+            bits = quantity - byte_idx * 8
+            if bits > 8:
+                bits = 8
+            output = 0
+            for i in range(idx, idx + bits):
+                output = (output << 1) | ((data[i >> 3] >> (i & 7)) & 1)
+            buf[offset + byte_idx] = output
+            idx += bits
+
+        return count
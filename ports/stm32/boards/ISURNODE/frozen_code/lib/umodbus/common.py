@@ -1,5 +1,3 @@
-import struct
-
 # custom packages
 from . import const as Const
 from . import functions
@@ -7,58 +5,127 @@ from . import functions
 # typing not natively supported on MicroPython
 from .typing import List, Optional, Tuple, Union
 
+# shortest request of each function with a built-in decoder, unit address
+# and function code included, any other function needs both only
+_MIN_LENGTH = {
+    Const.READ_COILS: 6,
+    Const.READ_DISCRETE_INPUTS: 6,
+    Const.READ_HOLDING_REGISTERS: 6,
+    Const.READ_INPUT_REGISTER: 6,
+    Const.WRITE_SINGLE_COIL: 6,
+    Const.WRITE_SINGLE_REGISTER: 6,
+    Const.DIAGNOSTICS: 6,
+    Const.WRITE_MULTIPLE_COILS: 7,
+    Const.WRITE_MULTIPLE_REGISTERS: 7,
+    Const.MASK_WRITE_REGISTER: 8,
+    Const.READ_WRITE_MULTIPLE_REGISTERS: 11,
+}
+
 
 class Request(object):
     """Deconstruct request data received via TCP or Serial"""
-    def __init__(self, interface, data: bytearray) -> None:
+    def __init__(self, interface, data: Optional[bytearray] = None) -> None:
         #print(f"DEBUG: Inside Request.__init__ in common.py. Parsing data: {data}")
         self._itf = interface
+
+        if data is not None:
+            self.parse(data)
+
+    def parse(self, data: bytearray, length: Optional[int] = None) -> None:
+        """
+        Parse the first length bytes of data, a request without its CRC
+
+        Decoding the header does not allocate, so an interface can reuse a
+        single Request object for every frame it receives. The buffer may
+        still hold an earlier, longer frame beyond length, so the length is
+        checked before anything is decoded.
+        """
+        if length is None:
+            length = len(data)
+
+        function = data[1]
         self.unit_addr = data[0]
-        self.function, self.register_addr = struct.unpack_from('>BH', data, 1)
+        self.function = function
+
+        if length < _MIN_LENGTH.get(function, 2):
+            raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
 
-        if self.function in [Const.READ_COILS, Const.READ_DISCRETE_INPUTS]:
-            self.quantity = struct.unpack_from('>H', data, 4)[0]
+        self.register_addr = (data[2] << 8) | data[3] if length >= 4 else 0
+
+        if (function == Const.READ_COILS or
+                function == Const.READ_DISCRETE_INPUTS):
+            self.quantity = (data[4] << 8) | data[5]
 
             if self.quantity < 0x0001 or self.quantity > 0x07D0:
-                raise ModbusException(self.function, Const.ILLEGAL_DATA_VALUE)
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
 
             self.data = None
-        elif self.function in [Const.READ_HOLDING_REGISTERS, Const.READ_INPUT_REGISTER]:
-            self.quantity = struct.unpack_from('>H', data, 4)[0]
+        elif (function == Const.READ_HOLDING_REGISTERS or
+                function == Const.READ_INPUT_REGISTER):
+            self.quantity = (data[4] << 8) | data[5]
 
             if self.quantity < 0x0001 or self.quantity > 0x007D:
-                raise ModbusException(self.function, Const.ILLEGAL_DATA_VALUE)
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
 
             self.data = None
-        elif self.function == Const.WRITE_SINGLE_COIL:
+        elif function == Const.WRITE_SINGLE_COIL:
             self.quantity = None
             self.data = data[4:6]
 
             # allowed values: 0x0000 or 0xFF00
-            if (self.data[0] not in [0x00, 0xFF]) or self.data[1] != 0x00:
-                raise ModbusException(self.function, Const.ILLEGAL_DATA_VALUE)
-        elif self.function == Const.WRITE_SINGLE_REGISTER:
+            if (self.data[0] != 0x00 and self.data[0] != 0xFF) or self.data[1] != 0x00:
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
+        elif function == Const.WRITE_SINGLE_REGISTER:
             self.quantity = None
             self.data = data[4:6]
             # all values allowed
-        elif self.function == Const.WRITE_MULTIPLE_COILS:
-            self.quantity = struct.unpack_from('>H', data, 4)[0]
+        elif function == Const.WRITE_MULTIPLE_COILS:
+            self.quantity = (data[4] << 8) | data[5]
             if self.quantity < 0x0001 or self.quantity > 0x07D0:
-                raise ModbusException(self.function, Const.ILLEGAL_DATA_VALUE)
-            self.data = data[7:]
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
+            self.data = data[7:length]
             if len(self.data) != ((self.quantity - 1) // 8) + 1:
-                raise ModbusException(self.function, Const.ILLEGAL_DATA_VALUE)
-        elif self.function == Const.WRITE_MULTIPLE_REGISTERS:
-            self.quantity = struct.unpack_from('>H', data, 4)[0]
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
+        elif function == Const.WRITE_MULTIPLE_REGISTERS:
+            self.quantity = (data[4] << 8) | data[5]
             if self.quantity < 0x0001 or self.quantity > 0x007B:
-                raise ModbusException(self.function, Const.ILLEGAL_DATA_VALUE)
-            self.data = data[7:]
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
+            self.data = data[7:length]
             if len(self.data) != self.quantity * 2:
-                raise ModbusException(self.function, Const.ILLEGAL_DATA_VALUE)
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
+        elif function == Const.MASK_WRITE_REGISTER:
+            self.quantity = None
+            # AND mask followed by OR mask
+            self.data = data[4:8]
+            if length != 8:
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
+        elif function == Const.READ_WRITE_MULTIPLE_REGISTERS:
+            # register_addr and quantity describe the read part
+            self.quantity = (data[4] << 8) | data[5]
+            if self.quantity < 0x0001 or self.quantity > 0x007D:
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
+            self.write_addr = (data[6] << 8) | data[7]
+            self.write_quantity = (data[8] << 8) | data[9]
+            if self.write_quantity < 0x0001 or self.write_quantity > 0x0079:
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
+            self.data = data[11:length]
+            if (data[10] != self.write_quantity * 2 or
+                    len(self.data) != self.write_quantity * 2):
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
+        elif function == Const.DIAGNOSTICS:
+            # register_addr is the sub-function code
+            self.quantity = None
+            self.data = data[4:length]
+        elif function == Const.GET_COM_EVENT_COUNTER:
+            self.quantity = None
+            self.data = None
+            if length != 2:
+                raise ModbusException(function, Const.ILLEGAL_DATA_VALUE)
         else:
-            # Not implemented functions
+            # no built-in decoder, a registered function handler gets the
+            # whole PDU after the function code
             self.quantity = None
-            self.data = data[4:]
+            self.data = data[2:length]
 
     def send_response(self,
                       values: Optional[list] = None,
@@ -73,6 +140,18 @@ class Request(object):
                                 values,
                                 signed)
 
+    def send_bank_response(self, bank) -> None:
+
+        self._itf.send_bank_response(self.unit_addr,
+                                     self.function,
+                                     self.register_addr,
+                                     self.quantity,
+                                     bank)
+
+    def send_pdu(self, pdu: bytes) -> None:
+
+        self._itf.send_pdu(self.unit_addr, pdu)
+
     def send_exception(self, exception_code: int) -> None:
 
         self._itf.send_exception_response(self.unit_addr,
@@ -80,8 +159,181 @@ class Request(object):
                                           exception_code)
 
 
+class Diagnostics(object):
+    """Bus health counters of an interface, served by FC08 and FC0B"""
+    def __init__(self) -> None:
+        # no responses are sent while in Listen Only Mode
+        self.listen_only = False
+        self.clear()
+
+    def clear(self) -> None:
+        self.bus_message_count = 0
+        self.bus_comm_error_count = 0
+        self.bus_exception_count = 0
+        self.slave_message_count = 0
+        self.slave_no_response_count = 0
+        self.bus_overrun_count = 0
+        # successfully completed requests, reported by FC0B
+        self.event_count = 0
+
+
 class ModbusException(Exception):
     """Exception for signaling modbus errors"""
     def __init__(self, function_code: int, exception_code: int) -> None:
         self.function_code = function_code
         self.exception_code = exception_code
+
+
+class CommonModbusFunctions(object):
+    """
+    Master side of the Modbus functions, shared by all interfaces
+
+    An interface provides _send_receive(slave_addr, modbus_pdu, count), which
+    sends a request PDU and returns the response data after its header, or
+    None for a broadcast. A broadcast write returns True once it is sent.
+    """
+    def read_coils(self,
+                   slave_addr: int,
+                   starting_addr: int,
+                   coil_qty: int) -> List[bool]:
+        modbus_pdu = functions.read_coils(starting_address=starting_addr,
+                                          quantity=coil_qty)
+
+        response = self._send_receive(slave_addr=slave_addr,
+                                      modbus_pdu=modbus_pdu,
+                                      count=True)
+
+        return functions.bytes_to_bool(byte_list=response, bit_qty=coil_qty)
+
+    def read_discrete_inputs(self,
+                             slave_addr: int,
+                             starting_addr: int,
+                             input_qty: int) -> List[bool]:
+        modbus_pdu = functions.read_discrete_inputs(
+            starting_address=starting_addr,
+            quantity=input_qty)
+
+        response = self._send_receive(slave_addr=slave_addr,
+                                      modbus_pdu=modbus_pdu,
+                                      count=True)
+
+        return functions.bytes_to_bool(byte_list=response, bit_qty=input_qty)
+
+    def read_holding_registers(self,
+                               slave_addr: int,
+                               starting_addr: int,
+                               register_qty: int,
+                               signed: bool = True) -> Tuple[int, ...]:
+        modbus_pdu = functions.read_holding_registers(
+            starting_address=starting_addr,
+            quantity=register_qty)
+
+        response = self._send_receive(slave_addr=slave_addr,
+                                      modbus_pdu=modbus_pdu,
+                                      count=True)
+
+        return functions.to_short(byte_array=response, signed=signed)
+
+    def read_input_registers(self,
+                             slave_addr: int,
+                             starting_addr: int,
+                             register_qty: int,
+                             signed: bool = True) -> Tuple[int, ...]:
+        modbus_pdu = functions.read_input_registers(
+            starting_address=starting_addr,
+            quantity=register_qty)
+
+        response = self._send_receive(slave_addr=slave_addr,
+                                      modbus_pdu=modbus_pdu,
+                                      count=True)
+
+        return functions.to_short(byte_array=response, signed=signed)
+
+    def write_single_coil(self,
+                          slave_addr: int,
+                          output_address: int,
+                          output_value: Union[int, bool]) -> bool:
+        modbus_pdu = functions.write_single_coil(output_address=output_address,
+                                                 output_value=output_value)
+
+        response = self._send_receive(slave_addr=slave_addr,
+                                      modbus_pdu=modbus_pdu,
+                                      count=False)
+
+        if response is None:
+            return True
+
+        return functions.validate_resp_data(
+            data=response,
+            function_code=Const.WRITE_SINGLE_COIL,
+            address=output_address,
+            value=output_value,
+            signed=False)
+
+    def write_single_register(self,
+                              slave_addr: int,
+                              register_address: int,
+                              register_value: int,
+                              signed: bool = True) -> bool:
+        modbus_pdu = functions.write_single_register(
+            register_address=register_address,
+            register_value=register_value,
+            signed=signed)
+
+        response = self._send_receive(slave_addr=slave_addr,
+                                      modbus_pdu=modbus_pdu,
+                                      count=False)
+
+        if response is None:
+            return True
+
+        return functions.validate_resp_data(
+            data=response,
+            function_code=Const.WRITE_SINGLE_REGISTER,
+            address=register_address,
+            value=register_value,
+            signed=signed)
+
+    def write_multiple_coils(self,
+                             slave_addr: int,
+                             starting_address: int,
+                             output_values: List[Union[int, bool]]) -> bool:
+        modbus_pdu = functions.write_multiple_coils(
+            starting_address=starting_address,
+            value_list=output_values)
+
+        response = self._send_receive(slave_addr=slave_addr,
+                                      modbus_pdu=modbus_pdu,
+                                      count=False)
+
+        if response is None:
+            return True
+
+        return functions.validate_resp_data(
+            data=response,
+            function_code=Const.WRITE_MULTIPLE_COILS,
+            address=starting_address,
+            quantity=len(output_values))
+
+    def write_multiple_registers(self,
+                                 slave_addr: int,
+                                 starting_address: int,
+                                 register_values: List[int],
+                                 signed: bool = True) -> bool:
+        modbus_pdu = functions.write_multiple_registers(
+            starting_address=starting_address,
+            register_values=register_values,
+            signed=signed)
+
+        response = self._send_receive(slave_addr=slave_addr,
+                                      modbus_pdu=modbus_pdu,
+                                      count=False)
+
+        if response is None:
+            return True
+
+        return functions.validate_resp_data(
+            data=response,
+            function_code=Const.WRITE_MULTIPLE_REGISTERS,
+            address=starting_address,
+            quantity=len(register_values))
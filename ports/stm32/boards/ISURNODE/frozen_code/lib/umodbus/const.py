@@ -45,6 +45,36 @@ REPORT_SERVER_ID = const(0x11)
 #: Encapsulated Interface Transport
 READ_DEVICE_IDENTIFICATION = const(0x2B)
 
+# diagnostics (FC08) sub-function codes
+#: Echo the request data field
+RETURN_QUERY_DATA = const(0x00)
+#: Clear the counters and leave the Listen Only Mode
+RESTART_COMMUNICATIONS = const(0x01)
+#: Contents of the diagnostic register
+RETURN_DIAGNOSTIC_REGISTER = const(0x02)
+#: Stop responding until a restart communications request is received
+FORCE_LISTEN_ONLY_MODE = const(0x04)
+#: Clear all counters and the diagnostic register
+CLEAR_COUNTERS = const(0x0A)
+#: Messages detected on the bus
+RETURN_BUS_MESSAGE_COUNT = const(0x0B)
+#: CRC errors detected on the bus
+RETURN_BUS_COMM_ERROR_COUNT = const(0x0C)
+#: Exception responses sent
+RETURN_BUS_EXCEPTION_ERROR_COUNT = const(0x0D)
+#: Messages addressed to this server
+RETURN_SERVER_MESSAGE_COUNT = const(0x0E)
+#: Messages addressed to this server without a response
+RETURN_SERVER_NO_RESPONSE_COUNT = const(0x0F)
+#: Negative acknowledge responses sent
+RETURN_SERVER_NAK_COUNT = const(0x10)
+#: Server device busy responses sent
+RETURN_SERVER_BUSY_COUNT = const(0x11)
+#: Messages lost due to a character overrun
+RETURN_BUS_CHARACTER_OVERRUN_COUNT = const(0x12)
+#: Clear the overrun counter
+CLEAR_OVERRUN_COUNTER = const(0x14)
+
 # exception codes
 #: Function code received in query is not an allowable action for the server
 ILLEGAL_FUNCTION = const(0x01)
@@ -65,6 +95,14 @@ GATEWAY_PATH_UNAVAILABLE = const(0x0A)
 #: No response was obtained from the target device
 DEVICE_FAILED_TO_RESPOND = const(0x0B)
 
+# unit addresses
+#: Requests to this address are executed by all servers, without response
+BROADCAST_ADDRESS = const(0x00)
+#: Lowest individual unit address
+MIN_UNIT_ADDRESS = const(0x01)
+#: Highest individual unit address
+MAX_UNIT_ADDRESS = const(0xF7)
+
 # Protocol Data Unit (PDU) constants
 #: CRC length
 CRC_LENGTH = const(0x02)
@@ -78,6 +116,12 @@ ERROR_RESP_LEN = const(0x05)
 FIXED_RESP_LEN = const(0x08)
 #: Modbus Application Protocol High Data Response length
 MBAP_HDR_LENGTH = const(0x07)
+#: Maximum length of a RTU frame (address, PDU and CRC)
+MAX_ADU_LENGTH = const(0x100)
+#: Output value of a coil set to ON
+COIL_ON = const(0xFF00)
+#: Output value of a coil set to OFF
+COIL_OFF = const(0x0000)
 
 #: CRC16 lookup table
 CRC16_TABLE = (
@@ -14,55 +14,171 @@ def response(function_code: int,
              value_list: Optional[list] = None,
              signed: bool = True) -> bytes:
 
-    if function_code in [Const.READ_COILS, Const.READ_DISCRETE_INPUTS]:
-        sectioned_list = [value_list[i:i + 8] for i in range(0, len(value_list), 8)]    # noqa: E501
+    buf = bytearray(Const.MAX_ADU_LENGTH)
+    length = response_into(buf=buf,
+                           offset=0,
+                           function_code=function_code,
+                           request_register_addr=request_register_addr,
+                           request_register_qty=request_register_qty,
+                           request_data=request_data,
+                           value_list=value_list,
+                           signed=signed)
+
+    return bytes(buf[:length])
+
+
+def response_into(buf: bytearray,
+                  offset: int,
+                  function_code: int,
+                  request_register_addr: int,
+                  request_register_qty: int,
+                  request_data: list,
+                  value_list: Optional[list] = None,
+                  signed: bool = True) -> int:
+    """
+    Encode a response PDU into buf at offset
+
+    Bytes are written directly, no format strings or intermediate lists are
+    built. Signed and unsigned registers share the same two's complement
+    encoding, signed is only kept for compatibility with response().
+
+    :returns:   Length of the PDU
+    :rtype:     int
+    """
+    if (function_code == Const.READ_COILS or
+            function_code == Const.READ_DISCRETE_INPUTS):
+        quantity = len(value_list)
+        byte_count = ((quantity - 1) // 8) + 1
+        buf[offset] = function_code
+        buf[offset + 1] = byte_count
+
+        # every group of up to 8 bits is packed with its first bit as the
+        # most significant one
+        pos = offset + 2
+        output = 0
+        for idx in range(quantity):
+            output = (output << 1) | (1 if value_list[idx] else 0)
+            if (idx & 7) == 7 or idx == quantity - 1:
+                buf[pos] = output
+                pos += 1
+                output = 0
+
+        return 2 + byte_count
+
+    elif (function_code == Const.READ_HOLDING_REGISTERS or
+            function_code == Const.READ_INPUT_REGISTER or
+            function_code == Const.READ_WRITE_MULTIPLE_REGISTERS):
+        quantity = len(value_list)
 
-        output_value = []
-        for index, byte in enumerate(sectioned_list):
+        if not (0x0001 <= quantity <= 0x007D):
+            raise ValueError('invalid number of registers')
 
-            output = 0
-            for bit in byte:
-                output = (output << 1) | bit
-            output_value.append(output)
+        buf[offset] = function_code
+        buf[offset + 1] = quantity * 2
+
+        pos = offset + 2
+        for idx in range(quantity):
+            val = value_list[idx]
+            buf[pos] = (val >> 8) & 0xFF
+            buf[pos + 1] = val & 0xFF
+            pos += 2
 
-        fmt = 'B' * len(output_value)
-        return struct.pack('>BB' + fmt,
-                           function_code,
-                           ((len(value_list) - 1) // 8) + 1,
-                           *output_value)
+        return 2 + quantity * 2
 
-    elif function_code in [Const.READ_HOLDING_REGISTERS,
-                           Const.READ_INPUT_REGISTER]:
-        quantity = len(value_list)
+    elif (function_code == Const.WRITE_SINGLE_COIL or
+            function_code == Const.WRITE_SINGLE_REGISTER):
+        buf[offset] = function_code
+        buf[offset + 1] = request_register_addr >> 8
+        buf[offset + 2] = request_register_addr & 0xFF
+        buf[offset + 3] = request_data[0]
+        buf[offset + 4] = request_data[1]
 
-        if not (0x0001 <= quantity <= 0x007D):
-            raise ValueError('invalid number of registers')
+        return 5
+
+    elif (function_code == Const.WRITE_MULTIPLE_COILS or
+            function_code == Const.WRITE_MULTIPLE_REGISTERS):
+        buf[offset] = function_code
+        buf[offset + 1] = request_register_addr >> 8
+        buf[offset + 2] = request_register_addr & 0xFF
+        buf[offset + 3] = request_register_qty >> 8
+        buf[offset + 4] = request_register_qty & 0xFF
+
+        return 5
+
+    elif function_code == Const.MASK_WRITE_REGISTER:
+        # the response is an echo of the request
+        buf[offset] = function_code
+        buf[offset + 1] = request_register_addr >> 8
+        buf[offset + 2] = request_register_addr & 0xFF
+        for idx in range(4):
+            buf[offset + 3 + idx] = request_data[idx]
+
+        return 7
+
+    elif function_code == Const.DIAGNOSTICS:
+        buf[offset] = function_code
+        buf[offset + 1] = request_register_addr >> 8
+        buf[offset + 2] = request_register_addr & 0xFF
+
+        if value_list is None:
+            # echo of the request data field
+            for idx in range(len(request_data)):
+                buf[offset + 3 + idx] = request_data[idx]
+
+            return 3 + len(request_data)
+
+        val = value_list[0]
+        buf[offset + 3] = (val >> 8) & 0xFF
+        buf[offset + 4] = val & 0xFF
+
+        return 5
+
+    elif function_code == Const.GET_COM_EVENT_COUNTER:
+        # status word followed by the event count
+        buf[offset] = function_code
+        pos = offset + 1
+        for idx in range(2):
+            val = value_list[idx]
+            buf[pos] = (val >> 8) & 0xFF
+            buf[pos + 1] = val & 0xFF
+            pos += 2
+
+        return 5
+
+    raise ValueError('no response encoder for function code {}'.
+                     format(function_code))
 
-        if signed is True or signed is False:
-            fmt = ('h' if signed else 'H') * quantity
-        else:
-            fmt = ''
-            for s in signed:
-                fmt += 'h' if s else 'H'
-
-        return struct.pack('>BB' + fmt,
-                           function_code,
-                           quantity * 2,
-                           *value_list)
-
-    elif function_code in [Const.WRITE_SINGLE_COIL,
-                           Const.WRITE_SINGLE_REGISTER]:
-        return struct.pack('>BHBB',
-                           function_code,
-                           request_register_addr,
-                           *request_data)
-
-    elif function_code in [Const.WRITE_MULTIPLE_COILS,
-                           Const.WRITE_MULTIPLE_REGISTERS]:
-        return struct.pack('>BHH',
-                           function_code,
-                           request_register_addr,
-                           request_register_qty)
+
+def exception_response_into(buf: bytearray,
+                            offset: int,
+                            function_code: int,
+                            exception_code: int) -> int:
+
+    buf[offset] = Const.ERROR_BIAS + function_code
+    buf[offset + 1] = exception_code
+
+    return 2
+
+
+def crc16_modbus(buf: bytearray,
+                 init: int = 0xFFFF,
+                 offset: int = 0,
+                 length: int = -1) -> int:
+    """
+    Calculate the Modbus CRC16 of length bytes of buf starting at offset
+
+    Pure Python version of the native _umodbus.crc16_modbus, with the same
+    arguments. A negative length means up to the end of the buffer.
+    """
+    if length < 0:
+        length = len(buf) - offset
+
+    crc = init
+    table = Const.CRC16_TABLE
+    for idx in range(offset, offset + length):
+        crc = (crc >> 8) ^ table[(crc ^ buf[idx]) & 0xFF]
+
+    return crc
 
 
 def exception_response(function_code: int, exception_code: int) -> bytes:
@@ -70,6 +186,194 @@ def exception_response(function_code: int, exception_code: int) -> bytes:
     return struct.pack('>BB', Const.ERROR_BIAS + function_code, exception_code)
 
 
+def read_coils(starting_address: int, quantity: int) -> bytes:
+    """
+    Create the request PDU to read coils
+
+    :returns:   Packed Modbus request PDU
+    :rtype:     bytes
+    """
+    if not (1 <= quantity <= 2000):
+        raise ValueError('invalid number of coils')
+
+    return struct.pack('>BHH', Const.READ_COILS, starting_address, quantity)
+
+
+def read_discrete_inputs(starting_address: int, quantity: int) -> bytes:
+    """
+    Create the request PDU to read discrete inputs
+
+    :returns:   Packed Modbus request PDU
+    :rtype:     bytes
+    """
+    if not (1 <= quantity <= 2000):
+        raise ValueError('invalid number of discrete inputs')
+
+    return struct.pack('>BHH',
+                       Const.READ_DISCRETE_INPUTS,
+                       starting_address,
+                       quantity)
+
+
+def read_holding_registers(starting_address: int, quantity: int) -> bytes:
+    """
+    Create the request PDU to read holding registers
+
+    :returns:   Packed Modbus request PDU
+    :rtype:     bytes
+    """
+    if not (1 <= quantity <= 125):
+        raise ValueError('invalid number of holding registers')
+
+    return struct.pack('>BHH',
+                       Const.READ_HOLDING_REGISTERS,
+                       starting_address,
+                       quantity)
+
+
+def read_input_registers(starting_address: int, quantity: int) -> bytes:
+    """
+    Create the request PDU to read input registers
+
+    :returns:   Packed Modbus request PDU
+    :rtype:     bytes
+    """
+    if not (1 <= quantity <= 125):
+        raise ValueError('invalid number of input registers')
+
+    return struct.pack('>BHH',
+                       Const.READ_INPUT_REGISTER,
+                       starting_address,
+                       quantity)
+
+
+def write_single_coil(output_address: int,
+                      output_value: Union[int, bool]) -> bytes:
+    """
+    Create the request PDU to write a single coil, output_value is a bool or
+    one of COIL_ON and COIL_OFF
+
+    :returns:   Packed Modbus request PDU
+    :rtype:     bytes
+    """
+    if output_value is True:
+        output_value = Const.COIL_ON
+    elif output_value is False:
+        output_value = Const.COIL_OFF
+
+    if output_value != Const.COIL_ON and output_value != Const.COIL_OFF:
+        raise ValueError('illegal coil value')
+
+    return struct.pack('>BHH',
+                       Const.WRITE_SINGLE_COIL,
+                       output_address,
+                       output_value)
+
+
+def write_single_register(register_address: int,
+                          register_value: int,
+                          signed: bool = True) -> bytes:
+    """
+    Create the request PDU to write a single holding register
+
+    :returns:   Packed Modbus request PDU
+    :rtype:     bytes
+    """
+    fmt = '>BH' + ('h' if signed else 'H')
+
+    return struct.pack(fmt,
+                       Const.WRITE_SINGLE_REGISTER,
+                       register_address,
+                       register_value)
+
+
+def write_multiple_coils(starting_address: int,
+                         value_list: List[Union[int, bool]]) -> bytes:
+    """
+    Create the request PDU to write multiple coils, the first coil is the
+    least significant bit of the first data byte
+
+    :returns:   Packed Modbus request PDU
+    :rtype:     bytes
+    """
+    quantity = len(value_list)
+    if not (1 <= quantity <= 0x07B0):
+        raise ValueError('invalid number of coils')
+
+    byte_count = ((quantity - 1) // 8) + 1
+    pdu = bytearray(6 + byte_count)
+    pdu[0] = Const.WRITE_MULTIPLE_COILS
+    pdu[1] = starting_address >> 8
+    pdu[2] = starting_address & 0xFF
+    pdu[3] = quantity >> 8
+    pdu[4] = quantity & 0xFF
+    pdu[5] = byte_count
+
+    for idx in range(quantity):
+        if value_list[idx]:
+            pdu[6 + (idx >> 3)] |= 1 << (idx & 7)
+
+    return bytes(pdu)
+
+
+def write_multiple_registers(starting_address: int,
+                             register_values: List[int],
+                             signed: bool = True) -> bytes:
+    """
+    Create the request PDU to write multiple holding registers
+
+    :returns:   Packed Modbus request PDU
+    :rtype:     bytes
+    """
+    quantity = len(register_values)
+    if not (1 <= quantity <= 123):
+        raise ValueError('invalid number of registers')
+
+    fmt = '>BHHB' + ('h' if signed else 'H') * quantity
+
+    return struct.pack(fmt,
+                       Const.WRITE_MULTIPLE_REGISTERS,
+                       starting_address,
+                       quantity,
+                       quantity * 2,
+                       *register_values)
+
+
+def validate_resp_data(data: bytes,
+                       function_code: int,
+                       address: int,
+                       value: Optional[Union[int, bool]] = None,
+                       quantity: Optional[int] = None,
+                       signed: bool = True) -> bool:
+    """
+    Check the response data of a write request against the request
+
+    :returns:   True if the response confirms the request
+    :rtype:     bool
+    """
+    if (function_code == Const.WRITE_SINGLE_COIL or
+            function_code == Const.WRITE_SINGLE_REGISTER):
+        fmt = '>H' + ('h' if signed else 'H')
+        resp_addr, resp_value = struct.unpack(fmt, data)
+
+        # a bool written to a coil was sent as COIL_ON or COIL_OFF
+        if function_code == Const.WRITE_SINGLE_COIL:
+            if value is True:
+                value = Const.COIL_ON
+            elif value is False:
+                value = Const.COIL_OFF
+
+        return address == resp_addr and value == resp_value
+
+    if (function_code == Const.WRITE_MULTIPLE_COILS or
+            function_code == Const.WRITE_MULTIPLE_REGISTERS):
+        resp_addr, resp_qty = struct.unpack('>HH', data)
+
+        return address == resp_addr and quantity == resp_qty
+
+    return False
+
+
 def bytes_to_bool(byte_list: bytes, bit_qty: Optional[int] = 1) -> List[bool]:
 
     bool_list = []
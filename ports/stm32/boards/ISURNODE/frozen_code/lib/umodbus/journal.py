@@ -0,0 +1,202 @@
+from array import array
+
+# typing not natively supported on MicroPython
+from .typing import List, Union
+
+
+class ChangeJournal(object):
+    """
+    Registers written by a master, in order, in a fixed number of slots
+
+    Slots are used as a ring, the oldest change first. A slot is pending
+    while its bit in the dirty bitmap is set. A further write to a pending
+    address updates value and time of its slot, so the journal holds each
+    address at most once, at the position of its first pending write. If
+    all slots are used the oldest change is dropped and counted in lost.
+    Recording and popping changes does not allocate.
+    """
+    #: Register types which can be written by a master
+    REG_TYPES = ('COILS', 'HREGS')
+
+    def __init__(self, capacity: int = 32) -> None:
+        if capacity < 1:
+            raise ValueError('journal capacity must be at least 1')
+
+        self.capacity = capacity
+        self._type = bytearray(capacity)
+        self._addr = array('H', bytearray(2 * capacity))
+        self._val = array('H', bytearray(2 * capacity))
+        self._time = array('L', [0] * capacity)
+        self._dirty = bytearray((capacity + 7) // 8)
+
+        # oldest used slot and number of used slots from there on, drained
+        # or removed slots in between are skipped
+        self._start = 0
+        self._used = 0
+        self.pending = 0
+        self.lost = 0
+
+        # the entry returned while draining is reused for every change, as
+        # is the exception ending an iteration. Raising it still allocates
+        # its traceback, pop() does not allocate at all.
+        self._entry = [None, 0, 0, 0]
+        self._stop = StopIteration()
+
+    def __len__(self) -> int:
+        return self.pending
+
+    def record(self,
+               reg_type: str,
+               address: int,
+               value: Union[bool, int],
+               ticks: int) -> None:
+        type_idx = self.REG_TYPES.index(reg_type)
+        value = int(value) & 0xFFFF
+
+        slot = self._find(type_idx=type_idx, address=address)
+        if slot < 0:
+            if self._used == self.capacity:
+                if self.pending < self.capacity:
+                    # removed changes left unused slots in between
+                    self._compact()
+                else:
+                    # the oldest change makes room
+                    self._clear(self._start)
+                    self.lost += 1
+                    self._advance()
+
+            slot = (self._start + self._used) % self.capacity
+            self._used += 1
+            self.pending += 1
+            self._dirty[slot >> 3] |= 1 << (slot & 7)
+            self._type[slot] = type_idx
+            self._addr[slot] = address
+
+        self._val[slot] = value
+        self._time[slot] = ticks
+
+    def remove(self, reg_type: str, address: int, ticks: int) -> bool:
+        """
+        Remove the pending change of address if it was written at ticks
+
+        :returns:   Flag whether a change was removed
+        :rtype:     bool
+        """
+        slot = self._find(type_idx=self.REG_TYPES.index(reg_type),
+                          address=address)
+        if slot < 0 or self._time[slot] != ticks:
+            return False
+
+        self._clear(slot)
+        self._advance()
+
+        return True
+
+    def get(self, reg_type: str) -> dict:
+        """
+        Pending changes of reg_type by address, without draining them
+
+        :returns:   Dict of address to {'val': value, 'time': ticks}
+        :rtype:     dict
+        """
+        type_idx = self.REG_TYPES.index(reg_type)
+        changes = dict()
+
+        for idx in range(self._used):
+            slot = (self._start + idx) % self.capacity
+            if self._is_dirty(slot) and self._type[slot] == type_idx:
+                changes[self._addr[slot]] = {'val': self._value(slot),
+                                             'time': self._time[slot]}
+
+        return changes
+
+    def clear(self) -> None:
+        for idx in range(len(self._dirty)):
+            self._dirty[idx] = 0
+        self._start = 0
+        self._used = 0
+        self.pending = 0
+
+    def pop(self) -> Union[List[Union[str, int, bool]], None]:
+        """
+        Remove the oldest pending change
+
+        :returns:   The change as [reg_type, address, value, ticks], reused
+                    for the next change, None if no change is pending
+        :rtype:     Union[List[Union[str, int, bool]], None]
+        """
+        # the start slot is always pending
+        if not self._used:
+            return None
+
+        slot = self._start
+        self._clear(slot)
+        self._advance()
+
+        entry = self._entry
+        type_idx = self._type[slot]
+        entry[0] = self.REG_TYPES[type_idx]
+        entry[1] = self._addr[slot]
+        entry[2] = self._value(slot)
+        entry[3] = self._time[slot]
+
+        return entry
+
+    def __iter__(self) -> 'ChangeJournal':
+        return self
+
+    def __next__(self) -> List[Union[str, int, bool]]:
+        entry = self.pop()
+        if entry is None:
+            raise self._stop
+
+        return entry
+
+    def _find(self, type_idx: int, address: int) -> int:
+        if not self.pending:
+            return -1
+
+        for idx in range(self._used):
+            slot = (self._start + idx) % self.capacity
+            if (self._addr[slot] == address and self._type[slot] == type_idx
+                    and self._is_dirty(slot)):
+                return slot
+
+        return -1
+
+    def _value(self, slot: int) -> Union[bool, int]:
+        if self._type[slot] == 0:
+            return bool(self._val[slot])
+
+        return self._val[slot]
+
+    def _is_dirty(self, slot: int) -> bool:
+        return bool(self._dirty[slot >> 3] & (1 << (slot & 7)))
+
+    def _clear(self, slot: int) -> None:
+        self._dirty[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+        self.pending -= 1
+
+    def _compact(self) -> None:
+        # move the pending changes together, keeping their order
+        cap = self.capacity
+        dst = self._start
+        for idx in range(self._used):
+            slot = (self._start + idx) % cap
+            if not self._is_dirty(slot):
+                continue
+            if slot != dst:
+                self._type[dst] = self._type[slot]
+                self._addr[dst] = self._addr[slot]
+                self._val[dst] = self._val[slot]
+                self._time[dst] = self._time[slot]
+                self._dirty[dst >> 3] |= 1 << (dst & 7)
+                self._dirty[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+            dst = (dst + 1) % cap
+        self._used = self.pending
+
+    def _advance(self) -> None:
+        # move the start past slots which are no longer pending
+        while self._used and not self._is_dirty(self._start):
+            self._start = (self._start + 1) % self.capacity
+            self._used -= 1
@@ -3,89 +3,285 @@ import time
 # custom packages
 from . import functions
 from . import const as Const
+from .bank import RegisterBank
 from .common import Request
+from .journal import ChangeJournal
 
 # typing not natively supported on MicroPython
-from .typing import Callable, dict_keys, List, Optional, Union
+from .typing import Any, Callable, dict_keys, List, Optional, Union
+
+
+# calling a coroutine function, i.e. an async def, returns a generator
+def _gen():
+    yield
+
+
+_coroutine_type = type(_gen())
+
+# isinstance() with a tuple literal would build the tuple on every call
+_SEQUENCE_TYPES = (list, tuple)
 
 
 class Modbus(object):
+    #: Number of register changes kept until they are drained
+    CHANGE_JOURNAL_SIZE = 32
 
     def __init__(self, itf, addr_list: List[int]) -> None:
         self._itf = itf
         self._addr_list = addr_list
+        # further interfaces serving the same registers, e.g. Modbus TCP
+        self._extra_itfs = []
+
+        # coroutines returned by register callbacks, awaited by serve()
+        self._awaiting = []
+
+        # bit n is set if unit address n is served, broadcasts to address 0
+        # are always accepted
+        self._unit_map = bytearray(32)
+        self._unit_map[0] = 0x01
+        for addr in addr_list:
+            self._set_unit_bit(addr)
+
+        # virtual units with their own registers, served by this interface
+        self._units = dict()
 
         # modbus register types with their default value
         self._available_register_types = ['COILS', 'HREGS', 'IREGS', 'ISTS']
         self._register_dict = dict()
+        self._banks = dict()
+        self._read_hooks = dict()
+        self._bindings = dict()
         for reg_type in self._available_register_types:
             self._register_dict[reg_type] = dict()
+            self._banks[reg_type] = []
+            self._read_hooks[reg_type] = []
+            self._bindings[reg_type] = []
         self._default_vals = dict(zip(self._available_register_types,
                                       [False, 0, 0, False]))
-
-        # registers which can be set by remote device
+        # number of register writes, modulo 2**30
+        self._reg_writes = 0
+
+        # function code to (handler, register type, broadcast allowed)
+        # table used by process, only writes are accepted as broadcast
+        read = self._process_read_access
+        write = self._process_write_access
+        self._function_handlers = {
+            Const.READ_COILS: (read, 'COILS', False),
+            Const.READ_DISCRETE_INPUTS: (read, 'ISTS', False),
+            Const.READ_HOLDING_REGISTERS: (read, 'HREGS', False),
+            Const.READ_INPUT_REGISTER: (read, 'IREGS', False),
+            Const.WRITE_SINGLE_COIL: (write, 'COILS', True),
+            Const.WRITE_MULTIPLE_COILS: (write, 'COILS', True),
+            Const.WRITE_SINGLE_REGISTER: (write, 'HREGS', True),
+            Const.WRITE_MULTIPLE_REGISTERS: (write, 'HREGS', True),
+            Const.MASK_WRITE_REGISTER: (write, 'HREGS', True),
+            Const.READ_WRITE_MULTIPLE_REGISTERS: (
+                self._process_read_write_access, 'HREGS', False),
+            Const.DIAGNOSTICS: (self._process_diagnostics, None, False),
+            Const.GET_COM_EVENT_COUNTER: (self._process_comm_event_counter,
+                                          None, False),
+        }
+
+        # registers which can be set by remote device, their changes are
+        # kept in a journal of fixed size
         self._changeable_register_types = ['COILS', 'HREGS']
-        self._changed_registers = dict()
-        for reg_type in self._changeable_register_types:
-            self._changed_registers[reg_type] = dict()
+        self._journal = ChangeJournal(capacity=self.CHANGE_JOURNAL_SIZE)
 
     def process(self) -> bool:
 
-        reg_type = None
-        req_type = None
-
-        request = self._itf.get_request(unit_addr_list=self._addr_list,
+        request = self._itf.get_request(unit_addr_map=self._unit_map,
                                         timeout=0)
+        if request is None and self._extra_itfs:
+            for itf in self._extra_itfs:
+                request = itf.get_request(unit_addr_map=self._unit_map,
+                                          timeout=0)
+                if request is not None:
+                    break
         
         #print(f"DEBUG: Processing in modbus.py - Func: {request.function}, Addr: {request.register_addr}")
         
         if request is None:
             return False
 
-        if request.function == Const.READ_COILS:
-            reg_type = 'COILS'
-            req_type = 'READ'
-        elif request.function == Const.READ_DISCRETE_INPUTS:
-            reg_type = 'ISTS'
-            req_type = 'READ'
-        elif request.function == Const.READ_HOLDING_REGISTERS:
-            reg_type = 'HREGS'
-            req_type = 'READ'
-        elif request.function == Const.READ_INPUT_REGISTER:
-            reg_type = 'IREGS'
-            req_type = 'READ'
-        elif (request.function == Const.WRITE_SINGLE_COIL or
-                request.function == Const.WRITE_MULTIPLE_COILS):
-            reg_type = 'COILS'
-            req_type = 'WRITE'
-        elif (request.function == Const.WRITE_SINGLE_REGISTER or
-                request.function == Const.WRITE_MULTIPLE_REGISTERS):
-            reg_type = 'HREGS'
-            req_type = 'WRITE'
-        else:
+        self._process_request(request=request)
+
+        if self._awaiting:
+            self._awaiting.clear()
+            raise TypeError('coroutine callbacks are only run by serve()')
+
+        return True
+
+    async def serve(self, poll_ms: int = 10) -> None:
+        """
+        Serve the requests of all interfaces as asyncio tasks, never returns
+
+        Interfaces with get_request_async(), e.g. Serial, wait for frames
+        without blocking other tasks, the others are polled every poll_ms.
+        A register callback may be a coroutine function. Its coroutine is
+        awaited after the response was sent and before the next request of
+        the interface is processed. Interfaces added later are not served.
+        """
+        import asyncio
+
+        itfs = [self._itf] + self._extra_itfs
+        await asyncio.gather(*[self._serve_itf(itf=itf, poll_ms=poll_ms)
+                               for itf in itfs])
+
+    async def _serve_itf(self, itf, poll_ms: int) -> None:
+        import asyncio
+
+        get_request_async = getattr(itf, 'get_request_async', None)
+        awaiting = self._awaiting
+
+        while True:
+            if get_request_async is not None:
+                request = await get_request_async(unit_addr_map=self._unit_map)
+            else:
+                request = itf.get_request(unit_addr_map=self._unit_map,
+                                          timeout=0)
+                if request is None:
+                    await asyncio.sleep_ms(poll_ms)
+
+            if request is None:
+                continue
+
+            self._process_request(request=request)
+            while awaiting:
+                await awaiting.pop(0)
+
+    def _process_request(self, request: Request) -> None:
+
+        unit_addr = request.unit_addr
+        if unit_addr == Const.BROADCAST_ADDRESS:
+            self._process_broadcast(request=request)
+            return
+
+        unit = self
+        if self._units:
+            unit = self._units.get(unit_addr, self)
+
+        handler = unit._function_handlers.get(request.function, None)
+        if handler is None:
             request.send_exception(Const.ILLEGAL_FUNCTION)
+        else:
+            handler[0](request, handler[1])
+
+    def _process_broadcast(self, request: Request) -> None:
+
+        # the interface never answers a broadcast, every unit which has a
+        # handler accepting it executes the request
+        handler = self._function_handlers.get(request.function, None)
+        if handler is not None and handler[2]:
+            handler[0](request, handler[1])
+
+        for unit in self._units.values():
+            handler = unit._function_handlers.get(request.function, None)
+            if handler is not None and handler[2]:
+                handler[0](request, handler[1])
+
+    def add_interface(self, itf) -> None:
+        """
+        Serve the registers on a further interface as well
 
-        if reg_type:
-            if req_type == 'READ':
-                self._process_read_access(request=request, reg_type=reg_type)
-            elif req_type == 'WRITE':
-                self._process_write_access(request=request, reg_type=reg_type)
+        Requests of all interfaces are handled by process(), each response
+        goes back to the interface of its request. An RTU slave can so be
+        reached over Modbus TCP too, e.g. with a bound tcp.TCPServer.
+        """
+        if itf is self._itf or itf in self._extra_itfs:
+            raise ValueError('interface is already used')
+
+        self._extra_itfs.append(itf)
+
+    def remove_interface(self, itf) -> bool:
+
+        if itf not in self._extra_itfs:
+            return False
+
+        self._extra_itfs.remove(itf)
 
         return True
 
+    def add_unit(self, addr: int) -> 'Modbus':
+        """
+        Serve a virtual unit address with its own set of registers
+
+        The returned object is used to add and access the registers of the
+        unit, requests are still processed by this object only.
+
+        :returns:   Register set of the unit
+        :rtype:     Modbus
+        """
+        if addr in self._addr_list or addr in self._units:
+            raise ValueError('unit address {} is already used'.format(addr))
+
+        self._set_unit_bit(addr)
+        unit = Modbus(self._itf, [addr])
+        unit._awaiting = self._awaiting
+        self._units[addr] = unit
+
+        return unit
+
+    def remove_unit(self, addr: int) -> bool:
+
+        if self._units.pop(addr, None) is None:
+            return False
+
+        self._unit_map[addr >> 3] &= ~(1 << (addr & 7)) & 0xFF
+
+        return True
+
+    def _set_unit_bit(self, addr: int) -> None:
+
+        if not Const.MIN_UNIT_ADDRESS <= addr <= Const.MAX_UNIT_ADDRESS:
+            raise ValueError('invalid unit address {}'.format(addr))
+
+        self._unit_map[addr >> 3] |= 1 << (addr & 7)
+
+    def add_function_handler(self,
+                             function_code: int,
+                             handler: Callable[[Request, Optional[str]], None],
+                             reg_type: Optional[str] = None,
+                             broadcast: bool = False) -> None:
+        """
+        Process requests with function_code by calling handler
+
+        The handler is called as handler(request, reg_type) and has to send
+        the response itself, e.g. with request.send_pdu(). For function codes
+        without a built-in decoder request.data holds the PDU after the
+        function code. A built-in function code can be overridden as well.
+        With broadcast the handler is called for requests to address 0 too,
+        any response to those is discarded by the interface.
+        """
+        if not 0 < function_code < Const.ERROR_BIAS:
+            raise ValueError('invalid function code {}'.format(function_code))
+
+        if reg_type is not None and not self._check_valid_register(reg_type):
+            raise KeyError('{} is not a valid register type of {}'.
+                           format(reg_type, self._available_register_types))
+
+        self._function_handlers[function_code] = (handler, reg_type, broadcast)
+
+    def remove_function_handler(self, function_code: int) -> bool:
+
+        return self._function_handlers.pop(function_code, None) is not None
+
     def _create_response(self,
                          request: Request,
                          reg_type: str) -> Union[List[bool], List[int]]:
         data = []
-        default_value = {'val': 0}
+        default_value = self._default_vals[reg_type]
         reg_dict = self._register_dict[reg_type]
 
-        if reg_type in ['COILS', 'ISTS']:
-            default_value = {'val': False}
-
         for addr in range(request.register_addr,
                           request.register_addr + request.quantity):
-            value = reg_dict.get(addr, default_value)['val']
+            if addr in reg_dict:
+                value = reg_dict[addr]['val']
+            else:
+                bank = self._find_bank(reg_type=reg_type, address=addr)
+                if bank is None:
+                    value = default_value
+                else:
+                    value = bank.get(addr)
 
             if isinstance(value, (list, tuple)):
                 data.extend(value)
@@ -98,16 +294,46 @@ class Modbus(object):
 
         address = request.register_addr
 
-        if address in self._register_dict[reg_type]:
-
-            if self._register_dict[reg_type][address].get('on_get_cb', 0):
-                vals = self._create_response(request=request,
-                                             reg_type=reg_type)
-                _cb = self._register_dict[reg_type][address]['on_get_cb']
-                _cb(reg_type=reg_type, address=address, val=vals)
+        if self._has_reg(reg_type=reg_type, address=address):
+            quantity = request.quantity
+
+            # live registers are evaluated only when they are read
+            for bound, source, attr in self._bindings[reg_type]:
+                if address <= bound < address + quantity:
+                    self._store_binding(reg_type=reg_type,
+                                        address=bound,
+                                        value=source() if attr is None
+                                        else getattr(source, attr))
+
+            # let the application refresh the requested registers first,
+            # the response is built only once afterwards
+            for start, end, hook in self._read_hooks[reg_type]:
+                if start < address + quantity and address < end:
+                    first = address if address > start else start
+                    last = address + quantity if address + quantity < end else end
+                    hook(reg_type=reg_type, address=first, quantity=last - first)
+
+            _cb = self._get_reg_cb(reg_type=reg_type,
+                                   address=address,
+                                   cb_type='on_get_cb')
+
+            bank = self._find_bank(reg_type=reg_type, address=address)
+            if _cb is None and bank is not None and bank.covers(address, quantity):
+                # the whole range is served straight from the bank buffer
+                request.send_bank_response(bank)
+                return
 
             vals = self._create_response(request=request, reg_type=reg_type)
             #print(f"DEBUG: Processing in modbus.py - Modbus response: {vals}")
+            if _cb:
+                # the callback gets the current values and registers it sets
+                # are sent, the response is only built again in that case
+                writes = self._reg_writes
+                self._run_cb(cb=_cb, reg_type=reg_type, address=address,
+                             val=vals)
+                if self._reg_writes != writes:
+                    vals = self._create_response(request=request,
+                                                 reg_type=reg_type)
             request.send_response(vals)
         else:
             request.send_exception(Const.ILLEGAL_DATA_ADDRESS)
@@ -118,7 +344,7 @@ class Modbus(object):
         val = 0
         valid_register = False
 
-        if address in self._register_dict[reg_type]:
+        if self._has_reg(reg_type=reg_type, address=address):
             if request.data is None:
                 request.send_exception(Const.ILLEGAL_DATA_VALUE)
                 return
@@ -143,12 +369,15 @@ class Modbus(object):
                     self.set_coil(address=address, value=val)
             elif reg_type == 'HREGS':
                 valid_register = True
-                val = list(functions.to_short(byte_array=request.data,
-                                              signed=False))
 
-                if request.function in [Const.WRITE_SINGLE_REGISTER,
-                                        Const.WRITE_MULTIPLE_REGISTERS]:
-                    self.set_hreg(address=address, value=val)
+                if request.function == Const.MASK_WRITE_REGISTER:
+                    val = [self._mask_hreg(address=address,
+                                           masks=request.data)]
+                else:
+                    val = list(functions.to_short(byte_array=request.data,
+                                                  signed=False))
+
+                self.set_hreg(address=address, value=val)
             else:
                 # nothing except holding registers or coils can be set
                 request.send_exception(Const.ILLEGAL_FUNCTION)
@@ -158,12 +387,142 @@ class Modbus(object):
                 self._set_changed_register(reg_type=reg_type,
                                            address=address,
                                            value=val)
-                if self._register_dict[reg_type][address].get('on_set_cb', 0):
-                    _cb = self._register_dict[reg_type][address]['on_set_cb']
-                    _cb(reg_type=reg_type, address=address, val=val)
+                _cb = self._get_reg_cb(reg_type=reg_type,
+                                       address=address,
+                                       cb_type='on_set_cb')
+                if _cb:
+                    self._run_cb(cb=_cb, reg_type=reg_type, address=address,
+                                 val=val)
         else:
             request.send_exception(Const.ILLEGAL_DATA_ADDRESS)
 
+    def _process_read_write_access(self,
+                                   request: Request,
+                                   reg_type: str) -> None:
+
+        address = request.write_addr
+
+        # first and last register of both ranges are checked before
+        # anything is written
+        read_addr = request.register_addr
+        if not (self._has_reg(reg_type=reg_type, address=address) and
+                self._has_reg(reg_type=reg_type,
+                              address=address + request.write_quantity - 1) and
+                self._has_reg(reg_type=reg_type, address=read_addr) and
+                self._has_reg(reg_type=reg_type,
+                              address=read_addr + request.quantity - 1)):
+            request.send_exception(Const.ILLEGAL_DATA_ADDRESS)
+            return
+
+        # the write operation is performed before the read
+        val = list(functions.to_short(byte_array=request.data, signed=False))
+        self._set_reg_in_dict(reg_type=reg_type, address=address, value=val)
+        self._set_changed_register(reg_type=reg_type,
+                                   address=address,
+                                   value=val)
+        _cb = self._get_reg_cb(reg_type=reg_type,
+                               address=address,
+                               cb_type='on_set_cb')
+        if _cb:
+            self._run_cb(cb=_cb, reg_type=reg_type, address=address, val=val)
+
+        self._process_read_access(request=request, reg_type=reg_type)
+
+    def _run_cb(self,
+                cb: Callable[[str, int, Union[List[bool], List[int]]], None],
+                reg_type: str,
+                address: int,
+                val: Union[List[bool], List[int]]) -> None:
+        result = cb(reg_type=reg_type, address=address, val=val)
+        if type(result) is _coroutine_type:
+            self._awaiting.append(result)
+
+    def _process_comm_event_counter(self,
+                                    request: Request,
+                                    reg_type: Optional[str]) -> None:
+
+        # status word 0x0000, no program command is in progress
+        request.send_response([0, request._itf.diag.event_count & 0xFFFF])
+
+    def _process_diagnostics(self, request: Request, reg_type: Optional[str]) -> None:
+
+        # the counters of the interface the request was received on
+        diag = request._itf.diag
+        sub_function = request.register_addr
+        data = request.data
+
+        if len(data) < 2 or len(data) & 1:
+            request.send_exception(Const.ILLEGAL_DATA_VALUE)
+            return
+
+        if sub_function == Const.RETURN_QUERY_DATA:
+            request.send_response()
+            return
+
+        if len(data) != 2:
+            request.send_exception(Const.ILLEGAL_DATA_VALUE)
+            return
+
+        value = (data[0] << 8) | data[1]
+
+        if sub_function == Const.RESTART_COMMUNICATIONS:
+            if value != 0x0000 and value != 0xFF00:
+                request.send_exception(Const.ILLEGAL_DATA_VALUE)
+                return
+
+            listen_only = diag.listen_only
+            diag.listen_only = False
+            diag.clear()
+
+            # leaving the Listen Only Mode is not acknowledged
+            if not listen_only:
+                request.send_response()
+            return
+
+        if value != 0x0000:
+            request.send_exception(Const.ILLEGAL_DATA_VALUE)
+            return
+
+        if sub_function == Const.FORCE_LISTEN_ONLY_MODE:
+            diag.listen_only = True
+            diag.slave_no_response_count += 1
+            return
+        elif sub_function == Const.CLEAR_COUNTERS:
+            diag.clear()
+        elif sub_function == Const.CLEAR_OVERRUN_COUNTER:
+            diag.bus_overrun_count = 0
+        elif sub_function == Const.RETURN_BUS_MESSAGE_COUNT:
+            value = diag.bus_message_count
+        elif sub_function == Const.RETURN_BUS_COMM_ERROR_COUNT:
+            value = diag.bus_comm_error_count
+        elif sub_function == Const.RETURN_BUS_EXCEPTION_ERROR_COUNT:
+            value = diag.bus_exception_count
+        elif sub_function == Const.RETURN_SERVER_MESSAGE_COUNT:
+            value = diag.slave_message_count
+        elif sub_function == Const.RETURN_SERVER_NO_RESPONSE_COUNT:
+            value = diag.slave_no_response_count
+        elif sub_function == Const.RETURN_BUS_CHARACTER_OVERRUN_COUNT:
+            value = diag.bus_overrun_count
+        elif (sub_function == Const.RETURN_DIAGNOSTIC_REGISTER or
+                sub_function == Const.RETURN_SERVER_NAK_COUNT or
+                sub_function == Const.RETURN_SERVER_BUSY_COUNT):
+            # no diagnostic bits, NAK or busy responses are implemented
+            value = 0
+        else:
+            request.send_exception(Const.ILLEGAL_FUNCTION)
+            return
+
+        # counters are 16 bit and wrap around
+        request.send_response([value & 0xFFFF])
+
+    def _mask_hreg(self, address: int, masks: bytearray) -> int:
+
+        and_mask = (masks[0] << 8) | masks[1]
+        or_mask = (masks[2] << 8) | masks[3]
+        current = self._get_reg_in_dict(reg_type='HREGS', address=address)
+
+        return (current & and_mask) | (or_mask & ~and_mask & 0xFFFF)
+
     def add_coil(self,
                  address: int,
                  value: Union[bool, List[bool]] = False,
@@ -338,6 +697,16 @@ class Modbus(object):
                                     None
                                 ] = None) -> None:
 
+        self._reg_writes = (self._reg_writes + 1) & 0x3FFFFFFF
+
+        bank = self._find_bank(reg_type=reg_type, address=address)
+        if bank is not None:
+            bank.set(address, value)
+            bank.set_callbacks(address=address,
+                               on_set_cb=on_set_cb,
+                               on_get_cb=on_get_cb)
+            return
+
         data = {'val': value}
 
         # if the register exists already in the register dict a "set_*"
@@ -368,6 +737,10 @@ class Modbus(object):
             raise KeyError('{} is not a valid register type of {}'.
                            format(reg_type, self._available_register_types))
 
+        if self._find_bank(reg_type=reg_type, address=address) is not None:
+            raise KeyError('{} register {} is part of a bank, use remove_bank'.
+                           format(reg_type, address))
+
         return self._register_dict[reg_type].pop(address, None)
 
     def _get_reg_in_dict(self,
@@ -380,6 +753,10 @@ class Modbus(object):
 
         if address in self._register_dict[reg_type]:
             return self._register_dict[reg_type][address]['val']
+
+        bank = self._find_bank(reg_type=reg_type, address=address)
+        if bank is not None:
+            return bank.get(address)
         else:
             raise KeyError('No {} available for the register address {}'.
                            format(reg_type, address))
@@ -390,7 +767,205 @@ class Modbus(object):
             raise KeyError('{} is not a valid register type of {}'.
                            format(reg_type, self._available_register_types))
 
-        return self._register_dict[reg_type].keys()
+        if not self._banks[reg_type]:
+            return self._register_dict[reg_type].keys()
+
+        addresses = list(self._register_dict[reg_type].keys())
+        for bank in self._banks[reg_type]:
+            addresses.extend(range(bank.address, bank.end))
+
+        return addresses
+
+    def _has_reg(self, reg_type: str, address: int) -> bool:
+
+        if address in self._register_dict[reg_type]:
+            return True
+
+        return self._find_bank(reg_type=reg_type, address=address) is not None
+
+    def _get_reg_cb(self,
+                    reg_type: str,
+                    address: int,
+                    cb_type: str) -> Optional[Callable]:
+
+        if address in self._register_dict[reg_type]:
+            return self._register_dict[reg_type][address].get(cb_type, None)
+
+        bank = self._find_bank(reg_type=reg_type, address=address)
+        if bank is None:
+            return None
+
+        if cb_type == 'on_set_cb':
+            return bank.on_set_cb.get(address, None)
+
+        return bank.on_get_cb.get(address, None)
+
+    def _find_bank(self,
+                   reg_type: str,
+                   address: int) -> Optional[RegisterBank]:
+
+        for bank in self._banks[reg_type]:
+            if address in bank:
+                return bank
+
+        return None
+
+    def add_bank(self,
+                 reg_type: str,
+                 address: int,
+                 length: int,
+                 value: Union[None, bool, int, List[bool], List[int]] = None,
+                 signed: bool = False) -> RegisterBank:
+        """
+        Store a contiguous range of registers in a single compact buffer
+
+        Holding and input registers are kept in an array, coils and discrete
+        inputs are bit packed. Registers of the range which have already been
+        added to the register dict are moved into the bank together with
+        their callbacks. Afterwards the add_*, set_* and get_* functions work
+        for these addresses as before.
+        """
+        if not self._check_valid_register(reg_type=reg_type):
+            raise KeyError('{} is not a valid register type of {}'.
+                           format(reg_type, self._available_register_types))
+
+        for bank in self._banks[reg_type]:
+            if address < bank.end and bank.address < address + length:
+                raise ValueError('{} bank {}-{} overlaps bank {}-{}'.
+                                 format(reg_type, address, address + length - 1,
+                                        bank.address, bank.end - 1))
+
+        bank = RegisterBank(reg_type=reg_type,
+                            address=address,
+                            length=length,
+                            value=value,
+                            signed=signed)
+
+        reg_dict = self._register_dict[reg_type]
+        for addr in range(address, address + length):
+            if addr in reg_dict:
+                data = reg_dict.pop(addr)
+                if value is None:
+                    bank.set(addr, data['val'])
+                bank.set_callbacks(address=addr,
+                                   on_set_cb=data.get('on_set_cb', None),
+                                   on_get_cb=data.get('on_get_cb', None))
+
+        self._banks[reg_type].append(bank)
+
+        return bank
+
+    def remove_bank(self,
+                    reg_type: str,
+                    address: int) -> Optional[RegisterBank]:
+
+        if not self._check_valid_register(reg_type=reg_type):
+            raise KeyError('{} is not a valid register type of {}'.
+                           format(reg_type, self._available_register_types))
+
+        for idx, bank in enumerate(self._banks[reg_type]):
+            if bank.address == address:
+                # responses kept by the interfaces must not refer to it
+                for itf in [self._itf] + self._extra_itfs:
+                    itf.forget_bank(bank)
+                return self._banks[reg_type].pop(idx)
+
+        return None
+
+    def add_read_hook(self,
+                      reg_type: str,
+                      address: int,
+                      length: int,
+                      hook: Callable[[str, int, int], None]) -> None:
+        """
+        Call hook once per read request touching address to address+length-1
+
+        The hook is called before the response is built with the part of
+        the requested span inside its range, as
+        hook(reg_type=..., address=..., quantity=...), so it can refresh
+        exactly the registers a master is reading.
+        """
+        if not self._check_valid_register(reg_type=reg_type):
+            raise KeyError('{} is not a valid register type of {}'.
+                           format(reg_type, self._available_register_types))
+
+        self._read_hooks[reg_type].append((address, address + length, hook))
+
+    def remove_read_hook(self, reg_type: str, address: int) -> bool:
+
+        if not self._check_valid_register(reg_type=reg_type):
+            raise KeyError('{} is not a valid register type of {}'.
+                           format(reg_type, self._available_register_types))
+
+        hooks = self._read_hooks[reg_type]
+        for idx in range(len(hooks)):
+            if hooks[idx][0] == address:
+                hooks.pop(idx)
+                return True
+
+        return False
+
+    def add_binding(self,
+                    reg_type: str,
+                    address: int,
+                    source: Any,
+                    attr: Optional[str] = None) -> None:
+        """
+        Serve a register with a live value, evaluated only when it is read
+
+        Without attr source is called without arguments, e.g. a function or
+        a Pin which returns its level this way. With attr the attribute of
+        source is read, e.g. a variable of a module or an object. Words are
+        stored modulo 65536, bits as bool. The register is added if needed.
+        """
+        if not self._check_valid_register(reg_type=reg_type):
+            raise KeyError('{} is not a valid register type of {}'.
+                           format(reg_type, self._available_register_types))
+
+        if attr is None and not callable(source):
+            raise TypeError('source must be callable if no attr is given')
+
+        if not self._has_reg(reg_type=reg_type, address=address):
+            self._set_reg_in_dict(reg_type=reg_type,
+                                  address=address,
+                                  value=self._default_vals[reg_type])
+
+        self.remove_binding(reg_type=reg_type, address=address)
+        self._bindings[reg_type].append((address, source, attr))
+
+    def remove_binding(self, reg_type: str, address: int) -> bool:
+
+        if not self._check_valid_register(reg_type=reg_type):
+            raise KeyError('{} is not a valid register type of {}'.
+                           format(reg_type, self._available_register_types))
+
+        bindings = self._bindings[reg_type]
+        for idx in range(len(bindings)):
+            if bindings[idx][0] == address:
+                bindings.pop(idx)
+                return True
+
+        return False
+
+    def _store_binding(self,
+                       reg_type: str,
+                       address: int,
+                       value: Union[bool, int]) -> None:
+        # written in place, neither the register dict entry nor the bank
+        # is reallocated
+        if reg_type in ('COILS', 'ISTS'):
+            value = bool(value)
+        else:
+            value = int(value) & 0xFFFF
+
+        reg = self._register_dict[reg_type].get(address, None)
+        if reg is not None:
+            reg['val'] = value
+            return
+
+        bank = self._find_bank(reg_type=reg_type, address=address)
+        if bank is not None:
+            bank.set(address, value)
 
     def _check_valid_register(self, reg_type: str) -> bool:
 
@@ -402,17 +977,41 @@ class Modbus(object):
     @property
     def changed_registers(self) -> dict:
 
-        return self._changed_registers
+        return {reg_type: self._journal.get(reg_type=reg_type)
+                for reg_type in self._changeable_register_types}
 
     @property
     def changed_coils(self) -> dict:
 
-        return self._changed_registers['COILS']
+        return self._journal.get(reg_type='COILS')
 
     @property
     def changed_hregs(self) -> dict:
 
-        return self._changed_registers['HREGS']
+        return self._journal.get(reg_type='HREGS')
+
+    @property
+    def changes_lost(self) -> int:
+
+        return self._journal.lost
+
+    def drain_changes(self) -> ChangeJournal:
+        """
+        Iterate over and remove the register changes made by a master
+
+        Each change is a list [reg_type, address, value, ticks], oldest first.
+        A register written again before it was drained is reported once with
+        its latest value and time. The list is reused for the next change,
+        recording and draining changes does not allocate, except for the
+        traceback of the StopIteration ending a for loop. The pop() of the
+        journal returns None instead. If more registers were changed than
+        CHANGE_JOURNAL_SIZE the oldest changes are dropped, counted by
+        changes_lost.
+
+        :returns:   Iterator over the changes
+        :rtype:     ChangeJournal
+        """
+        return self._journal
 
     def _set_changed_register(self,
                               reg_type: str,
@@ -420,13 +1019,13 @@ class Modbus(object):
                               value: Union[bool, int, List[bool], List[int]]) -> None:
 
         if reg_type in self._changeable_register_types:
-            if isinstance(value, (list, tuple)):
-                for idx, val in enumerate(value):
-                    content = {'val': val, 'time': time.ticks_ms()}
-                    self._changed_registers[reg_type][address + idx] = content
+            ticks = time.ticks_ms()
+            if isinstance(value, _SEQUENCE_TYPES):
+                for val in value:
+                    self._journal.record(reg_type, address, val, ticks)
+                    address += 1
             else:
-                content = {'val': value, 'time': time.ticks_ms()}
-                self._changed_registers[reg_type][address] = content
+                self._journal.record(reg_type, address, value, ticks)
         else:
             raise KeyError('{} can not be changed externally'.format(reg_type))
 
@@ -435,19 +1034,11 @@ class Modbus(object):
                                  address: int,
                                  timestamp: int) -> bool:
 
-        result = False
-
-        if reg_type in self._changeable_register_types:
-            _changed_register_timestamp = self._changed_registers[reg_type][address]['time']
-
-            if _changed_register_timestamp == timestamp:
-                self._changed_registers[reg_type].pop(address, None)
-                result = True
-        else:
+        if reg_type not in self._changeable_register_types:
             raise KeyError('{} is not a valid register type of {}'.
                            format(reg_type, self._changeable_register_types))
 
-        return result
+        return self._journal.remove(reg_type, address, timestamp)
 
     def setup_registers(self,
                         registers: dict = dict(),
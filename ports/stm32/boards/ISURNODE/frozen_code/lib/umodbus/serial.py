@@ -1,17 +1,28 @@
 from machine import UART
 from machine import Pin
+from machine import Timer
+from machine import idle
 import struct
 import time
 
 # custom packages
 from . import const as Const
 from . import functions
+from .common import CommonModbusFunctions
+from .common import Diagnostics
 from .common import Request
 from .common import ModbusException
 from .modbus import Modbus
 
+try:
+    # native implementation, available if the firmware is built with the
+    # umodbus user C module
+    from _umodbus import crc16_modbus
+except ImportError:
+    from .functions import crc16_modbus
+
 # typing not natively supported on MicroPython
-from .typing import List, Optional, Union
+from .typing import Callable, List, Optional, Union
 
 
 class ModbusRTU(Modbus):
@@ -26,7 +37,8 @@ class ModbusRTU(Modbus):
                  ctrl_pin: int = None,
                  uart_id = 1,
                  rx_led_pin = None, # MODIFICATION: Add rx_led_pin parameter
-                 tx_led_pin = None): # MODIFICATION: Add tx_led_pin parameter
+                 tx_led_pin = None, # MODIFICATION: Add tx_led_pin parameter
+                 use_irq: bool = False):
         super().__init__(
             # set itf to Serial object, addr_list to [addr]
             Serial(uart_id=uart_id,
@@ -37,12 +49,61 @@ class ModbusRTU(Modbus):
                    pins=pins,
                    ctrl_pin=ctrl_pin,
                    rx_led_pin=rx_led_pin, # MODIFICATION: Pass rx_led_pin to Serial
-                   tx_led_pin=tx_led_pin), # MODIFICATION: Pass tx_led_pin to Serial
+                   tx_led_pin=tx_led_pin, # MODIFICATION: Pass tx_led_pin to Serial
+                   use_irq=use_irq),
             [addr]
         )
 
+    def wait_for_frame(self, timeout_ms: int) -> bool:
+        """
+        Idle until a request frame is available or timeout_ms has passed
+
+        :returns:   True if a frame is ready to be processed
+        :rtype:     bool
+        """
+        return self._itf.wait_for_frame(timeout_ms=timeout_ms)
+
+    def frame_pending(self) -> bool:
+        """
+        Check whether a received frame is waiting to be processed
+
+        :returns:   True if process() has a frame to handle
+        :rtype:     bool
+        """
+        return self._itf._frame_pending()
+
+    def rx_idle(self) -> bool:
+        """
+        Check whether the bus side is quiet, no frame queued or in progress
+
+        The end of a frame is detected by a timer running from the system
+        tick, so the MCU must not enter lightsleep unless this is True.
+
+        :returns:   True if nothing is being received
+        :rtype:     bool
+        """
+        return self._itf.rx_idle()
+
+    def set_latency_hook(self, hook: Optional[Callable[[int], None]]) -> None:
+        """
+        Set a function called with the time in microseconds from the end of
+        a received frame to the start of its response, None to remove it
+        """
+        self._itf.set_latency_hook(hook)
+
+
+class Serial(CommonModbusFunctions):
+    """
+    Modbus RTU interface
+
+    It is the interface of a ModbusRTU server and, used on its own, a master
+    with the request functions of CommonModbusFunctions.
+    """
+    #: Number of complete frames buffered in interrupt mode
+    RX_QUEUE_SIZE = 2
+    #: Number of encoded bank read responses kept for reuse, 0 disables it
+    RESPONSE_CACHE_SIZE = 4
 
-class Serial():
     def __init__(self,
                  uart_id = 1,
                  baudrate: int = 9600,
@@ -52,7 +113,8 @@ class Serial():
                  pins: List[Union[int, Pin], Union[int, Pin]] = None,
                  ctrl_pin: int = None,
                  rx_led_pin = None, # MODIFICATION: Add rx_led_pin parameter
-                 tx_led_pin = None): # MODIFICATION: Add tx_led_pin parameter
+                 tx_led_pin = None, # MODIFICATION: Add tx_led_pin parameter
+                 use_irq: bool = False):
 
         # UART flush function is introduced in Micropython v1.20.0
         self._has_uart_flush = callable(getattr(UART, "flush", None))
@@ -80,11 +142,177 @@ class Serial():
         else:
             self._inter_frame_delay = 1750
 
+        # receive path works on preallocated buffers only, a received frame
+        # is decoded into the same Request object every time
+        self._rx_buf = bytearray(Const.MAX_ADU_LENGTH)
+        self._rx_chunk = bytearray(32)
+        self._request = Request(interface=self)
+        self._rx_overrun = False
+
+        # bus health counters, served by FC08 and FC0B
+        self.diag = Diagnostics()
+
+        # responses are encoded in place, address, PDU and CRC, and written
+        # through a memoryview of the exact frame length
+        self._tx_buf = bytearray(Const.MAX_ADU_LENGTH)
+        self._tx_views = dict()
+
+        # complete frames of recent read responses served from a register
+        # bank. A frame is sent again as it is while the request is the same
+        # and the generation of the bank did not change.
+        size = self.RESPONSE_CACHE_SIZE
+        self._cache_unit = bytearray(size)
+        self._cache_key = [-1] * size
+        self._cache_bank = [None] * size
+        self._cache_gen = [0] * size
+        self._cache_adu = [None] * size
+        self._cache_next = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # end of the last received frame, used to report the response latency
+        self._frame_end_us = time.ticks_us()
+        self._latency_hook = None
+
+        # asyncio.StreamReader over the UART, created by the first call of
+        # get_request_async()
+        self._reader = None
+
+        self._irq_mode = use_irq
+        if use_irq:
+            self._init_irq_mode()
+
+    def _init_irq_mode(self) -> None:
+        if getattr(UART, 'IRQ_RXIDLE', None) is None:
+            raise ValueError('UART.IRQ_RXIDLE is not supported on this port')
+
+        # frames are assembled in place in a queue of preallocated slots.
+        # The RX idle interrupt fills the slot at the head, process() takes
+        # the one at the tail. Both counters run modulo 256 and each one is
+        # only written by one side, so no locking is needed.
+        self._rx_slots = [bytearray(Const.MAX_ADU_LENGTH)
+                          for _ in range(self.RX_QUEUE_SIZE)]
+        self._rx_slot_len = [0] * self.RX_QUEUE_SIZE
+        self._rx_slot_end = [0] * self.RX_QUEUE_SIZE
+        self._rx_head = 0
+        self._rx_tail = 0
+        self._rx_received = 0
+        self._rx_last_us = 0
+
+        # the idle interrupt fires after one character of silence, the timer
+        # covers the rest of the 3.5 characters inter-frame delay
+        silence_us = self._inter_frame_delay - self._t1char
+        self._silence_ms = max(1, (silence_us + 999) // 1000)
+        self._silence_timer = Timer(-1)
+
+        # bound methods are created once, re-arming must not allocate
+        self._on_rx_idle_cb = self._on_rx_idle
+        self._on_silence_cb = self._on_silence
+        self._uart.irq(handler=self._on_rx_idle_cb, trigger=UART.IRQ_RXIDLE)
+
+    def _on_rx_idle(self, uart: UART) -> None:
+        if (self._rx_head - self._rx_tail) & 0xFF >= self.RX_QUEUE_SIZE:
+            # queue full, the frame is lost
+            while self._uart.any():
+                self._read_available(self._rx_chunk, 0)
+            self._rx_overrun = True
+        else:
+            buf = self._rx_slots[self._rx_head % self.RX_QUEUE_SIZE]
+            self._rx_received = self._read_available(buf, self._rx_received)
+            self._rx_last_us = time.ticks_us()
+
+            if self._rx_led:
+                self._rx_led.on()
+
+        self._silence_timer.init(mode=Timer.ONE_SHOT,
+                                 period=self._silence_ms,
+                                 callback=self._on_silence_cb)
+
+    def _on_silence(self, timer: Timer) -> None:
+        if self._uart.any():
+            # more data arrived, the next idle interrupt re-arms the timer
+            return
+
+        if self._rx_overrun:
+            # the frame was truncated or the queue was full
+            self._rx_received = 0
+            self._drop_overrun_frame()
+            if self._rx_led:
+                self._rx_led.off()
+            return
+
+        if not self._rx_received:
+            return
+
+        slot = self._rx_head % self.RX_QUEUE_SIZE
+        self._rx_slot_len[slot] = self._rx_received
+        self._rx_slot_end[slot] = self._rx_last_us
+        self._rx_received = 0
+        self._rx_head = (self._rx_head + 1) & 0xFF
+
+        if self._rx_led:
+            self._rx_led.off()
+
+    def _read_available(self, buf: bytearray, received: int) -> int:
+        available = self._uart.any()
+        buf_len = len(buf)
+
+        if not available:
+            return received
+
+        if received == 0 and available <= buf_len:
+            # a frame that arrived while the node was busy is read at once
+            return self._uart.readinto(buf, available) or 0
+
+        chunk = self._rx_chunk
+        while available:
+            if available > len(chunk):
+                available = len(chunk)
+            count = self._uart.readinto(chunk, available) or 0
+            for idx in range(count):
+                # bytes beyond the maximum frame length are dropped
+                if received < buf_len:
+                    buf[received] = chunk[idx]
+                    received += 1
+                else:
+                    self._rx_overrun = True
+            available = self._uart.any()
+
+        return received
+
+    def wait_for_frame(self, timeout_ms: int) -> bool:
+
+        start_ms = time.ticks_ms()
+
+        while not self._frame_pending():
+            if time.ticks_diff(time.ticks_ms(), start_ms) >= timeout_ms:
+                return False
+            # sleep until the next interrupt
+            idle()
+
+        return True
+
+    def _frame_pending(self) -> bool:
+        if self._irq_mode:
+            return self._rx_head != self._rx_tail
+
+        return self._uart.any() > 0
+
+    def rx_idle(self) -> bool:
+        if self._irq_mode:
+            if self._rx_head != self._rx_tail or self._rx_received:
+                return False
+
+        return self._uart.any() == 0
+
+    def set_latency_hook(self, hook: Optional[Callable[[int], None]]) -> None:
+        self._latency_hook = hook
+
+    def _crc16(self, data: bytearray, length: int) -> int:
+        return crc16_modbus(data, 0xFFFF, 0, length)
+
     def _calculate_crc16(self, data: bytearray) -> bytes:
-        crc = 0xFFFF
-        for char in data:
-            crc = (crc >> 8) ^ Const.CRC16_TABLE[((crc) ^ char) & 0xFF]
-        return struct.pack('<H', crc)
+        return struct.pack('<H', crc16_modbus(data))
 
     def _exit_read(self, response: bytearray) -> bool:
 
@@ -118,9 +346,18 @@ class Serial():
 
         return response
 
-    def _uart_read_frame(self, timeout: Optional[int] = None) -> bytearray:
-        
-        received_bytes = bytearray()
+    def _uart_read_frame(self, timeout: Optional[int] = None) -> int:
+        """
+        Receive a frame into the preallocated receive buffer
+
+        A frame ends after a silence of the inter-frame delay. Bytes are read
+        with readinto and nothing is allocated on the heap.
+
+        :returns:   Number of bytes received, 0 on timeout
+        :rtype:     int
+        """
+        buf = self._rx_buf
+        received = 0
 
         # set default timeout to at twice the inter-frame delay
         if timeout == 0 or timeout is None:
@@ -140,34 +377,71 @@ class Serial():
 
                 while time.ticks_diff(time.ticks_us(), last_byte_ts) <= self._inter_frame_delay:
 
-                    r = self._uart.read()
+                    if not self._uart.any():
+                        continue
 
-                    if r is not None:
-                        received_bytes.extend(r)
-                        last_byte_ts = time.ticks_us()
+                    received = self._read_available(buf, received)
+                    last_byte_ts = time.ticks_us()
 
-            if len(received_bytes) > 0:
+            if received > 0:
+                self._frame_end_us = last_byte_ts
                 # MODIFICATION: Turn RX LED off after frame is received
                 if self._rx_led:
                     self._rx_led.off()
-                return received_bytes
+                return received
 
         # MODIFICATION: Also turn RX LED off on timeout
         if self._rx_led:
             self._rx_led.off()
 
-        return received_bytes
+        return received
+
+    def _tx_view(self, length: int) -> memoryview:
+        # responses to a polling master have only a few distinct lengths, so
+        # the views are cached instead of slicing the buffer for each frame
+        view = self._tx_views.get(length, None)
+        if view is None:
+            if len(self._tx_views) >= 8:
+                self._tx_views.clear()
+            view = memoryview(self._tx_buf)[:length]
+            self._tx_views[length] = view
+        return view
 
     def _send(self, modbus_pdu: bytes, slave_addr: int) -> None:
 
-        modbus_adu = bytearray()
-        modbus_adu.append(slave_addr)
-        modbus_adu.extend(modbus_pdu)
-        modbus_adu.extend(self._calculate_crc16(modbus_adu))
-        
-        #print(f"DEBUG: _send() - Final frame to transmit: {modbus_adu}")
+        modbus_adu = self._tx_buf
+        modbus_adu[0] = slave_addr
+        pdu_len = len(modbus_pdu)
+        modbus_adu[1:1 + pdu_len] = modbus_pdu
+        self._send_adu(1 + pdu_len)
+
+    def _send_adu(self, length: int) -> None:
+        """
+        Append the CRC to the first length bytes of the transmit buffer,
+        which already hold address and PDU, and send the frame
+        """
+        modbus_adu = self._tx_buf
+        self._append_crc(modbus_adu, length)
+        length += Const.CRC_LENGTH
+
+        #print(f"DEBUG: _send() - Final frame to transmit: {modbus_adu[:length]}")
+        self._write_adu(self._tx_view(length), length)
+
+    def _append_crc(self, modbus_adu: bytearray, length: int) -> None:
+        crc = crc16_modbus(modbus_adu, 0xFFFF, 0, length)
+        modbus_adu[length] = crc & 0xFF
+        modbus_adu[length + 1] = crc >> 8
+
+    def _write_adu(self, modbus_adu: memoryview, length: int) -> None:
+        """
+        Send a complete frame of length bytes, address, PDU and CRC
+        """
         #print("DEBUG: _send() - About to call self._uart.write()")
-        
+
+        if self._latency_hook:
+            self._latency_hook(time.ticks_diff(time.ticks_us(),
+                                               self._frame_end_us))
+
         # MODIFICATION: Turn TX LED on right before sending
         if self._tx_led:
             self._tx_led.on()
@@ -187,7 +461,7 @@ class Serial():
             time.sleep_us(self._t1char)
         else:
             sleep_time_us = (
-                self._t1char * len(modbus_adu) -    # total frame time in us
+                self._t1char * length -    # total frame time in us
                 time.ticks_diff(send_finish_time, send_start_time) +
                 100     # only required at baudrates above 57600, but hey 100us
             )
@@ -200,6 +474,65 @@ class Serial():
         if self._tx_led:
             self._tx_led.off()
 
+    def _send_receive(self,
+                      slave_addr: int,
+                      modbus_pdu: bytes,
+                      count: bool) -> bytes:
+        """
+        Send a request as master and wait for the response of the slave
+
+        A broadcast is sent to all slaves, none of them answers it, so no
+        response is awaited. Only writes can be broadcast.
+
+        :returns:   Response data after the header, with count also after the
+                    byte count, None for a broadcast
+        :rtype:     bytes
+        """
+        if slave_addr == Const.BROADCAST_ADDRESS:
+            if modbus_pdu[0] <= Const.READ_INPUT_REGISTER:
+                raise ValueError('only writes can be broadcast')
+
+            self._send(modbus_pdu=modbus_pdu, slave_addr=slave_addr)
+            return None
+
+        # drop anything left over from an earlier response
+        self._uart.read()
+
+        self._send(modbus_pdu=modbus_pdu, slave_addr=slave_addr)
+
+        return self._validate_resp_hdr(response=self._uart_read(),
+                                       slave_addr=slave_addr,
+                                       function_code=modbus_pdu[0],
+                                       count=count)
+
+    def _validate_resp_hdr(self,
+                           response: bytearray,
+                           slave_addr: int,
+                           function_code: int,
+                           count: bool) -> bytes:
+
+        if len(response) == 0:
+            raise OSError('no data received from slave')
+
+        crc_pos = len(response) - Const.CRC_LENGTH
+        expected_crc = self._crc16(response, crc_pos)
+        if (response[crc_pos] != (expected_crc & 0xFF) or
+                response[crc_pos + 1] != (expected_crc >> 8)):
+            raise OSError('invalid response CRC')
+
+        if response[0] != slave_addr:
+            raise ValueError('wrong slave address')
+
+        if response[1] == (function_code + Const.ERROR_BIAS):
+            raise ValueError('slave returned exception code: {:d}'.
+                             format(response[2]))
+
+        hdr_length = Const.RESPONSE_HDR_LENGTH
+        if count:
+            hdr_length += 1
+
+        return bytes(response[hdr_length:crc_pos])
+
     def send_response(self,
                       slave_addr: int,
                       function_code: int,
@@ -210,7 +543,18 @@ class Serial():
                       signed: bool = True) -> None:
 
         #print(f"DEBUG: Processing in serial.py - Modbus response: {values}")
-        modbus_pdu = functions.response(
+        if function_code != Const.GET_COM_EVENT_COUNTER:
+            # polling the event counter does not count as an event
+            self.diag.event_count += 1
+
+        if slave_addr == Const.BROADCAST_ADDRESS:
+            # the result of a broadcast request is not sent
+            return
+
+        self._tx_buf[0] = slave_addr
+        pdu_len = functions.response_into(
+            buf=self._tx_buf,
+            offset=1,
             function_code=function_code,
             request_register_addr=request_register_addr,
             request_register_qty=request_register_qty,
@@ -218,7 +562,136 @@ class Serial():
             value_list=values,
             signed=signed
         )
-        #print(f"DEBUG: Processing in serial.py - Modbus pdu: {modbus_pdu}")
+        self._send_adu(1 + pdu_len)
+
+    def send_bank_response(self,
+                           slave_addr: int,
+                           function_code: int,
+                           request_register_addr: int,
+                           request_register_qty: int,
+                           bank) -> None:
+        """
+        Send the response of a read request served from a register bank
+
+        The frames of the last RESPONSE_CACHE_SIZE distinct read requests
+        are kept. While the generation of the bank is unchanged the kept
+        frame is written again without encoding it, counted in cache_hits.
+        Otherwise it is encoded in place, counted in cache_misses if the
+        request is one which is kept.
+        """
+        self.diag.event_count += 1
+
+        if slave_addr == Const.BROADCAST_ADDRESS:
+            return
+
+        # function code, start and quantity of a read request fit in a
+        # small int: 3 + 16 + 11 bits. FC23 writes before it reads, so its
+        # response is not kept.
+        idx = -1
+        key = -1
+        if function_code <= Const.READ_INPUT_REGISTER:
+            key = ((function_code << 27) | (request_register_addr << 11) |
+                   request_register_qty)
+            for slot in range(self.RESPONSE_CACHE_SIZE):
+                if (self._cache_key[slot] == key and
+                        self._cache_unit[slot] == slave_addr and
+                        self._cache_bank[slot] is bank):
+                    idx = slot
+                    break
+
+        if idx >= 0 and self._cache_gen[idx] == bank.generation:
+            self.cache_hits += 1
+            adu = self._cache_adu[idx]
+            self._write_adu(adu, len(adu))
+            return
+
+        length = 1 + Const.RESPONSE_HDR_LENGTH + bank.byte_count(
+            request_register_qty)
+
+        if key < 0 or not self.RESPONSE_CACHE_SIZE:
+            self._pack_bank_response(modbus_adu=self._tx_buf,
+                                     slave_addr=slave_addr,
+                                     function_code=function_code,
+                                     request_register_addr=request_register_addr,
+                                     request_register_qty=request_register_qty,
+                                     bank=bank)
+            self._send_adu(length)
+            return
+
+        self.cache_misses += 1
+        if idx < 0:
+            idx = self._cache_slot(slave_addr=slave_addr,
+                                   key=key,
+                                   bank=bank,
+                                   length=length + Const.CRC_LENGTH)
+
+        # a request always has the same response length, the frame is
+        # encoded right into its slot
+        adu = self._cache_adu[idx]
+        self._pack_bank_response(modbus_adu=adu,
+                                 slave_addr=slave_addr,
+                                 function_code=function_code,
+                                 request_register_addr=request_register_addr,
+                                 request_register_qty=request_register_qty,
+                                 bank=bank)
+        self._append_crc(adu, length)
+        self._cache_gen[idx] = bank.generation
+        self._write_adu(adu, length + Const.CRC_LENGTH)
+
+    def _pack_bank_response(self,
+                            modbus_adu: bytearray,
+                            slave_addr: int,
+                            function_code: int,
+                            request_register_addr: int,
+                            request_register_qty: int,
+                            bank) -> None:
+        modbus_adu[0] = slave_addr
+        modbus_adu[1] = function_code
+        modbus_adu[2] = bank.byte_count(request_register_qty)
+        bank.pack_into(modbus_adu,
+                       1 + Const.RESPONSE_HDR_LENGTH,
+                       request_register_addr,
+                       request_register_qty)
+
+    def _cache_slot(self,
+                    slave_addr: int,
+                    key: int,
+                    bank,
+                    length: int) -> int:
+        # the slots are replaced in turn
+        idx = self._cache_next
+        self._cache_next = (idx + 1) % self.RESPONSE_CACHE_SIZE
+
+        adu = self._cache_adu[idx]
+        if adu is None or len(adu) != length:
+            adu = memoryview(bytearray(length))
+            self._cache_adu[idx] = adu
+
+        self._cache_unit[idx] = slave_addr
+        self._cache_key[idx] = key
+        self._cache_bank[idx] = bank
+
+        return idx
+
+    def forget_bank(self, bank) -> None:
+        """
+        Drop the kept responses of a register bank which is removed
+
+        :param      bank:  The removed register bank
+        :type       bank:  RegisterBank
+        """
+        for idx in range(self.RESPONSE_CACHE_SIZE):
+            if self._cache_bank[idx] is bank:
+                self._cache_key[idx] = -1
+                self._cache_bank[idx] = None
+
+    def send_pdu(self, slave_addr: int, modbus_pdu: bytes) -> None:
+
+        self.diag.event_count += 1
+
+        if slave_addr == Const.BROADCAST_ADDRESS:
+            return
+
         self._send(modbus_pdu=modbus_pdu, slave_addr=slave_addr)
 
     def send_exception_response(self,
@@ -226,38 +699,150 @@ class Serial():
                                 function_code: int,
                                 exception_code: int) -> None:
 
-        modbus_pdu = functions.exception_response(
+        self.diag.bus_exception_count += 1
+
+        if slave_addr == Const.BROADCAST_ADDRESS:
+            return
+
+        self._tx_buf[0] = slave_addr
+        pdu_len = functions.exception_response_into(
+            buf=self._tx_buf,
+            offset=1,
             function_code=function_code,
             exception_code=exception_code)
-        self._send(modbus_pdu=modbus_pdu, slave_addr=slave_addr)
+        self._send_adu(1 + pdu_len)
 
     def get_request(self,
-                    unit_addr_list: List[int],
+                    unit_addr_map: bytearray,
                     timeout: Optional[int] = None) -> Union[Request, None]:
 
-        req = self._uart_read_frame(timeout=timeout)
-        
-        #print(f"DEBUG: Frame received: {req}")
+        if self._irq_mode:
+            if self._rx_head == self._rx_tail:
+                return None
+
+            slot = self._rx_tail % self.RX_QUEUE_SIZE
+            self._frame_end_us = self._rx_slot_end[slot]
+            try:
+                return self._decode_request(self._rx_slots[slot],
+                                            self._rx_slot_len[slot],
+                                            unit_addr_map)
+            finally:
+                # the request does not reference the slot after decoding
+                self._rx_tail = (self._rx_tail + 1) & 0xFF
+
+        req_len = self._uart_read_frame(timeout=timeout)
+        if self._rx_overrun:
+            self._drop_overrun_frame()
+            return None
+
+        return self._decode_request(self._rx_buf, req_len, unit_addr_map)
+
+    async def get_request_async(self,
+                                unit_addr_map: bytearray) -> Union[Request, None]:
+        """
+        Wait for the next frame without blocking other asyncio tasks
+
+        The first byte of a frame is awaited on an asyncio.StreamReader over
+        the UART. The rest is read as it arrives, the frame ends after the
+        inter-frame delay passed without a further byte. In interrupt mode
+        the receive queue is checked once per inter-frame delay instead.
+
+        :returns:   The request, None if the frame is invalid or not addressed
+                    to this server
+        :rtype:     Union[Request, None]
+        """
+        import asyncio
+
+        silence_ms = max(1, (self._inter_frame_delay + 999) // 1000)
 
-        if len(req) < 8:
+        if self._irq_mode:
+            while self._rx_head == self._rx_tail:
+                await asyncio.sleep_ms(silence_ms)
+            return self.get_request(unit_addr_map=unit_addr_map)
+
+        if self._reader is None:
+            self._reader = asyncio.StreamReader(self._uart)
+            self._rx_first = memoryview(self._rx_buf)[:1]
+
+        received = await self._reader.readinto(self._rx_first)
+        if not received:
             return None
 
-        if req[0] not in unit_addr_list:
-            #print(f"DEBUG: Wrong Slave ID. Got {req[0]}, expected one of {unit_addr_list}")
+        if self._rx_led:
+            self._rx_led.on()
+
+        while True:
+            received = self._read_available(self._rx_buf, received)
+            self._frame_end_us = time.ticks_us()
+            await asyncio.sleep_ms(silence_ms)
+            if not self._uart.any():
+                break
+
+        if self._rx_led:
+            self._rx_led.off()
+
+        if self._rx_overrun:
+            self._drop_overrun_frame()
             return None
 
-        req_crc = req[-Const.CRC_LENGTH:]
-        req_no_crc = req[:-Const.CRC_LENGTH]
-        expected_crc = self._calculate_crc16(req_no_crc)
+        return self._decode_request(self._rx_buf, received, unit_addr_map)
+
+    def _drop_overrun_frame(self) -> None:
+        # a truncated frame would only fail the CRC check
+        self._rx_overrun = False
+        self.diag.bus_message_count += 1
+        self.diag.bus_overrun_count += 1
 
-        if (req_crc[0] != expected_crc[0]) or (req_crc[1] != expected_crc[1]):
-            #print(f"DEBUG: CRC Mismatch. Got {req_crc}, expected {expected_crc}")
+    def _decode_request(self,
+                        req: bytearray,
+                        req_len: int,
+                        unit_addr_map: bytearray) -> Union[Request, None]:
+
+        #print(f"DEBUG: Frame received: {req[:req_len]}")
+
+        if req_len == 0:
             return None
-        
+
+        diag = self.diag
+        diag.bus_message_count += 1
+
+        # the CRC is checked for every frame on the bus, so errors are
+        # counted even if they hide the slave address
+        if req_len < 4:
+            diag.bus_comm_error_count += 1
+            return None
+
+        req_len -= Const.CRC_LENGTH
+        expected_crc = self._crc16(req, req_len)
+
+        if (req[req_len] != (expected_crc & 0xFF)) or (req[req_len + 1] != (expected_crc >> 8)):
+            #print(f"DEBUG: CRC Mismatch. Got {req[req_len:req_len + 2]}, expected {expected_crc}")
+            diag.bus_comm_error_count += 1
+            return None
+
+        # bitmap over all unit addresses, bit n set if address n is served
+        unit_addr = req[0]
+        if not (unit_addr_map[unit_addr >> 3] >> (unit_addr & 7)) & 1:
+            #print(f"DEBUG: Wrong Slave ID. Got {req[0]}")
+            return None
+
         #print("DEBUG: Slave ID and CRC OK!")
+        diag.slave_message_count += 1
+
+        if unit_addr == Const.BROADCAST_ADDRESS:
+            # broadcasts are never answered
+            diag.slave_no_response_count += 1
+
+        if diag.listen_only:
+            # only a restart communications request is processed
+            if (req[1] != Const.DIAGNOSTICS or req_len < 4 or
+                    ((req[2] << 8) | req[3]) != Const.RESTART_COMMUNICATIONS):
+                diag.slave_no_response_count += 1
+                return None
 
+        request = self._request
         try:
-            request = Request(interface=self, data=req_no_crc)
+            request.parse(req, req_len)
         except ModbusException as e:
             self.send_exception_response(
                 slave_addr=req[0],
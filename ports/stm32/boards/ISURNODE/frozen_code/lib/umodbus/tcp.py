@@ -0,0 +1,545 @@
+from micropython import const
+import select
+import socket
+
+# custom packages
+from . import const as Const
+from . import functions
+from .common import Diagnostics
+from .common import Request
+from .common import ModbusException
+from .modbus import Modbus
+
+try:
+    # native implementation, available if the firmware is built with the
+    # umodbus user C module
+    from _umodbus import crc16_modbus
+except ImportError:
+    from .functions import crc16_modbus
+
+# typing not natively supported on MicroPython
+from .typing import List, Optional, Union
+
+#: Unit address of a Modbus TCP request to the server itself
+TCP_UNIT_ADDRESS = const(0xFF)
+
+
+class ModbusTCP(Modbus):
+    """
+    Modbus TCP server
+
+    With addr_list None every unit address is served, as a Modbus TCP
+    server usually is the only unit behind its IP address.
+    """
+    def __init__(self, addr_list: Optional[List[int]] = None) -> None:
+        if addr_list is None:
+            addr_list = list(range(Const.MIN_UNIT_ADDRESS,
+                                   Const.MAX_UNIT_ADDRESS + 1))
+
+        super().__init__(
+            # set itf to TCPServer object
+            self._create_itf(),
+            addr_list
+        )
+
+    def _create_itf(self) -> 'TCPServer':
+        return TCPServer()
+
+    def bind(self,
+             local_ip: str,
+             local_port: int = 502,
+             max_connections: int = 10) -> None:
+        """
+        Listen for clients on local_ip and local_port
+
+        :param      local_ip:         The IP address to listen on
+        :param      local_port:       The port to listen on
+        :param      max_connections:  Number of clients served at once
+        """
+        self._itf.bind(local_ip=local_ip,
+                       local_port=local_port,
+                       max_connections=max_connections)
+
+    def get_bound_status(self) -> bool:
+        """
+        Get the IP bound status
+
+        :returns:   True if listening for clients
+        :rtype:     bool
+        """
+        return self._itf.get_is_bound()
+
+    def close(self) -> None:
+        """Close the listening socket and all client connections"""
+        self._itf.close()
+
+
+class ModbusRTUOverTCP(ModbusTCP):
+    """
+    Modbus RTU frames, address, PDU and CRC, served over TCP
+
+    This is what serial device servers and many gateways forward to a TCP
+    port, the register map is served the same way as by ModbusRTU.
+    """
+    def __init__(self, addr_list: List[int]) -> None:
+        super().__init__(addr_list=addr_list)
+
+    def _create_itf(self) -> 'TCPServer':
+        return RTUOverTCPServer()
+
+
+class TCPConnection(object):
+    """Receive state of a connected client"""
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.buf = bytearray(Const.MBAP_HDR_LENGTH + Const.MAX_ADU_LENGTH)
+        self.view = memoryview(self.buf)
+        self.received = 0
+        # transaction identifier of the request being processed
+        self.tid = 0
+
+
+class TCPServer(object):
+    """
+    Modbus TCP interface with MBAP framing
+
+    The server never blocks: the listening socket and all clients are polled
+    with the timeout given to get_request(), 0 by Modbus.process(). Each
+    call returns at most one request, further requests already received
+    from a client are returned by the next calls.
+    """
+    #: Offset of the unit address in a frame
+    UNIT_OFFSET = Const.MBAP_HDR_LENGTH - 1
+
+    def __init__(self) -> None:
+        self._sock = None
+        self._is_bound = False
+        self._max_connections = 0
+        self._connections = dict()
+        self._poll = select.poll()
+        # connections are only closed outside of loops over them
+        self._closing = []
+
+        # a request is decoded from here, the client buffer is reused
+        self._rx_buf = bytearray(Const.MAX_ADU_LENGTH)
+
+        # client of the request being processed, its response goes there
+        self._current = None
+        self._request = Request(interface=self)
+
+        # bus health counters, served by FC08 and FC0B
+        self.diag = Diagnostics()
+
+        # responses are encoded in place after the header and written
+        # through a memoryview of the exact frame length
+        self._tx_buf = bytearray(Const.MBAP_HDR_LENGTH + Const.MAX_ADU_LENGTH)
+        self._tx_views = dict()
+
+    def bind(self,
+             local_ip: str,
+             local_port: int = 502,
+             max_connections: int = 10) -> None:
+
+        if self._sock:
+            self.close()
+
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(socket.getaddrinfo(local_ip, local_port)[0][-1])
+        self._sock.listen(max_connections)
+        self._sock.setblocking(False)
+        self._poll.register(self._sock, select.POLLIN)
+        self._max_connections = max_connections
+        self._is_bound = True
+
+    def get_is_bound(self) -> bool:
+        return self._is_bound
+
+    def close(self) -> None:
+        for conn in list(self._connections.values()):
+            self._close_connection(conn)
+
+        if self._sock:
+            self._poll.unregister(self._sock)
+            self._sock.close()
+            self._sock = None
+
+        self._is_bound = False
+
+    @property
+    def connections(self) -> int:
+        """Number of connected clients"""
+        return len(self._connections)
+
+    def _accept(self) -> None:
+        try:
+            sock, _ = self._sock.accept()
+        except OSError:
+            return
+
+        if len(self._connections) >= self._max_connections:
+            sock.close()
+            return
+
+        sock.setblocking(False)
+        self._connections[sock] = TCPConnection(sock)
+        self._poll.register(sock, select.POLLIN)
+
+    def _close_later(self, conn: TCPConnection) -> None:
+        if conn not in self._closing:
+            self._closing.append(conn)
+
+    def _close_pending(self) -> None:
+        while self._closing:
+            self._close_connection(self._closing.pop())
+
+    def _close_connection(self, conn: TCPConnection) -> None:
+        if conn.sock not in self._connections:
+            return
+        self._poll.unregister(conn.sock)
+        self._connections.pop(conn.sock, None)
+        conn.sock.close()
+        if self._current is conn:
+            self._current = None
+
+    def _receive(self, conn: TCPConnection) -> None:
+        free = len(conn.buf) - conn.received
+        if free == 0:
+            # a frame longer than the buffer can never be completed
+            self.diag.bus_overrun_count += 1
+            self._close_later(conn)
+            return
+
+        try:
+            count = conn.sock.readinto(conn.view[conn.received:])
+        except OSError:
+            self._close_later(conn)
+            return
+
+        if count is None:
+            # nothing to read after all
+            return
+
+        if count == 0:
+            # closed by the client
+            self._close_later(conn)
+            return
+
+        conn.received += count
+
+    def get_request(self,
+                    unit_addr_map: bytearray,
+                    timeout: Optional[int] = None) -> Union[Request, None]:
+        """
+        Get the next request of any client
+
+        :param      unit_addr_map:  Bitmap of the served unit addresses
+        :param      timeout:        Time to wait for data in ms, None or 0
+                                    to return right away
+
+        :returns:   The request, None if no complete request was received
+        :rtype:     Union[Request, None]
+        """
+        if not self._is_bound:
+            return None
+
+        # requests sent back to back by a client are taken one by one
+        request = self._next_request(unit_addr_map)
+        if request is not None:
+            return request
+
+        # the poll set is only changed after the loop
+        pending_accept = False
+        for obj, event in self._poll.ipoll(timeout or 0):
+            if obj is self._sock:
+                pending_accept = True
+                continue
+
+            conn = self._connections.get(obj, None)
+            if conn is None:
+                continue
+
+            if event & (select.POLLHUP | select.POLLERR):
+                self._close_later(conn)
+            else:
+                self._receive(conn)
+
+        self._close_pending()
+        if pending_accept:
+            self._accept()
+
+        return self._next_request(unit_addr_map)
+
+    def _next_request(self, unit_addr_map: bytearray) -> Union[Request, None]:
+        request = None
+        for conn in self._connections.values():
+            while conn.received:
+                length = self._frame_length(conn.buf, conn.received)
+                if length < 0:
+                    # framing is lost, the client has to reconnect
+                    self.diag.bus_comm_error_count += 1
+                    self._close_later(conn)
+                    break
+
+                if length == 0 or length > conn.received:
+                    break
+
+                request = self._decode_request(conn, length, unit_addr_map)
+                self._consume(conn, length)
+                if request is not None:
+                    break
+
+            if request is not None:
+                break
+
+        self._close_pending()
+        return request
+
+    def _consume(self, conn: TCPConnection, length: int) -> None:
+        remaining = conn.received - length
+        if remaining:
+            conn.buf[:remaining] = conn.buf[length:conn.received]
+        conn.received = remaining
+
+    def _frame_length(self, buf: bytearray, received: int) -> int:
+        """
+        Get the length of the frame at the start of buf
+
+        :returns:   Length of the complete frame, 0 if not yet known, -1 if
+                    the data is no valid frame
+        :rtype:     int
+        """
+        if received < Const.MBAP_HDR_LENGTH:
+            return 0
+
+        # protocol identifier 0 is Modbus
+        if buf[2] or buf[3]:
+            return -1
+
+        # the length field counts the unit address and the PDU
+        length = (buf[4] << 8) | buf[5]
+        if length < 2 or length > Const.MAX_ADU_LENGTH - Const.CRC_LENGTH:
+            return -1
+
+        return Const.MBAP_HDR_LENGTH - 1 + length
+
+    def _check_frame(self, buf: bytearray, length: int) -> int:
+        # nothing to check for TCP, the transport is reliable
+        return length - self.UNIT_OFFSET
+
+    def _decode_request(self,
+                        conn: TCPConnection,
+                        length: int,
+                        unit_addr_map: bytearray) -> Union[Request, None]:
+
+        diag = self.diag
+        diag.bus_message_count += 1
+
+        buf = conn.buf
+        req_len = self._check_frame(buf, length)
+        if req_len <= 0:
+            diag.bus_comm_error_count += 1
+            return None
+
+        # the request is parsed from a copy, the client buffer is shifted
+        # before the request is processed
+        req = self._rx_buf
+        req[:req_len] = conn.view[self.UNIT_OFFSET:self.UNIT_OFFSET + req_len]
+        unit_addr = req[0]
+        if (unit_addr != TCP_UNIT_ADDRESS and
+                not (unit_addr_map[unit_addr >> 3] >> (unit_addr & 7)) & 1):
+            return None
+
+        diag.slave_message_count += 1
+        if unit_addr == Const.BROADCAST_ADDRESS:
+            # broadcasts are never answered
+            diag.slave_no_response_count += 1
+
+        self._current = conn
+        conn.tid = (buf[0] << 8) | buf[1]
+
+        request = self._request
+        try:
+            request.parse(req, req_len)
+        except ModbusException as e:
+            self.send_exception_response(
+                slave_addr=unit_addr,
+                function_code=e.function_code,
+                exception_code=e.exception_code)
+            return None
+
+        return request
+
+    def _tx_view(self, length: int) -> memoryview:
+        view = self._tx_views.get(length, None)
+        if view is None:
+            if len(self._tx_views) >= 8:
+                self._tx_views.clear()
+            view = memoryview(self._tx_buf)[:length]
+            self._tx_views[length] = view
+        return view
+
+    def _send_frame(self, pdu_len: int) -> None:
+        """
+        Complete the frame in the transmit buffer, which already holds unit
+        address and PDU, and send it to the client of the request
+        """
+        self._send_view(self._finish_frame(pdu_len))
+
+    def _finish_frame(self, pdu_len: int) -> int:
+        tx_buf = self._tx_buf
+        tid = self._current.tid
+        length = pdu_len + 1
+        tx_buf[0] = tid >> 8
+        tx_buf[1] = tid & 0xFF
+        tx_buf[2] = 0
+        tx_buf[3] = 0
+        tx_buf[4] = length >> 8
+        tx_buf[5] = length & 0xFF
+
+        return self.UNIT_OFFSET + length
+
+    def _send_view(self, length: int) -> None:
+        conn = self._current
+        if conn is None or self._tx_buf[self.UNIT_OFFSET] == Const.BROADCAST_ADDRESS:
+            # the client is gone or the request was a broadcast
+            return
+
+        try:
+            conn.sock.write(self._tx_view(length))
+        except OSError:
+            self._close_connection(conn)
+
+    def send_response(self,
+                      slave_addr: int,
+                      function_code: int,
+                      request_register_addr: int,
+                      request_register_qty: int,
+                      request_data: list,
+                      values: Optional[list] = None,
+                      signed: bool = True) -> None:
+
+        if function_code != Const.GET_COM_EVENT_COUNTER:
+            # polling the event counter does not count as an event
+            self.diag.event_count += 1
+
+        self._tx_buf[self.UNIT_OFFSET] = slave_addr
+        pdu_len = functions.response_into(
+            buf=self._tx_buf,
+            offset=self.UNIT_OFFSET + 1,
+            function_code=function_code,
+            request_register_addr=request_register_addr,
+            request_register_qty=request_register_qty,
+            request_data=request_data,
+            value_list=values,
+            signed=signed
+        )
+        self._send_frame(pdu_len)
+
+    def send_bank_response(self,
+                           slave_addr: int,
+                           function_code: int,
+                           request_register_addr: int,
+                           request_register_qty: int,
+                           bank) -> None:
+
+        self.diag.event_count += 1
+
+        tx_buf = self._tx_buf
+        pos = self.UNIT_OFFSET
+        tx_buf[pos] = slave_addr
+        tx_buf[pos + 1] = function_code
+        tx_buf[pos + 2] = bank.byte_count(request_register_qty)
+        byte_count = bank.pack_into(tx_buf,
+                                    pos + 1 + Const.RESPONSE_HDR_LENGTH,
+                                    request_register_addr,
+                                    request_register_qty)
+        self._send_frame(Const.RESPONSE_HDR_LENGTH + byte_count)
+
+    def forget_bank(self, bank) -> None:
+        # no responses are kept
+        pass
+
+    def send_pdu(self, slave_addr: int, modbus_pdu: bytes) -> None:
+
+        self.diag.event_count += 1
+
+        pos = self.UNIT_OFFSET
+        pdu_len = len(modbus_pdu)
+        self._tx_buf[pos] = slave_addr
+        self._tx_buf[pos + 1:pos + 1 + pdu_len] = modbus_pdu
+        self._send_frame(pdu_len)
+
+    def send_exception_response(self,
+                                slave_addr: int,
+                                function_code: int,
+                                exception_code: int) -> None:
+
+        self.diag.bus_exception_count += 1
+
+        self._tx_buf[self.UNIT_OFFSET] = slave_addr
+        pdu_len = functions.exception_response_into(
+            buf=self._tx_buf,
+            offset=self.UNIT_OFFSET + 1,
+            function_code=function_code,
+            exception_code=exception_code)
+        self._send_frame(pdu_len)
+
+
+class RTUOverTCPServer(TCPServer):
+    """
+    Modbus RTU framing, address, PDU and CRC, over TCP
+
+    There is no inter-frame silence on a stream, the length of a request is
+    derived from its function code instead.
+    """
+    UNIT_OFFSET = 0
+
+    def _frame_length(self, buf: bytearray, received: int) -> int:
+        if received < 2:
+            return 0
+
+        function = buf[1]
+        if (Const.READ_COILS <= function <= Const.WRITE_SINGLE_REGISTER or
+                function == Const.DIAGNOSTICS):
+            return 8
+
+        if function == Const.GET_COM_EVENT_COUNTER:
+            return 4
+
+        if function == Const.MASK_WRITE_REGISTER:
+            return 10
+
+        if (function == Const.WRITE_MULTIPLE_COILS or
+                function == Const.WRITE_MULTIPLE_REGISTERS):
+            if received < 7:
+                return 0
+            return 7 + buf[6] + Const.CRC_LENGTH
+
+        if function == Const.READ_WRITE_MULTIPLE_REGISTERS:
+            if received < 11:
+                return 0
+            return 11 + buf[10] + Const.CRC_LENGTH
+
+        # no length known, everything received so far is taken as one frame
+        return received
+
+    def _check_frame(self, buf: bytearray, length: int) -> int:
+        if length < 4:
+            return 0
+
+        req_len = length - Const.CRC_LENGTH
+        expected_crc = crc16_modbus(buf, 0xFFFF, 0, req_len)
+        if (buf[req_len] != (expected_crc & 0xFF) or
+                buf[req_len + 1] != (expected_crc >> 8)):
+            return 0
+
+        return req_len
+
+    def _finish_frame(self, pdu_len: int) -> int:
+        length = 1 + pdu_len
+        crc = crc16_modbus(self._tx_buf, 0xFFFF, 0, length)
+        self._tx_buf[length] = crc & 0xFF
+        self._tx_buf[length + 1] = crc >> 8
+
+        return length + Const.CRC_LENGTH
@@ -1,5 +1,6 @@
 # src/modules/analog.py
-from machine import I2C, Pin
+from array import array
+from machine import I2C, Pin, Timer
 from lib.ADS1115 import *
 from modules import utils
 import json
@@ -24,7 +25,10 @@ class AnalogInput:
 
         # Initialize ADS1115.
         try:
-            self.ads = ADS1115(address=self.ads1115_addr, i2c=self.i2c)
+            # The config register is cached, a read only writes it once per
+            # conversion together with the start bit.
+            self.ads = ADS1115(address=self.ads1115_addr, i2c=self.i2c,
+                               cached=True)
             # Set gain, depending on the voltage to be read.
             self.ads.setVoltageRange_mV(ADS1115_RANGE_4096)
             # Set resolution to 16-SPS (ADS1115).
@@ -104,3 +108,281 @@ class AnalogInput:
         
         slope = (full_scale - zero)/(1.611 - 0.322)
         return slope*(value - 0.322) + zero
+
+
+# conversion time of each data rate in ms, rounded up
+_CONVERSION_MS = {
+    ADS1115_8_SPS: 125,
+    ADS1115_16_SPS: 63,
+    ADS1115_32_SPS: 32,
+    ADS1115_64_SPS: 16,
+    ADS1115_128_SPS: 8,
+    ADS1115_250_SPS: 4,
+    ADS1115_475_SPS: 3,
+    ADS1115_860_SPS: 2,
+}
+
+# full scale in mV of each PGA setting
+_RANGE_MV = {
+    ADS1115_RANGE_6144: 6144,
+    ADS1115_RANGE_4096: 4096,
+    ADS1115_RANGE_2048: 2048,
+    ADS1115_RANGE_1024: 1024,
+    ADS1115_RANGE_0512: 512,
+    ADS1115_RANGE_0256: 256,
+}
+
+_SINGLE_ENDED = (ADS1115_COMP_0_GND, ADS1115_COMP_1_GND,
+                 ADS1115_COMP_2_GND, ADS1115_COMP_3_GND)
+
+
+class AnalogScan:
+    def __init__(self, analog_input, server=None, address=0,
+                 channels=(0, 1, 2, 3), rdy_pin=None, on_scan=None):
+        """
+        Scans the ADS1115 channels in the background, one conversion after
+        the other, without waiting for any of them.
+
+        Each conversion is started with a single write of the config
+        register. When the ALERT/RDY pin signals the end of the conversion
+        the result is read, published to its input register and the next
+        channel is started. Without rdy_pin the end of each conversion is
+        timed by a Timer instead, which also covers a lost ALERT/RDY edge.
+
+        The range and data rate set on the AnalogInput are used, call
+        update_config() after changing them. read_analog() must not be used
+        while a scan is running.
+
+        Args:
+            analog_input: The AnalogInput with the ADS1115.
+            server: Modbus server the results are published to, or None.
+            address: Input register of channel 0, channel n goes to address+n.
+            channels: Channels to scan.
+            rdy_pin: Pin name or Pin object connected to ALERT/RDY, or None.
+            on_scan: Called with this object after each complete scan.
+        """
+        self.ads = analog_input.ads
+        self.i2c = analog_input.i2c
+        self.ads1115_addr = analog_input.ads1115_addr
+        self.server = server
+        self.address = address
+        self.channels = channels
+        self.on_scan = on_scan
+
+        # last result of each channel in mV
+        self.values = [0] * 4
+        self.scans = 0
+        self.timeouts = 0
+        self.errors = 0
+
+        self._running = False
+        self._converting = False
+        self._index = 0
+        self._config = bytearray(2)
+        self._result = bytearray(2)
+        self._timer = Timer(-1)
+
+        # bound methods are created once, re-arming must not allocate
+        self._on_ready_cb = self._on_ready
+        self._on_timeout_cb = self._on_timeout
+
+        self.rdy_pin = None
+        if self.ads is not None:
+            if rdy_pin is not None:
+                if isinstance(rdy_pin, str):
+                    rdy_pin = Pin(rdy_pin, Pin.IN, Pin.PULL_UP)
+                self.rdy_pin = rdy_pin
+                # ALERT/RDY is open drain and asserted low after a conversion
+                self.ads.setAlertPinMode(ADS1115_ASSERT_AFTER_1)
+                self.ads.setAlertPinToConversionReady()
+                rdy_pin.irq(trigger=Pin.IRQ_FALLING, handler=self._on_ready_cb)
+            self.update_config()
+
+    def update_config(self):
+        """
+        Takes over the range and data rate currently set on the ADS1115.
+        """
+        # the driver caches the config, the device only gets it with the
+        # next conversion
+        config = self.ads.getConfig()
+
+        # keep range, data rate and comparator settings, the channel, the
+        # single shot mode and the start bit are set per conversion
+        self._base = (config & 0x0EFF) | ADS1115_SINGLE
+        self._range_mv = _RANGE_MV[config & 0x0E00]
+        self._conversion_ms = _CONVERSION_MS[config & 0x00E0] + 1
+
+    def start(self):
+        """
+        Starts a scan of all channels.
+
+        Returns:
+            True if the scan was started, False if one is still running.
+        """
+        if self._running or self.ads is None:
+            return False
+
+        self._running = True
+        self._index = 0
+        self._convert()
+        return True
+
+    def busy(self):
+        """Returns True while a scan is running."""
+        return self._running
+
+    def _convert(self):
+        config = 0x8000 | self._base | _SINGLE_ENDED[self.channels[self._index]]
+        self._config[0] = config >> 8
+        self._config[1] = config & 0xFF
+
+        # ready interrupts are only accepted once the conversion is started
+        self._converting = True
+        try:
+            self.i2c.writeto_mem(self.ads1115_addr, 1, self._config)
+        except OSError:
+            self._abort()
+            return
+
+        # with ALERT/RDY the timer only catches a lost edge
+        period = self._conversion_ms
+        if self.rdy_pin is not None:
+            period = 2 * period + 10
+        self._timer.init(mode=Timer.ONE_SHOT,
+                         period=period,
+                         callback=self._on_timeout_cb)
+
+    def _on_timeout(self, timer):
+        if not self._converting:
+            return
+        if self.rdy_pin is not None:
+            self.timeouts += 1
+        self._on_ready(None)
+
+    def _on_ready(self, pin):
+        if not self._converting:
+            return
+        self._converting = False
+        self._timer.deinit()
+
+        try:
+            self.i2c.readfrom_mem_into(self.ads1115_addr, 0, self._result)
+        except OSError:
+            self._abort()
+            return
+
+        raw = (self._result[0] << 8) | self._result[1]
+        if raw > 32767:
+            raw -= 65536
+        # single ended inputs, a slightly negative offset reads as 0
+        value_mV = raw * self._range_mv // 32767 if raw > 0 else 0
+
+        channel = self.channels[self._index]
+        self.values[channel] = value_mV
+        if self.server is not None:
+            self.server.set_ireg(address=self.address + channel, value=value_mV)
+
+        self._index += 1
+        if self._index < len(self.channels):
+            self._convert()
+            return
+
+        self._running = False
+        self.scans += 1
+        if self.on_scan is not None:
+            self.on_scan(self)
+
+    def _abort(self):
+        self._converting = False
+        self._running = False
+        self._timer.deinit()
+        self.errors += 1
+
+
+# statistics of a channel, in this order from its first input register
+LAST = 0
+MEAN = 1
+MIN = 2
+MAX = 3
+
+
+class AnalogHistory:
+    def __init__(self, scan, server=None, address=0, window=8):
+        """
+        Keeps the results of the last scans in a ring buffer and derives
+        last, mean, min and max of each channel.
+
+        The statistics are updated after each complete scan of the
+        AnalogScan, which is hooked through its on_scan callback. With a
+        server each channel n is published to 4 input registers starting at
+        address + 4 * n: last, mean, min and max in mV. The master gets
+        averaged values with a single read, sampling runs at the rate the
+        scan is started at.
+
+        Args:
+            scan: The AnalogScan to take the results from.
+            server: Modbus server the statistics are published to, or None.
+            address: Input register of the statistics of channel 0.
+            window: Number of scans kept per channel.
+        """
+        if window < 1:
+            raise ValueError("window must be at least 1")
+
+        self.scan = scan
+        self.server = server
+        self.address = address
+        self.window = window
+
+        # window results per channel, channel n at n * window
+        self._samples = array('H', bytearray(2 * 4 * window))
+        self._index = 0
+        self.count = 0
+
+        self.last = [0] * 4
+        self.mean = [0] * 4
+        self.min = [0] * 4
+        self.max = [0] * 4
+
+        scan.on_scan = self._on_scan
+
+    def _on_scan(self, scan):
+        idx = self._index
+        window = self.window
+        if self.count < window:
+            self.count += 1
+        count = self.count
+
+        for channel in scan.channels:
+            value = scan.values[channel]
+            base = channel * window
+            self._samples[base + idx] = value
+
+            total = 0
+            low = 0xFFFF
+            high = 0
+            for pos in range(base, base + count):
+                sample = self._samples[pos]
+                total += sample
+                if sample < low:
+                    low = sample
+                if sample > high:
+                    high = sample
+
+            self.last[channel] = value
+            self.mean[channel] = total // count
+            self.min[channel] = low
+            self.max[channel] = high
+
+            if self.server is not None:
+                reg = self.address + 4 * channel
+                self.server.set_ireg(address=reg + LAST, value=value)
+                self.server.set_ireg(address=reg + MEAN, value=total // count)
+                self.server.set_ireg(address=reg + MIN, value=low)
+                self.server.set_ireg(address=reg + MAX, value=high)
+
+        self._index = (idx + 1) % window
+
+    def reset(self):
+        """Drops the collected samples."""
+        self._index = 0
+        self.count = 0
@@ -0,0 +1,492 @@
+# src/modules/counters.py
+import struct
+import time
+import machine
+from machine import Pin
+from micropython import const
+
+# STM32L43x/L44x registers, see RM0394
+_RCC = const(0x40021000)
+_RCC_CCIPR = const(0x88)
+
+_LPTIM_ISR = const(0x00)
+_LPTIM_CFGR = const(0x0C)
+_LPTIM_CR = const(0x10)
+_LPTIM_ARR = const(0x18)
+_LPTIM_CNT = const(0x1C)
+
+_ISR_ARROK = const(0x10)
+_CFGR_CKPOL_SHIFT = const(1)        # 0 rising, 1 falling, 2 both edges
+_CFGR_CKFLT_8 = const(3 << 3)       # input edges must be stable for 8 clocks
+_CFGR_COUNTMODE = const(1 << 23)    # count edges of IN1 instead of the clock
+_CR_ENABLE = const(0x01)
+_CR_CNTSTRT = const(0x04)
+_CCIPR_LSE = const(3)
+
+# counted edges, same values as the Pin IRQ triggers
+RISING = const(1)
+FALLING = const(2)
+BOTH = const(3)
+
+# counter inputs with an LPTIM behind them: (LPTIM base, pin alternate
+# function, RCC enable register, enable bit, CCIPR clock select shift)
+LPTIM_INPUTS = {
+    'PB5': (0x40007C00, 1, 0x58, 31, 18),   # LPTIM1_IN1
+    'PB1': (0x40009400, 14, 0x5C, 5, 20),   # LPTIM2_IN1
+}
+
+
+class IrqCounter:
+    def __init__(self, pin, debounce_ms=0, edge=RISING, value=0):
+        """
+        Counts edges of a pin from its interrupt handler.
+
+        The handler only increments a small pending count, it is moved into
+        the 32 bit total by value(), so the interrupt never allocates.
+
+        Args:
+            pin: Pin name or Pin object of the counter input.
+            debounce_ms: Edges closer than this to the previous one are ignored.
+            edge: RISING, FALLING or BOTH.
+            value: Initial value of the counter.
+        """
+        if isinstance(pin, str):
+            pin = Pin(pin, Pin.IN, Pin.PULL_DOWN)
+        self.pin = pin
+        self.debounce_ms = debounce_ms
+        self.edge = edge
+
+        self._total = value & 0xFFFFFFFF
+        self._pending = 0
+        self._last_edge = time.ticks_ms()
+
+        self._on_edge_cb = self._on_edge
+        self.pin.irq(trigger=edge, handler=self._on_edge_cb)
+
+    def configure(self, debounce_ms=None, edge=None):
+        """
+        Changes the debounce time and/or the counted edges.
+        """
+        if debounce_ms is not None:
+            self.debounce_ms = debounce_ms
+        if edge is not None and edge != self.edge:
+            self.edge = edge
+            self.pin.irq(trigger=edge, handler=self._on_edge_cb)
+
+    def _on_edge(self, pin):
+        if self.debounce_ms:
+            now = time.ticks_ms()
+            # If the time since the last pulse is too short, it's a bounce.
+            if time.ticks_diff(now, self._last_edge) < self.debounce_ms:
+                return
+            self._last_edge = now
+
+        self._pending += 1
+
+    def value(self):
+        """
+        Returns the counter value, modulo 2**32.
+        """
+        state = machine.disable_irq()
+        pending = self._pending
+        self._pending = 0
+        machine.enable_irq(state)
+
+        self._total = (self._total + pending) & 0xFFFFFFFF
+        return self._total
+
+    def set(self, value):
+        self.value()
+        self._total = value & 0xFFFFFFFF
+
+
+class LptimCounter:
+    def __init__(self, pin, debounce_ms=0, edge=RISING, value=0):
+        """
+        Counts edges of a pin in hardware with an LPTIM.
+
+        No code runs per edge. The LPTIM is clocked from the LSE, so it keeps
+        counting in lightsleep. Its input filter is always on, it rejects
+        glitches shorter than 8 LSE clocks (244 us). It cannot debounce a
+        contact, debounce_ms has to be 0, contacts need the debounce of an
+        IrqCounter.
+
+        The hardware counter has 16 bits, value() extends it to 32 bits and
+        has to be called at least once every 65535 edges.
+
+        Args:
+            pin: Pin name, one of LPTIM_INPUTS.
+            debounce_ms: Has to be 0, kept for the interface of IrqCounter.
+            edge: RISING, FALLING or BOTH.
+            value: Initial value of the counter.
+
+        Raises:
+            ValueError: If debounce_ms is not 0.
+        """
+        if debounce_ms:
+            raise ValueError("LPTIM inputs cannot debounce")
+
+        base, alt, enr, bit, sel = LPTIM_INPUTS[pin]
+        mem = machine.mem32
+
+        self.pin = Pin(pin, Pin.ALT, Pin.PULL_DOWN, alt=alt)
+
+        mem[_RCC + enr] |= 1 << bit
+        mem[_RCC + _RCC_CCIPR] = ((mem[_RCC + _RCC_CCIPR] & ~(3 << sel)) |
+                                  (_CCIPR_LSE << sel))
+
+        self._base = base
+        self._cnt = base + _LPTIM_CNT
+        self._total = value & 0xFFFFFFFF
+        self.debounce_ms = debounce_ms
+        self.edge = edge
+        self._start()
+
+    def _start(self):
+        mem = machine.mem32
+        base = self._base
+
+        cfgr = (_CFGR_COUNTMODE | _CFGR_CKFLT_8 |
+                ((self.edge - 1) << _CFGR_CKPOL_SHIFT))
+
+        # CFGR can only be written while disabled, ARR only while enabled
+        mem[base + _LPTIM_CR] = 0
+        mem[base + _LPTIM_CFGR] = cfgr
+        mem[base + _LPTIM_CR] = _CR_ENABLE
+        mem[base + _LPTIM_ARR] = 0xFFFF
+        for _ in range(1000):
+            if mem[base + _LPTIM_ISR] & _ISR_ARROK:
+                break
+        mem[base + _LPTIM_CR] = _CR_ENABLE | _CR_CNTSTRT
+
+        self._last = self._read()
+
+    def configure(self, debounce_ms=None, edge=None):
+        """
+        Changes the counted edges. The edges counted so far are kept, the
+        LPTIM is restarted.
+
+        Raises:
+            ValueError: If debounce_ms is not 0.
+        """
+        if debounce_ms:
+            raise ValueError("LPTIM inputs cannot debounce")
+
+        self.value()
+        if debounce_ms is not None:
+            self.debounce_ms = debounce_ms
+        if edge is not None:
+            self.edge = edge
+        self._start()
+
+    def _read(self):
+        # the counter runs from another clock, a value is only reliable if
+        # two consecutive reads return it
+        mem = machine.mem32
+        cnt = mem[self._cnt]
+        while True:
+            again = mem[self._cnt]
+            if again == cnt:
+                return cnt & 0xFFFF
+            cnt = again
+
+    def value(self):
+        """
+        Returns the counter value, modulo 2**32.
+        """
+        cnt = self._read()
+        self._total = (self._total + ((cnt - self._last) & 0xFFFF)) & 0xFFFFFFFF
+        self._last = cnt
+        return self._total
+
+    def set(self, value):
+        self.value()
+        self._total = value & 0xFFFFFFFF
+
+
+def make_counter(pin, debounce_ms=0, edge=RISING, hardware=True):
+    """
+    Creates an LptimCounter if the pin has an LPTIM input and no debounce
+    time is given, an IrqCounter otherwise.
+
+    Args:
+        pin: Pin name of the counter input.
+        debounce_ms: Debounce time, longer than the LPTIM input filter
+            can reject, so any value other than 0 counts from the pin
+            interrupt.
+        edge: RISING, FALLING or BOTH.
+        hardware: False to always count from the pin interrupt.
+
+    Returns:
+        The counter object.
+    """
+    if (hardware and not debounce_ms and pin in LPTIM_INPUTS and
+            hasattr(machine, 'mem32')):
+        return LptimCounter(pin, debounce_ms, edge)
+    return IrqCounter(pin, debounce_ms, edge)
+
+
+class RateEstimator:
+    def __init__(self, counter, window=6, ticks_ms=None):
+        """
+        Estimates the pulse rate of a counter over a sliding window.
+
+        sample() stores a timestamp and the counter value in a ring buffer
+        of window entries, the rate is taken between the oldest and the
+        newest sample. Counts are kept modulo 2**30 so that they stay small
+        ints and sampling does not allocate.
+
+        Args:
+            counter: IrqCounter or LptimCounter.
+            window: Number of samples kept, at least 2.
+            ticks_ms: Clock of the timestamps, time.ticks_ms by default. It
+                has to include the time spent in lightsleep, see Runtime.ticks.
+        """
+        if window < 2:
+            raise ValueError("window must be at least 2")
+
+        self.counter = counter
+        self._ticks_ms = ticks_ms if ticks_ms is not None else time.ticks_ms
+        self._times = [0] * window
+        self._counts = [0] * window
+        self._next = 0
+        self._filled = 0
+
+    def sample(self):
+        idx = self._next
+        self._times[idx] = self._ticks_ms()
+        self._counts[idx] = self.counter.value() & 0x3FFFFFFF
+
+        self._next = (idx + 1) % len(self._times)
+        if self._filled < len(self._times):
+            self._filled += 1
+
+    def rate(self):
+        """
+        Returns the pulses per minute over the window, 0 until two samples
+        were taken.
+        """
+        if self._filled < 2:
+            return 0
+
+        size = len(self._times)
+        newest = (self._next - 1) % size
+        oldest = (self._next - self._filled) % size
+
+        elapsed = time.ticks_diff(self._times[newest], self._times[oldest])
+        if elapsed <= 0:
+            return 0
+
+        pulses = (self._counts[newest] - self._counts[oldest]) & 0x3FFFFFFF
+        return pulses * 60000 // elapsed
+
+    def reset(self):
+        self._next = 0
+        self._filled = 0
+
+
+class Counters:
+    def __init__(self, counters, path=None, save_every=60, rate_window=6,
+                 ticks_ms=None):
+        """
+        Group of 32 bit counters, served as register pairs and checkpointed
+        to the filesystem.
+
+        poll() has to be called periodically, e.g. every 10 s. It extends
+        the hardware counters and saves the values every save_every polls,
+        but only if one of them changed, so idle counters never wear the
+        flash. littlefs replaces the file on close, a power failure while
+        saving keeps the previous checkpoint.
+
+        The rate of each counter is sampled at every poll, over the last
+        rate_window polls.
+
+        Args:
+            counters: List of IrqCounter or LptimCounter objects.
+            path: Checkpoint file, None to disable persistence.
+            save_every: Number of polls between two checkpoints.
+            rate_window: Number of polls the rates are estimated over.
+            ticks_ms: Clock of the rate estimators, see RateEstimator.
+        """
+        self.counters = counters
+        self.path = path
+        self.save_every = save_every
+        self.writes = 0
+        self.errors = 0
+
+        self._polls = 0
+        self._saved = [None] * len(counters)
+        self._values = [0] * len(counters)
+        self._fmt = '<' + 'I' * len(counters)
+        self._buf = bytearray(4 * len(counters))
+        self.rates = [RateEstimator(counter, rate_window, ticks_ms)
+                      for counter in counters]
+        self._server = None
+        self._address = None
+        self._rate_address = None
+        self._config_address = None
+        self._on_config_cb = self._on_config
+
+    def load(self):
+        """
+        Restores the counters from the checkpoint file.
+
+        Returns:
+            True if the values were restored.
+        """
+        if self.path is None:
+            return False
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+
+        if len(data) != len(self._buf):
+            return False
+
+        values = struct.unpack(self._fmt, data)
+        for idx, counter in enumerate(self.counters):
+            counter.set(values[idx])
+            self._saved[idx] = values[idx]
+        return True
+
+    def save(self, force=False):
+        """
+        Writes the checkpoint if a counter changed since the last one.
+
+        Args:
+            force: Also write if nothing changed.
+
+        Returns:
+            True if the file was written.
+        """
+        if self.path is None:
+            return False
+
+        changed = force
+        for idx, counter in enumerate(self.counters):
+            value = counter.value()
+            if value != self._saved[idx]:
+                changed = True
+            self._values[idx] = value
+        if not changed:
+            return False
+
+        struct.pack_into(self._fmt, self._buf, 0, *self._values)
+
+        try:
+            with open(self.path, 'wb') as f:
+                f.write(self._buf)
+        except OSError:
+            self.errors += 1
+            return False
+
+        for idx in range(len(self.counters)):
+            self._saved[idx] = self._values[idx]
+        self._polls = 0
+        self.writes += 1
+        return True
+
+    def poll(self):
+        """
+        Updates the counters and saves them every save_every calls.
+        """
+        for rate in self.rates:
+            rate.sample()
+
+        self._polls += 1
+        if self._polls >= self.save_every:
+            self._polls = 0
+            self.save()
+
+    def add_registers(self, server, address):
+        """
+        Serves each counter as a pair of input registers, high word first,
+        refreshed when read.
+
+        Args:
+            server: The Modbus server.
+            address: Address of the first input register.
+        """
+        for offset in range(2 * len(self.counters)):
+            server.add_ireg(address=address + offset, value=0)
+        self._address = address
+        self._server = server
+        server.add_read_hook('IREGS', address, 2 * len(self.counters),
+                             self._refresh_registers)
+
+    def _refresh_registers(self, reg_type, address, quantity):
+        # both words of a counter come from one value, they never tear
+        first = (address - self._address) // 2
+        last = (address + quantity - self._address + 1) // 2
+        for idx in range(first, last):
+            value = self.counters[idx].value()
+            reg = self._address + 2 * idx
+            self._server.set_ireg(address=reg, value=value >> 16)
+            self._server.set_ireg(address=reg + 1, value=value & 0xFFFF)
+
+    def add_rate_registers(self, server, address):
+        """
+        Serves the rate of each counter in pulses per minute as an input
+        register, limited to 65535 and computed when read.
+
+        Args:
+            server: The Modbus server.
+            address: Address of the first input register.
+        """
+        for offset in range(len(self.counters)):
+            server.add_ireg(address=address + offset, value=0)
+        self._rate_address = address
+        self._server = server
+        server.add_read_hook('IREGS', address, len(self.counters),
+                             self._refresh_rates)
+
+    def _refresh_rates(self, reg_type, address, quantity):
+        for reg in range(address, address + quantity):
+            rate = self.rates[reg - self._rate_address].rate()
+            self._server.set_ireg(address=reg,
+                                  value=rate if rate < 0xFFFF else 0xFFFF)
+
+    def add_config_registers(self, server, address):
+        """
+        Serves the input configuration of each counter as a pair of holding
+        registers, debounce time in ms and counted edges (RISING, FALLING or
+        BOTH). Invalid edge values and debounce times of an LptimCounter,
+        which cannot debounce, are rejected by restoring the register.
+
+        Args:
+            server: The Modbus server.
+            address: Address of the first holding register.
+        """
+        self._config_address = address
+        self._server = server
+        for idx, counter in enumerate(self.counters):
+            server.add_hreg(address=address + 2 * idx,
+                            value=counter.debounce_ms,
+                            on_set_cb=self._on_config_cb)
+            server.add_hreg(address=address + 2 * idx + 1,
+                            value=counter.edge,
+                            on_set_cb=self._on_config_cb)
+
+    def _on_config(self, reg_type, address, val):
+        # val holds all registers written by the request, starting at address
+        for reg in range(address, address + len(val)):
+            offset = reg - self._config_address
+            if offset < 0 or offset >= 2 * len(self.counters):
+                continue
+
+            counter = self.counters[offset // 2]
+            value = val[reg - address]
+            if offset % 2 == 0:
+                try:
+                    counter.configure(debounce_ms=value)
+                except ValueError:
+                    self._server.set_hreg(address=reg,
+                                          value=counter.debounce_ms)
+            elif RISING <= value <= BOTH:
+                counter.configure(edge=value)
+                self.rates[offset // 2].reset()
+            else:
+                self._server.set_hreg(address=reg, value=counter.edge)
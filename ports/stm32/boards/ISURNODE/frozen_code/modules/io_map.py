@@ -0,0 +1,119 @@
+# src/modules/io_map.py
+from modules.valves import OPEN
+
+
+class Pulse:
+    def __init__(self, address, valve, direction=OPEN, duration_ms=100,
+                 trigger=1, auto_clear=True):
+        """
+        Pulses a valve when the holding register is written.
+
+        Args:
+            address: Holding register address.
+            valve: Index of the valve in the ValveScheduler.
+            direction: OPEN or CLOSE.
+            duration_ms: Time the driver is switched on.
+            trigger: Written value starting the pulse, None for any value.
+            auto_clear: Reset the register to 0 once the pulse is queued.
+        """
+        self.address = address
+        self.valve = valve
+        self.direction = direction
+        self.duration_ms = duration_ms
+        self.trigger = trigger
+        self.auto_clear = auto_clear
+
+    def run(self, io_map, value):
+        io_map.valves.pulse(self.valve, self.direction, self.duration_ms)
+
+
+class Output:
+    def __init__(self, address, pin, trigger=None, auto_clear=False):
+        """
+        Sets a pin to the level written to the holding register.
+
+        Args:
+            address: Holding register address.
+            pin: Output pin, on for any value other than 0.
+            trigger: Written value switching the pin, None for any value.
+            auto_clear: Reset the register to 0 after switching the pin.
+        """
+        self.address = address
+        self.pin = pin
+        self.trigger = trigger
+        self.auto_clear = auto_clear
+
+    def run(self, io_map, value):
+        self.pin.value(1 if value else 0)
+
+
+class Command:
+    def __init__(self, address, function, trigger=1, auto_clear=True):
+        """
+        Calls a function when the holding register is written.
+
+        Args:
+            address: Holding register address.
+            function: Called with the written value.
+            trigger: Written value calling the function, None for any value.
+            auto_clear: Reset the register to 0 after the call.
+        """
+        self.address = address
+        self.function = function
+        self.trigger = trigger
+        self.auto_clear = auto_clear
+
+    def run(self, io_map, value):
+        self.function(value)
+
+
+class IOMap:
+    def __init__(self, server, valves=None, actions=()):
+        """
+        Maps holding registers to actions run when a master writes them.
+
+        The actions are run from the on_set_cb of their registers, so only
+        registers actually written are handled, nothing is polled from the
+        main loop. A write of several registers starting at a mapped one
+        runs the action of each of them.
+
+        Args:
+            server: The Modbus server holding the registers.
+            valves: ValveScheduler used by Pulse actions.
+            actions: Pulse, Output or Command objects to add.
+        """
+        self.server = server
+        self.valves = valves
+        self._actions = dict()
+        self._on_set_cb = self._on_set
+
+        for action in actions:
+            self.add(action)
+
+    def add(self, action):
+        """
+        Adds an action, its holding register is created if needed.
+        """
+        if action.address in self._actions:
+            raise ValueError(f"HREG {action.address} is already mapped")
+
+        self._actions[action.address] = action
+        self.server.add_hreg(address=action.address,
+                             value=0,
+                             on_set_cb=self._on_set_cb)
+
+    def _on_set(self, reg_type, address, val):
+        # val holds all registers written by the request, starting at address
+        for idx in range(len(val)):
+            action = self._actions.get(address + idx, None)
+            if action is None:
+                continue
+
+            value = val[idx]
+            if action.trigger is not None and value != action.trigger:
+                continue
+
+            action.run(self, value)
+
+            if action.auto_clear:
+                self.server.set_hreg(address=address + idx, value=0)
@@ -0,0 +1,250 @@
+# src/modules/runtime.py
+import time
+from machine import RTC, idle, lightsleep
+from micropython import const
+from lib.umodbus.modbus import _coroutine_type
+
+DAY_MS = const(86400000)
+
+
+def rtc_ms(rtc):
+    """
+    Returns the time of day of the RTC in milliseconds.
+    """
+    dt = rtc.datetime()
+    return ((dt[4] * 60 + dt[5]) * 60 + dt[6]) * 1000 + dt[7] // 1000
+
+
+class Runtime:
+    def __init__(self, server, max_sleep_ms=60000, min_sleep_ms=5,
+                 sleep=None, clock_ms=None, ticks_ms=None):
+        """
+        Event driven main loop, the MCU sleeps unless there is work pending.
+
+        Each pass processes the queued Modbus frames, runs the event tasks if
+        notify() was called and the periodic tasks which are due. Then the
+        MCU enters lightsleep until the next task is due. A frame on the
+        LPUART, a pin interrupt or the RTC wakes it up again.
+
+        The system tick, and with it time.ticks_ms() and the software timers,
+        is stopped in lightsleep. The time slept is measured with the RTC and
+        added to the clock of the tasks. Instead of sleeping the loop only
+        idles while a frame is being received or a guard reports busy, e.g.
+        while a valve pulse timed by a software timer is running.
+
+        Args:
+            server: The Modbus server.
+            max_sleep_ms: Longest time slept without a wake-up source.
+            min_sleep_ms: Shorter waits are spent in idle() instead.
+            sleep: Function sleeping for the given time, machine.lightsleep
+                by default.
+            clock_ms: Wall clock in ms which keeps running while asleep, the
+                RTC time of day by default.
+            ticks_ms: Clock in ms which stops while asleep, time.ticks_ms by
+                default.
+        """
+        self.server = server
+        self.max_sleep_ms = max_sleep_ms
+        self.min_sleep_ms = min_sleep_ms
+
+        self._sleep = sleep if sleep is not None else lightsleep
+        if clock_ms is None:
+            rtc = RTC()
+            clock_ms = lambda: rtc_ms(rtc)
+        self._clock_ms = clock_ms
+        self._ticks_ms = ticks_ms if ticks_ms is not None else time.ticks_ms
+
+        # tasks are [callback, period_ms, due], a period of 0 marks an
+        # event task which runs after notify()
+        self._tasks = []
+        self._guards = []
+        self._events = False
+        # asyncio.ThreadSafeFlag set by notify() while run_async() runs
+        self._flag = None
+
+        # time spent asleep, kept as an offset of the task clock
+        self._offset = 0
+        self._awake_since = self._ticks_ms()
+        self.awake_ms = 0
+        self.asleep_ms = 0
+        self.wakeups = 0
+
+        # bound method created once, notify() may be passed as IRQ handler
+        self.notify_cb = self.notify
+
+    def ticks(self):
+        """
+        Returns the task clock in ms, including the time slept.
+        """
+        return time.ticks_add(self._ticks_ms(), self._offset)
+
+    def add_task(self, callback, period_ms=0):
+        """
+        Adds a task called without arguments from the main loop.
+
+        Args:
+            callback: Function to call.
+            period_ms: Interval between two calls, 0 to call it only once
+                after each notify().
+        """
+        due = time.ticks_add(self.ticks(), period_ms)
+        self._tasks.append([callback, period_ms, due])
+
+    def add_guard(self, busy):
+        """
+        Adds a function returning True while the MCU must not lightsleep.
+        """
+        self._guards.append(busy)
+
+    def notify(self, *args):
+        """
+        Requests a run of the event tasks, safe to call from an interrupt.
+        """
+        self._events = True
+        if self._flag is not None:
+            self._flag.set()
+
+    def add_registers(self, address):
+        """
+        Reports the power statistics in 4 input registers, refreshed when
+        read: seconds awake, seconds asleep, awake time in permille and the
+        number of wake-ups, each modulo 65536.
+
+        Args:
+            address: Address of the first input register.
+        """
+        for offset in range(4):
+            self.server.add_ireg(address=address + offset, value=0)
+        self._reg_address = address
+        self.server.add_read_hook('IREGS', address, 4, self._refresh_registers)
+
+    def _refresh_registers(self, reg_type, address, quantity):
+        awake = self.awake_ms + time.ticks_diff(self._ticks_ms(),
+                                                self._awake_since)
+        total = awake + self.asleep_ms
+        permille = (awake * 1000) // total if total else 1000
+
+        base = self._reg_address
+        server = self.server
+        server.set_ireg(address=base, value=(awake // 1000) & 0xFFFF)
+        server.set_ireg(address=base + 1, value=(self.asleep_ms // 1000) & 0xFFFF)
+        server.set_ireg(address=base + 2, value=permille)
+        server.set_ireg(address=base + 3, value=self.wakeups & 0xFFFF)
+
+    def run_once(self):
+        """
+        Does all pending work, then sleeps until the next task is due.
+        """
+        server = self.server
+        while server.process():
+            pass
+
+        events = self._events
+        self._events = False
+
+        now = self.ticks()
+        wait = self.max_sleep_ms
+        for task in self._tasks:
+            period = task[1]
+            if not period:
+                if events:
+                    task[0]()
+                continue
+
+            left = time.ticks_diff(task[2], now)
+            if left <= 0:
+                task[0]()
+                task[2] = time.ticks_add(task[2], period)
+                left = time.ticks_diff(task[2], now)
+                if left <= 0:
+                    # periods missed while busy are skipped
+                    task[2] = time.ticks_add(now, period)
+                    left = period
+            if left < wait:
+                wait = left
+
+        # work arrived meanwhile, run the next pass right away
+        if self._events or server.frame_pending():
+            return
+
+        if wait < self.min_sleep_ms or not self._may_sleep():
+            idle()
+            return
+
+        self._lightsleep(wait)
+
+    def run(self):
+        """
+        Runs the main loop forever.
+        """
+        while True:
+            self.run_once()
+
+    async def run_async(self):
+        """
+        Runs the Modbus server and the tasks as asyncio tasks, never returns.
+
+        Used instead of run() on firmware with asyncio. The server is served
+        by its serve(), each periodic task and the event tasks run in their
+        own asyncio task. A task callback may be a coroutine function, it is
+        awaited before the task runs again. The MCU only idles in the
+        asyncio scheduler, lightsleep and the guards are not used.
+        """
+        import asyncio
+
+        self._flag = asyncio.ThreadSafeFlag()
+        for task in self._tasks:
+            if task[1]:
+                asyncio.create_task(self._run_periodic(task))
+        asyncio.create_task(self._run_events())
+
+        await self.server.serve()
+
+    async def _run_periodic(self, task):
+        import asyncio
+
+        while True:
+            left = time.ticks_diff(task[2], self.ticks())
+            if left > 0:
+                await asyncio.sleep_ms(left)
+            await self._call(task[0])
+
+            now = self.ticks()
+            task[2] = time.ticks_add(task[2], task[1])
+            if time.ticks_diff(task[2], now) <= 0:
+                # periods missed while busy are skipped
+                task[2] = time.ticks_add(now, task[1])
+
+    async def _run_events(self):
+        while True:
+            await self._flag.wait()
+            self._events = False
+            for task in self._tasks:
+                if not task[1]:
+                    await self._call(task[0])
+
+    async def _call(self, callback):
+        result = callback()
+        if type(result) is _coroutine_type:
+            await result
+
+    def _may_sleep(self):
+        if not self.server.rx_idle():
+            return False
+
+        for busy in self._guards:
+            if busy():
+                return False
+        return True
+
+    def _lightsleep(self, ms):
+        self.awake_ms += time.ticks_diff(self._ticks_ms(), self._awake_since)
+
+        start = self._clock_ms()
+        self._sleep(ms)
+        slept = (self._clock_ms() - start) % DAY_MS
+
+        self.asleep_ms += slept
+        self.wakeups += 1
+        self._offset = time.ticks_add(self._offset, slept)
+        self._awake_since = self._ticks_ms()
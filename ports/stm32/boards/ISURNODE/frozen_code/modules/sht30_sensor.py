@@ -79,3 +79,81 @@ class SHT30Sensor:
         else:
             utils.log_error("SHT30 sensor not initialized.")
             return None
+
+
+class SHT30Periodic:
+    def __init__(self, sht30_sensor, server=None, address=8, mps=1):
+        """
+        Keeps the latest temperature and humidity of an SHT30 running in its
+        periodic acquisition mode.
+
+        The sensor measures on its own, poll() only fetches the last result,
+        it never waits for a measurement. The values are kept as integers in
+        hundredths of C and %RH and, with a server, published to the input
+        registers address (temperature, two's complement) and address + 1
+        (humidity).
+
+        Args:
+            sht30_sensor: The SHT30Sensor with the sensor.
+            server: Modbus server the values are published to, or None.
+            address: Input register of the temperature.
+            mps: Measurements per second of the sensor, 0.5, 1, 2, 4 or 10.
+        """
+        self.sensor = sht30_sensor.sensor
+        self.server = server
+        self.address = address
+
+        # latest values, x100
+        self.temperature = 0
+        self.humidity = 0
+        self.fetches = 0
+        self.misses = 0
+        self.errors = 0
+
+        self._data = bytearray(6)
+        self.running = False
+
+        if self.sensor is not None:
+            try:
+                self.sensor.start_periodic(mps)
+                self.running = True
+            except SHT30Error as e:
+                utils.log_error(f"Failed to start SHT30 periodic mode: {e}")
+
+    def poll(self):
+        """
+        Fetches the latest measurement of the sensor.
+
+        Returns:
+            True if new values were taken, False if the sensor had no new
+            measurement or is not available.
+        """
+        if not self.running:
+            return False
+
+        try:
+            if not self.sensor.fetch(self._data):
+                self.misses += 1
+                return False
+        except SHT30Error:
+            self.errors += 1
+            return False
+
+        self.fetches += 1
+        self.temperature = SHT30.temperature_x100(self._data)
+        self.humidity = SHT30.humidity_x100(self._data)
+
+        if self.server is not None:
+            self.server.set_ireg(address=self.address,
+                                 value=self.temperature & 0xFFFF)
+            self.server.set_ireg(address=self.address + 1, value=self.humidity)
+        return True
+
+    def stop(self):
+        """Stops the periodic mode, the sensor goes back to single shot."""
+        if self.running:
+            self.running = False
+            try:
+                self.sensor.stop_periodic()
+            except SHT30Error as e:
+                utils.log_error(f"Failed to stop SHT30 periodic mode: {e}")
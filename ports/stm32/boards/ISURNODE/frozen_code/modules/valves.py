@@ -0,0 +1,225 @@
+# src/modules/valves.py
+from machine import Timer
+from micropython import const
+
+# pulse directions of a DRV8871 H-bridge
+OPEN = const(0)    # IN1 high, IN2 low
+CLOSE = const(1)   # IN1 low, IN2 high
+
+# valve states
+IDLE = const(0)    # outputs off, nothing queued
+DELAY = const(1)   # timer runs until the next queued pulse starts
+WAIT = const(2)    # pulse due, waiting for a free driver slot
+ACTIVE = const(3)  # bridge driven, timer runs until the pulse ends
+
+
+class Valve:
+    def __init__(self, scheduler, in1, in2, queue_size):
+        """
+        One latching valve on a DRV8871 driver with its queue of pulses.
+
+        Args:
+            scheduler: The ValveScheduler driving this valve.
+            in1: Pin connected to IN1 of the driver.
+            in2: Pin connected to IN2 of the driver.
+            queue_size: Maximum number of pulses waiting for this valve.
+        """
+        self.in1 = in1
+        self.in2 = in2
+        self.in1.off()
+        self.in2.off()
+
+        self.state = IDLE
+        self.pulse_count = 0
+        self._scheduler = scheduler
+        self._timer = Timer(-1)
+
+        # ring buffer of queued pulses. pulse() only advances _tail and the
+        # timer callback only advances _head, both run modulo 256.
+        self._size = queue_size
+        self._direction = bytearray(queue_size)
+        self._duration = [0] * queue_size
+        self._delay = [0] * queue_size
+        self._head = 0
+        self._tail = 0
+
+        # pulse started once a driver slot is free, see WAIT
+        self._pending_direction = OPEN
+        self._pending_duration = 0
+
+        # bound method created once, arming the timer does not allocate
+        self._on_timer_cb = self._on_timer
+
+    def queued(self):
+        """Number of pulses waiting, the running one not included."""
+        return (self._tail - self._head) & 0xFF
+
+    def _arm(self, period_ms):
+        self._timer.init(mode=Timer.ONE_SHOT,
+                         period=period_ms if period_ms > 0 else 1,
+                         callback=self._on_timer_cb)
+
+    def _drive(self, direction):
+        if direction == OPEN:
+            self.in2.off()
+            self.in1.on()
+        else:
+            self.in1.off()
+            self.in2.on()
+
+    def _release(self):
+        self.in1.off()
+        self.in2.off()
+
+    def _on_timer(self, timer):
+        if self.state == DELAY:
+            idx = self._head % self._size
+            self._head = (self._head + 1) & 0xFF
+            self._scheduler._activate(self,
+                                      self._direction[idx],
+                                      self._duration[idx])
+        elif self.state == ACTIVE:
+            self._release()
+            self.pulse_count += 1
+            self._next()
+            self._scheduler._release_slot()
+
+    def _next(self):
+        if self._head == self._tail:
+            self.state = IDLE
+        else:
+            self.state = DELAY
+            self._arm(self._delay[self._head % self._size])
+
+
+class ValveScheduler:
+    def __init__(self, pins, queue_size=4, max_active=0):
+        """
+        Drives valve pulses from one-shot timers instead of sleeping.
+
+        Pulses are queued per valve and run in the background, so the main
+        loop keeps serving Modbus requests while a valve is driven. Valves
+        pulse concurrently unless max_active limits the number of drivers
+        switched on at the same time, e.g. to protect the supply.
+
+        All state changes except queueing happen in the timer callbacks.
+
+        Args:
+            pins: List of (in1, in2) pin pairs, one per valve.
+            queue_size: Maximum number of pulses waiting per valve.
+            max_active: Maximum number of valves driven at once, 0 for no limit.
+        """
+        if queue_size < 1 or queue_size > 255:
+            raise ValueError("queue_size must be between 1 and 255")
+
+        self.max_active = max_active
+        self.active = 0
+        self.valves = [Valve(self, in1, in2, queue_size) for in1, in2 in pins]
+
+    def pulse(self, valve, direction, duration_ms=100, delay_ms=0):
+        """
+        Queues a pulse of a valve.
+
+        Args:
+            valve: Index of the valve.
+            direction: OPEN or CLOSE.
+            duration_ms: Time the driver is switched on.
+            delay_ms: Time to wait before the pulse, counted from the end of
+                the previous pulse of this valve.
+
+        Returns:
+            True if the pulse was queued, False if the queue of the valve is full.
+        """
+        v = self.valves[valve]
+        if v.queued() >= v._size:
+            return False
+
+        idx = v._tail % v._size
+        v._direction[idx] = direction
+        v._duration[idx] = duration_ms
+        v._delay[idx] = delay_ms
+        v._tail = (v._tail + 1) & 0xFF
+
+        # an idle valve has no timer running, so it is started from here
+        if v.state == IDLE:
+            v.state = DELAY
+            v._arm(delay_ms)
+
+        return True
+
+    def open(self, valve, duration_ms=100, delay_ms=0):
+        return self.pulse(valve, OPEN, duration_ms, delay_ms)
+
+    def close(self, valve, duration_ms=100, delay_ms=0):
+        return self.pulse(valve, CLOSE, duration_ms, delay_ms)
+
+    def pulse_all(self, direction, duration_ms=100, stagger_ms=0):
+        """
+        Queues a pulse of every valve.
+
+        Args:
+            direction: OPEN or CLOSE.
+            duration_ms: Time each driver is switched on.
+            stagger_ms: Extra delay of each valve relative to the previous one.
+
+        Returns:
+            Number of valves the pulse was queued for.
+        """
+        queued = 0
+        for valve in range(len(self.valves)):
+            if self.pulse(valve, direction, duration_ms, valve * stagger_ms):
+                queued += 1
+        return queued
+
+    def busy(self, valve=None):
+        """
+        Returns True if the valve, or any valve if None, is not idle.
+        """
+        if valve is not None:
+            return self.valves[valve].state != IDLE
+
+        for v in self.valves:
+            if v.state != IDLE:
+                return True
+        return False
+
+    def cancel(self, valve=None):
+        """
+        Switches the driver off and drops the queued pulses of the valve, or
+        of all valves if None.
+        """
+        if valve is None:
+            for idx in range(len(self.valves)):
+                self.cancel(idx)
+            return
+
+        v = self.valves[valve]
+        v._timer.deinit()
+        v._release()
+        v._head = v._tail
+        was_active = v.state == ACTIVE
+        v.state = IDLE
+        if was_active:
+            self._release_slot()
+
+    def _activate(self, valve, direction, duration_ms):
+        if self.max_active and self.active >= self.max_active:
+            valve._pending_direction = direction
+            valve._pending_duration = duration_ms
+            valve.state = WAIT
+            return
+
+        self.active += 1
+        valve.state = ACTIVE
+        valve._drive(direction)
+        valve._arm(duration_ms)
+
+    def _release_slot(self):
+        self.active -= 1
+
+        # valves waiting for a driver slot start in index order
+        for v in self.valves:
+            if self.max_active and self.active >= self.max_active:
+                return
+            if v.state == WAIT:
+                self._activate(v, v._pending_direction, v._pending_duration)
@@ -0,0 +1,3 @@
+# Firmware of the ASYNC variant, the frozen code plus asyncio
+include("$(BOARD_DIR)/manifest.py")
+include("$(MPY_DIR)/extmod/asyncio")
@@ -13,7 +13,10 @@
 #define MICROPY_PY_PYB_LEGACY       (0)
 #define MICROPY_PY_HEAPQ            (0)
 #define MICROPY_PY_RE               (0)
+// async/await and asyncio are enabled by the ASYNC variant only
+#ifndef MICROPY_PY_ASYNC_AWAIT
 #define MICROPY_PY_ASYNC_AWAIT      (0)
+#endif
 #define MICROPY_PY_MATH             (0)
 #define MICROPY_PY_COLLECTIONS      (0)
 #define MICROPY_PY_BUILTINS_SET     (0)
@@ -26,6 +29,17 @@
 //#define MICROPY_HW_ENABLE_USB       (0) // requires a custom USB connector on PA11/PA12
 #define MICROPY_HW_HAS_SWITCH       (0)
 #define MICROPY_HW_HAS_FLASH        (1)
+
+#define MICROPY_BOARD_EARLY_INIT    ISURNODE_board_early_init
+#define MICROPY_BOARD_END_SOFT_RESET ISURNODE_board_end_soft_reset
+struct _boardctrl_state_t;
+void ISURNODE_board_early_init(void);
+void ISURNODE_board_end_soft_reset(struct _boardctrl_state_t *state);
+
+// LPUART1 wakes the MCU from machine.lightsleep() when a frame arrives
+#define MICROPY_BOARD_PRE_STOP      ISURNODE_board_lpuart_wakeup(1);
+#define MICROPY_BOARD_POST_STOP     ISURNODE_board_lpuart_wakeup(0);
+void ISURNODE_board_lpuart_wakeup(int enable);
 // MSI is used and is 4MHz
 #define MICROPY_HW_CLK_PLLM (1)
 #define MICROPY_HW_CLK_PLLN (16)
@@ -16,3 +16,5 @@ LTO = 1
 # 1. Apunta al directorio que contiene tus carpetas 'lib' y 'modules'
 FROZEN_MANIFEST ?= $(BOARD_DIR)/manifest.py
 
+# Native helpers for umodbus (CRC16), picked up by the frozen package
+USER_C_MODULES ?= $(BOARD_DIR)/cmodules
@@ -0,0 +1,4 @@
+# async/await and the asyncio package, for Modbus.serve() and cooperative
+# tasks. The C part of asyncio is built in, the Python part is frozen.
+CFLAGS += -DMICROPY_PY_ASYNC_AWAIT=1
+FROZEN_MANIFEST = $(BOARD_DIR)/manifest_async.py
@@ -0,0 +1,50 @@
+# Test the cached config register of the ADS1115 driver.
+
+import fakes
+
+machine = fakes.install()
+
+from machine import I2C
+from fakes.ads1115 import ADS1115 as FakeADS1115
+from lib.ADS1115 import *
+
+
+CHANNELS = (ADS1115_COMP_0_GND, ADS1115_COMP_1_GND,
+            ADS1115_COMP_2_GND, ADS1115_COMP_3_GND)
+
+
+def read_channel(adc, channel):
+    # the sequence of AnalogInput.read_analog()
+    adc.setCompareChannels(CHANNELS[channel])
+    adc.setMeasureMode(ADS1115_SINGLE)
+    adc.startSingleMeasurement()
+    busy = adc.isBusy()
+    fake.complete()
+    return busy, adc.isBusy(), adc.getRawResult()
+
+
+for cached in (False, True):
+    fake = FakeADS1115()
+    fake.inputs = [100, 200, 300, 400]
+    I2C.attach(1, 0x48, fake)
+    i2c = I2C(1)
+    adc = ADS1115(address=0x48, i2c=i2c, cached=cached)
+    adc.setVoltageRange_mV(ADS1115_RANGE_4096)
+    adc.setConvRate(ADS1115_16_SPS)
+    print("cached" if cached else "uncached", "init", adc.transactions, i2c.transactions)
+
+    for channel in range(4):
+        fake.writes = []
+        adc.transactions = 0
+        i2c.transactions = 0
+        result = read_channel(adc, channel)
+        print(channel, result, adc.transactions, i2c.transactions,
+              [(reg, hex(value)) for reg, value in fake.writes])
+
+    # the shadow copy matches what the device got with the last conversion
+    print(hex(adc.getConfig() & 0x7FFF), hex(fake.regs[1] & 0x7FFF))
+
+# continuous mode is written right away
+adc.transactions = 0
+adc.setMeasureMode(ADS1115_CONTINUOUS)
+print(adc.transactions, hex(fake.regs[1]))
@@ -0,0 +1,49 @@
+# Test the averaged analog statistics of the background scan.
+
+import fakes
+
+machine = fakes.install()
+
+from machine import I2C, Pin
+from fakes.ads1115 import ADS1115 as FakeADS1115
+from fakes.modbus_link import request
+from lib.umodbus.serial import ModbusRTU
+from modules import utils
+from modules.analog_sensor import AnalogInput, AnalogScan, AnalogHistory
+
+utils.LOG_LEVEL = "CRITICAL"
+
+
+def scan_once(inputs):
+    ads.inputs = inputs
+    scan.start()
+    while ads.complete():
+        pass
+
+
+alert = Pin("ALERT", Pin.IN, value=1)
+ads = FakeADS1115(alert_pin=alert)
+I2C.attach(1, 0x48, ads)
+
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+server.add_bank("IREGS", 0, 4)
+server.add_bank("IREGS", 40, 16)
+
+scan = AnalogScan(AnalogInput(), server, address=0, rdy_pin=alert)
+history = AnalogHistory(scan, server, address=40, window=3)
+
+# 8000 counts are 1000 mV at 4.096 V full scale
+for step in range(5):
+    scan_once([4000 * (step + 1), 800 * step, 400, 0])
+    print(history.count, history.last, history.mean, history.min, history.max)
+
+# the master reads the statistics of two channels in one request
+print(request(server, b"\x04\x00\x28\x00\x08"))
+print([server.get_ireg(i) for i in range(4)])
+
+# a reset starts averaging again
+history.reset()
+scan_once([800, 800, 800, 800])
+print(history.count, history.mean)
+
@@ -0,0 +1,75 @@
+# Test the background ADS1115 scan driven by ALERT/RDY.
+
+import fakes
+
+machine = fakes.install()
+
+from machine import I2C, Pin
+from fakes.ads1115 import ADS1115 as FakeADS1115
+from lib.umodbus.serial import ModbusRTU
+from modules import utils, analog_sensor
+from modules.analog_sensor import AnalogInput, AnalogScan
+
+utils.LOG_LEVEL = "CRITICAL"
+
+alert = Pin("ALERT", Pin.IN, value=1)
+ads = FakeADS1115(alert_pin=alert)
+I2C.attach(1, 0x48, ads)
+
+server = ModbusRTU(addr=1, uart_id=1)
+server.add_bank("IREGS", 0, 4)
+
+# the config is cached by the driver and written with the next conversion
+analog = AnalogInput()
+config = analog.ads.getConfig()
+print("range", hex(config & 0x0E00), "rate", hex(config & 0x00E0))
+
+scans = []
+scan = AnalogScan(analog, server, address=0, rdy_pin=alert,
+                  on_scan=lambda s: scans.append(list(s.values)))
+print("alert", ads.regs[2], hex(ads.regs[3]), analog.ads.getConfig() & 3)
+
+# 1 V, 2 V, 0.5 V and a slightly negative offset at 4.096 V full scale
+ads.inputs = [8000, 16000, 4000, -3]
+
+# start() returns right away, every ready edge publishes one channel and
+# starts the next conversion
+ads.writes = []
+print(scan.start(), scan.busy(), scan.start())
+for _ in range(4):
+    ads.complete()
+    print([server.get_ireg(i) for i in range(4)], scan.busy())
+print(scans, ads.conversions)
+print([(reg, hex(value)) for reg, value in ads.writes])
+
+# without an ALERT/RDY edge the timer ends the conversion
+print(scan.start())
+ads.complete()
+alert.handler = None
+ads.complete()
+machine.run_timers(200)
+print(scan.timeouts, scan.busy(), scan._index)
+alert.handler = scan._on_ready_cb
+ads.complete()
+ads.complete()
+print(scan.busy(), scan.scans)
+
+# without ALERT/RDY the conversions are timed, 16 SPS take 64 ms
+timed = AnalogScan(analog, server, address=0, channels=(1, 3))
+ads.inputs = [0, 800, 0, 1600]
+print(timed.start())
+machine.run_timers(63)
+ads.complete()
+print(timed.values, timed.busy())
+machine.run_timers(1)
+print(timed.values, timed.busy())
+machine.run_timers(60)
+ads.complete()
+machine.run_timers(4)
+print(timed.values, timed.busy(), timed.timeouts)
+
+# a bus error aborts the scan
+timed.start()
+del I2C._buses[1][0x48]
+machine.run_timers(64)
+print(timed.busy(), timed.errors)
@@ -0,0 +1,74 @@
+# Test the 32 bit pulse counters, register pairs and checkpoints.
+
+import os
+import fakes
+
+machine = fakes.install()
+
+from machine import Pin
+from fakes.modbus_link import request
+from lib.umodbus.serial import ModbusRTU
+from modules.counters import IrqCounter, LptimCounter, Counters, make_counter
+
+
+def pulses(pin, count):
+    for _ in range(count):
+        pin.drive(1)
+        pin.drive(0)
+
+
+# without machine.mem32 every counter falls back to the pin interrupt
+print(type(make_counter("PB5")).__name__)
+
+pin = Pin("PB1", Pin.IN)
+irq = IrqCounter(pin, value=0xFFFFFFFE)
+pulses(pin, 3)
+print(irq.value())
+
+# the hardware counter is extended to 32 bits across its 16 bit wrap
+machine.mem32 = machine.Mem32()
+lptim = make_counter("PB5")
+print(type(lptim).__name__, lptim.pin.mode == Pin.ALT)
+cnt = 0x40007C00 + 0x1C
+print(hex(machine.mem32.regs[0x40007C00 + 0x0C]), machine.mem32.regs[0x40007C00 + 0x10])
+machine.mem32.regs[cnt] = 65530
+print(lptim.value())
+machine.mem32.regs[cnt] = 4
+print(lptim.value())
+lptim.set(0x12345678)
+machine.mem32.regs[cnt] = 5
+print(hex(lptim.value()))
+
+# the LPTIM input filter cannot debounce a contact, a debounced input is
+# counted from the pin interrupt
+print(type(make_counter("PB1", debounce_ms=150)).__name__)
+try:
+    LptimCounter("PB1", debounce_ms=150)
+except ValueError as e:
+    print("ValueError", e)
+
+# counters are served as register pairs, high word first
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+path = "counters_test.dat"
+counters = Counters([irq, lptim], path=path, save_every=3)
+counters.add_registers(server, 30)
+print(request(server, b"\x04\x00\x1e\x00\x04"))
+print(request(server, b"\x04\x00\x21\x00\x01"))
+
+# a checkpoint is only written every save_every polls and if a value changed
+for _ in range(7):
+    counters.poll()
+print("writes", counters.writes)
+pulses(pin, 1)
+for _ in range(3):
+    counters.poll()
+print("writes", counters.writes)
+print(counters.save(), counters.save(force=True), counters.writes)
+
+# the values are restored from the checkpoint
+restored = Counters([IrqCounter(Pin("A", Pin.IN)), IrqCounter(Pin("B", Pin.IN))],
+                    path=path)
+print(restored.load(), [c.value() for c in restored.counters])
+os.remove(path)
+print(restored.load(), Counters([irq], path=None).save())
@@ -0,0 +1,105 @@
+# Test the counter input configuration and rate estimation.
+
+import fakes
+
+machine = fakes.install()
+
+from machine import Pin
+from fakes.modbus_link import request
+from lib.umodbus.serial import ModbusRTU
+from modules.counters import (IrqCounter, LptimCounter, Counters,
+                              RateEstimator, make_counter, RISING, FALLING,
+                              BOTH)
+
+
+def pulses(pin, count):
+    for _ in range(count):
+        pin.drive(1)
+        pin.drive(0)
+
+
+now = [0]
+
+
+def ticks_ms():
+    return now[0]
+
+
+# counted edges of the interrupt counter
+pin = Pin("PA0", Pin.IN)
+irq = IrqCounter(pin)
+pulses(pin, 2)
+irq.configure(edge=BOTH)
+pulses(pin, 2)
+irq.configure(edge=FALLING)
+pulses(pin, 2)
+print(irq.value(), pin.trigger)
+
+# counted edges of the LPTIM, its input filter is always on
+machine.mem32 = machine.Mem32()
+cfgr = 0x40009400 + 0x0C
+lptim = LptimCounter("PB1")
+print(hex(machine.mem32.regs[cfgr]))
+machine.mem32.regs[0x40009400 + 0x1C] = 10
+lptim.configure(edge=BOTH)
+print(hex(machine.mem32.regs[cfgr]), lptim.value())
+try:
+    lptim.configure(debounce_ms=5)
+except ValueError as e:
+    print("ValueError", e, hex(machine.mem32.regs[cfgr]))
+
+# the rate is taken over the samples in the window
+rate = RateEstimator(irq, window=3, ticks_ms=ticks_ms)
+rate.sample()
+print(rate.rate())
+for step in range(4):
+    now[0] += 10000
+    pulses(pin, 5 + step)
+    rate.sample()
+    print(now[0], irq.value(), rate.rate())
+
+# configuration and rates as registers
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+counters = Counters([irq, lptim], rate_window=2, ticks_ms=ticks_ms)
+counters.add_rate_registers(server, 34)
+counters.add_config_registers(server, 110)
+print(request(server, b"\x03\x00\x6e\x00\x04"))
+
+# debounce and edge of both channels are written in one request
+print(request(server, b"\x10\x00\x6e\x00\x04\x08\x00"
+                      b"\x14\x00\x01\x00\x00\x00\x02"))
+print(irq.debounce_ms, irq.edge, lptim.debounce_ms, lptim.edge)
+print(hex(machine.mem32.regs[cfgr]))
+
+# an invalid edge is rejected
+print(request(server, b"\x06\x00\x6f\x00\x07"))
+print(request(server, b"\x03\x00\x6f\x00\x01"), irq.edge)
+
+# the burst on the debounced input counts once
+counters.poll()
+now[0] += 30000
+pulses(pin, 30)
+machine.mem32.regs[0x40009400 + 0x1C] = 100
+counters.poll()
+print(request(server, b"\x04\x00\x22\x00\x02"))
+
+# a debounce time the LPTIM cannot apply is rejected
+print(request(server, b"\x06\x00\x70\x00\x14"))
+print(request(server, b"\x03\x00\x70\x00\x01"), lptim.debounce_ms,
+      hex(machine.mem32.regs[cfgr]))
+
+# a debounced LPTIM input counts from the pin interrupt, the debounce time
+# of its register is applied to the edges
+pb1 = make_counter("PB1", debounce_ms=150)
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+Counters([pb1], ticks_ms=ticks_ms).add_config_registers(server, 110)
+pulses(pb1.pin, 10)
+print(type(pb1).__name__, pb1.value())
+print(request(server, b"\x06\x00\x6e\x00\x00"), pb1.debounce_ms)
+pulses(pb1.pin, 10)
+print(pb1.value())
+print(request(server, b"\x06\x00\x6e\x00\x96"), pb1.debounce_ms)
+pulses(pb1.pin, 10)
+print(pb1.value())
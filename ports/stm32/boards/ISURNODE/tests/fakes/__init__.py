@@ -0,0 +1,17 @@
+# Host-side stand-ins for the hardware used by the ISURNODE frozen code, so
+# that the umodbus stack and the firmware modules can be tested on the unix
+# port, e.g. from the top-level tests directory:
+#
+#   ./run-tests.py -d ../ports/stm32/boards/ISURNODE/tests
+import sys
+
+
+def install():
+    base = sys.path[0] or "."
+    if base + "/../frozen_code" not in sys.path:
+        sys.path.append(base + "/../frozen_code")
+
+    from fakes import machine
+
+    sys.modules["machine"] = machine
+    return machine
@@ -0,0 +1,50 @@
+# Register level stand-in for an ADS1115 on the fake I2C bus.
+
+CONV = 0
+CONFIG = 1
+LO_THRESH = 2
+HI_THRESH = 3
+
+
+class ADS1115:
+    def __init__(self, alert_pin=None):
+        self.regs = [0, 0x8583, 0x8000, 0x7FFF]
+        # test helper: input of each single ended channel in raw counts
+        self.inputs = [0, 0, 0, 0]
+        self.alert_pin = alert_pin
+        self.converting = False
+        self.conversions = 0
+        self.writes = []
+
+    def read(self, reg, nbytes):
+        return self.regs[reg].to_bytes(2, "big")
+
+    def write(self, reg, data):
+        value = int.from_bytes(data, "big")
+        self.writes.append((reg, value))
+        if reg == CONFIG:
+            # OS reads back as 1 when idle, writing it starts a conversion
+            self.regs[CONFIG] = value | 0x8000
+            if value & 0x8000:
+                self.regs[CONFIG] &= 0x7FFF
+                self.converting = True
+                if self.alert_pin is not None:
+                    self.alert_pin.drive(1)
+        else:
+            self.regs[reg] = value
+
+    def mux(self):
+        return (self.regs[CONFIG] >> 12) & 7
+
+    # test helper: finish the running conversion of a single ended channel
+    # and assert ALERT/RDY, which is active low
+    def complete(self):
+        if not self.converting:
+            return False
+        self.converting = False
+        self.conversions += 1
+        self.regs[CONV] = self.inputs[self.mux() - 4] & 0xFFFF
+        self.regs[CONFIG] |= 0x8000
+        if self.alert_pin is not None:
+            self.alert_pin.drive(0)
+        return True
@@ -0,0 +1,322 @@
+# Minimal fake of the machine module, only what the firmware uses.
+
+import io
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    ALT = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None, alt=-1):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        self.alt = alt
+        self.handler = None
+        self.trigger = None
+        self._value = value or 0
+
+    def __repr__(self):
+        return "Pin({})".format(self.id)
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def irq(self, handler=None, trigger=IRQ_RISING, hard=False):
+        self.handler = handler
+        self.trigger = trigger
+
+    # test helper: apply a level and run the IRQ handler on a matching edge
+    def drive(self, value):
+        old = self._value
+        self._value = 1 if value else 0
+        if self.handler is None or old == self._value:
+            return
+        if self._value and self.trigger & Pin.IRQ_RISING:
+            self.handler(self)
+        elif not self._value and self.trigger & Pin.IRQ_FALLING:
+            self.handler(self)
+
+
+class UART(io.IOBase):
+    IRQ_RXIDLE = 0x10
+    IRQ_RX = 0x20
+
+    def __init__(self, id, baudrate=9600, bits=8, parity=None, stop=1, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self._irq_handler = None
+        self._irq_trigger = 0
+        # receive side is a preallocated ring buffer, so feeding and reading
+        # frames does not allocate either
+        self._rx = bytearray(1024)
+        self._head = 0
+        self._tail = 0
+        self.tx = bytearray()
+        # test helper: with keep_tx False writes are only counted, so that
+        # allocation tests are not disturbed by growing the tx buffer
+        self.keep_tx = True
+        self.tx_count = 0
+        # test helper: called with each written buffer, e.g. to pass it on to
+        # another UART
+        self.on_write = None
+
+    # test helper: bytes arriving from the bus, followed by an idle line
+    def feed(self, data):
+        rx = self._rx
+        for b in data:
+            rx[self._head] = b
+            self._head = (self._head + 1) % len(rx)
+        if self._irq_handler is not None and self._irq_trigger & UART.IRQ_RXIDLE:
+            self._irq_handler(self)
+
+    # test helper: return and clear everything written to the bus
+    def take(self):
+        data = bytes(self.tx)
+        self.tx = bytearray()
+        return data
+
+    def any(self):
+        return (self._head - self._tail) % len(self._rx)
+
+    def readinto(self, buf, nbytes=None):
+        count = self.any()
+        if not count:
+            return None
+        if nbytes is None:
+            nbytes = len(buf)
+        if count > nbytes:
+            count = nbytes
+        rx = self._rx
+        for i in range(count):
+            buf[i] = rx[self._tail]
+            self._tail = (self._tail + 1) % len(rx)
+        return count
+
+    def read(self, nbytes=None):
+        count = self.any()
+        if not count:
+            return None
+        if nbytes is not None and nbytes < count:
+            count = nbytes
+        buf = bytearray(count)
+        self.readinto(buf)
+        return bytes(buf)
+
+    def write(self, buf):
+        self.tx_count += len(buf)
+        if self.keep_tx:
+            self.tx.extend(buf)
+        if self.on_write is not None:
+            self.on_write(buf)
+        return len(buf)
+
+    def flush(self):
+        pass
+
+    def irq(self, handler=None, trigger=0, hard=False):
+        self._irq_handler = handler
+        self._irq_trigger = trigger
+
+    # stream ioctl, lets select.poll and asyncio wait for received bytes
+    def ioctl(self, req, arg):
+        if req == 3:  # MP_STREAM_POLL
+            return arg & 0x0001 if self.any() else 0
+        if req == 10:  # MP_STREAM_GET_FILENO, there is no file descriptor
+            return -1
+        return 0
+
+
+class I2C:
+    # devices on each bus id, added with attach()
+    _buses = {}
+
+    def __init__(self, id=0, **kwargs):
+        self.id = id
+        self.devices = I2C._buses.setdefault(id, {})
+        # test helper: number of bus transactions
+        self.transactions = 0
+
+    # test helper: put a device on the bus, it provides read(reg, nbytes)
+    # and write(reg, data) for memory transfers, or readfrom(nbytes) and
+    # writeto(data) for plain ones
+    @staticmethod
+    def attach(id, addr, device):
+        I2C._buses.setdefault(id, {})[addr] = device
+
+    def _device(self, addr):
+        self.transactions += 1
+        if addr not in self.devices:
+            raise OSError(19)  # ENODEV, no ACK
+        return self.devices[addr]
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        return bytes(self._device(addr).read(memaddr, nbytes))
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        data = self._device(addr).read(memaddr, len(buf))
+        for i in range(len(buf)):
+            buf[i] = data[i]
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self._device(addr).write(memaddr, bytes(buf))
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return bytes(self._device(addr).readfrom(nbytes))
+
+    def readfrom_into(self, addr, buf, stop=True):
+        data = self._device(addr).readfrom(len(buf))
+        for i in range(len(buf)):
+            buf[i] = data[i]
+
+    def writeto(self, addr, buf, stop=True):
+        self._device(addr).writeto(bytes(buf))
+        return len(buf)
+
+
+# virtual time in ms of run_timers() and all timers created so far
+_now_ms = 0
+_timers = []
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self.mode = None
+        self.period = None
+        self.callback = None
+        self.armed = False
+        self.deadline = 0
+        _timers.append(self)
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        self.mode = mode
+        self.period = period
+        self.callback = callback
+        self.armed = True
+        self.deadline = _now_ms + period
+
+    def deinit(self):
+        self.armed = False
+
+    # test helper: run the callback as if the period had elapsed
+    def fire(self):
+        if not self.armed:
+            return False
+        if self.mode == Timer.ONE_SHOT:
+            self.armed = False
+        self.callback(self)
+        return True
+
+
+# test helper: advance the virtual time by ms and run the callbacks of all
+# timers expiring meanwhile, in order of their deadline
+def run_timers(ms):
+    global _now_ms
+    end = _now_ms + ms
+    while True:
+        due = None
+        for timer in _timers:
+            if timer.armed and timer.deadline <= end:
+                if due is None or timer.deadline < due.deadline:
+                    due = timer
+        if due is None:
+            break
+        _now_ms = due.deadline
+        if due.mode == Timer.PERIODIC:
+            due.deadline += due.period
+        due.fire()
+    _now_ms = end
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state):
+    pass
+
+
+def now_ms():
+    return _now_ms
+
+
+def idle():
+    pass
+
+
+# time slept in lightsleep() and an optional interrupt ending the next sleep
+_slept_ms = 0
+_wake_event = None
+
+
+# test helper: the system tick of the stm32, stopped while in lightsleep
+def ticks_ms():
+    return _now_ms - _slept_ms
+
+
+# test helper: call wake() after ms to end the next lightsleep early, like
+# a frame on the LPUART or a pin interrupt
+def wake_after(ms, wake):
+    global _wake_event
+    _wake_event = (ms, wake)
+
+
+def lightsleep(ms=None):
+    global _slept_ms, _wake_event
+    event = _wake_event
+    _wake_event = None
+    if event is not None and (ms is None or event[0] < ms):
+        ms = event[0]
+    else:
+        event = None
+    _slept_ms += ms
+    run_timers(ms)
+    if event is not None:
+        event[1]()
+
+
+class RTC:
+    def datetime(self):
+        ms = _now_ms % 86400000
+        return (2025, 1, 1, 3, ms // 3600000, ms // 60000 % 60,
+                ms // 1000 % 60, ms % 1000 * 1000)
+
+
+# test helper: registers of the fake MCU, install as machine.mem32. Every
+# ISR at offset 0x00 reads 0x10, so the LPTIM reports ARROK right away.
+class Mem32:
+    def __init__(self):
+        self.regs = {}
+
+    def __getitem__(self, addr):
+        if addr & 0xFF == 0x00:
+            return 0x10
+        return self.regs.get(addr, 0)
+
+    def __setitem__(self, addr, value):
+        self.regs[addr] = value & 0xFFFFFFFF
@@ -0,0 +1,49 @@
+# Request helpers for the umodbus tests, talking to a ModbusRTU server on
+# the fake UART of fakes.machine, and an in-process RTU bus between a
+# master and a server.
+
+import time
+
+from fakes import machine
+
+
+def frame(server, pdu, unit=1):
+    # request ADU for unit, with the CRC of the server's interface
+    data = bytearray([unit]) + pdu
+    data.extend(server._itf._calculate_crc16(data))
+    return bytes(data)
+
+
+def request(server, pdu, unit=1):
+    # feed a request to the fake UART of a ModbusRTU server, process it and
+    # return the response written to the bus
+    uart = server._itf._uart
+    uart.feed(frame(server, pdu, unit))
+    server.process()
+    return uart.take()
+
+
+# RTU bus between a Modbus master and a ModbusRTU slave, both on fake
+# UARTs. A request written by the master is processed by the slave before
+# write() returns, so the response is waiting when the master reads.
+class Link:
+    def __init__(self, master, slave):
+        self.master = master
+        self.slave = slave
+        # time in us of the last slave.process() call
+        self.process_us = 0
+        master._uart.keep_tx = False
+        master._uart.on_write = self._on_request
+
+    def _on_request(self, buf):
+        itf = self.slave._itf
+        itf._uart.feed(buf)
+        start = time.ticks_us()
+        if itf._irq_mode:
+            # the end of frame silence
+            machine.run_timers(itf._silence_ms)
+        self.slave.process()
+        self.process_us = time.ticks_diff(time.ticks_us(), start)
+        response = itf._uart.take()
+        if response:
+            self.master._uart.feed(response)
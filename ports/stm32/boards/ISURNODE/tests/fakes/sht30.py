@@ -0,0 +1,60 @@
+# Command level stand-in for an SHT30 on the fake I2C bus.
+
+MEASURE = b"\x2C\x10"
+FETCH = b"\xE0\x00"
+BREAK = b"\x30\x93"
+PERIODIC = (b"\x20\x32", b"\x21\x30", b"\x22\x36", b"\x23\x34", b"\x27\x37")
+
+
+def crc8(data):
+    crc = 0xFF
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31 if crc & 0x80 else crc << 1) & 0xFF
+    return crc
+
+
+class SHT30:
+    def __init__(self):
+        self.periodic = False
+        self.commands = []
+        # test helper: raw temperature and humidity of the next measurement
+        self.t_raw = 0x6666
+        self.rh_raw = 0x8000
+        self._data = None
+        self._latest = None
+
+    def _measurement(self):
+        data = bytearray()
+        for raw in (self.t_raw, self.rh_raw):
+            word = raw.to_bytes(2, "big")
+            data.extend(word)
+            data.append(crc8(word))
+        return data
+
+    # test helper: the periodic mode takes a new measurement
+    def measure(self):
+        if self.periodic:
+            self._latest = self._measurement()
+
+    def writeto(self, data):
+        self.commands.append(data)
+        if data in PERIODIC:
+            self.periodic = True
+            self._latest = None
+        elif data == BREAK:
+            self.periodic = False
+        elif data == FETCH:
+            # the measurement can only be fetched once
+            self._data = self._latest
+            self._latest = None
+        elif data == MEASURE and not self.periodic:
+            self._data = self._measurement()
+
+    def readfrom(self, nbytes):
+        if self._data is None:
+            raise OSError(19)  # no new data, the read is not acknowledged
+        data = self._data
+        self._data = None
+        return data[:nbytes]
@@ -0,0 +1,78 @@
+# Test the register to action map.
+
+import fakes
+
+machine = fakes.install()
+
+from machine import Pin
+from fakes.modbus_link import request
+from lib.umodbus.serial import ModbusRTU
+from modules.valves import ValveScheduler, OPEN, CLOSE
+from modules.io_map import IOMap, Pulse, Output, Command
+
+
+def outputs():
+    return " ".join("{}{}".format(a.value(), b.value()) for a, b in bridges)
+
+
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+server.add_bank("HREGS", 200, 4)
+
+bridges = [(Pin("IN1_{}".format(i), Pin.OUT), Pin("IN2_{}".format(i), Pin.OUT))
+           for i in range(2)]
+valves = ValveScheduler(bridges)
+relay = Pin("RELAY", Pin.OUT)
+
+
+def measure(value):
+    print("measure", value)
+
+
+io_map = IOMap(server, valves, (
+    Pulse(200, valve=0, direction=OPEN, duration_ms=50),
+    Pulse(201, valve=0, direction=CLOSE, duration_ms=50),
+    Pulse(202, valve=1, direction=OPEN),
+    Pulse(203, valve=1, direction=CLOSE),
+    Command(100, measure, trigger=None),
+    Output(300, relay),
+))
+server.add_hreg(address=301, value=0)
+
+# a single write runs the action and clears the register
+print(request(server, b"\x06\x00\xc8\x00\x01"))
+machine.run_timers(1)
+print(outputs(), server.get_hreg(200))
+machine.run_timers(50)
+print(outputs())
+
+# a multiple write runs every mapped register written with the trigger value
+print(request(server, b"\x10\x00\xc8\x00\x04\x08\x00"
+                      b"\x00\x00\x01\x00\x01\x00\x00"))
+machine.run_timers(1)
+print(outputs(), [server.get_hreg(a) for a in range(200, 204)])
+machine.run_timers(100)
+
+# other values do not trigger, and are kept
+print(request(server, b"\x06\x00\xca\x00\x02"))
+machine.run_timers(1)
+print(outputs(), server.get_hreg(202))
+
+# a command with trigger None runs for any value
+print(request(server, b"\x06\x00\x64\x00\x07"))
+print(server.get_hreg(100))
+
+# outputs follow the register, which is not cleared
+request(server, b"\x06\x01\x2c\x00\x01")
+print(relay.value(), server.get_hreg(300))
+request(server, b"\x06\x01\x2c\x00\x00")
+print(relay.value(), server.get_hreg(300))
+
+# unmapped registers are plain registers
+request(server, b"\x06\x01\x2d\x00\x01")
+print(server.get_hreg(301), outputs(), relay.value())
+
+try:
+    io_map.add(Pulse(200, valve=1))
+except ValueError as e:
+    print("ValueError", e)
@@ -0,0 +1,92 @@
+# Test umodbus register banks against the per address register dict.
+
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import request
+from lib.umodbus.serial import ModbusRTU
+
+
+def new_server(banks):
+    server = ModbusRTU(addr=1, uart_id=1)
+    if banks:
+        server.add_bank("HREGS", 200, 8)
+        server.add_bank("IREGS", 0, 10, signed=True)
+        server.add_bank("COILS", 0, 12)
+        server.add_bank("ISTS", 6, 2)
+    for i in range(200, 208):
+        server.add_hreg(address=i, value=i - 200)
+    for i in range(10):
+        server.add_ireg(address=i, value=i * 1000 - 3000)
+    for i in range(12):
+        server.add_coil(address=i, value=bool(i % 3))
+    server.add_ist(address=6, value=True)
+    server.add_ist(address=7, value=False)
+    return server
+
+
+plain = new_server(False)
+banked = new_server(True)
+
+# identical answers on the wire
+for pdu in (
+    b"\x03\x00\xc8\x00\x08",
+    b"\x03\x00\xca\x00\x03",
+    b"\x04\x00\x00\x00\x0a",
+    b"\x04\x00\x09\x00\x01",
+    b"\x01\x00\x00\x00\x0c",
+    b"\x01\x00\x03\x00\x05",
+    b"\x02\x00\x06\x00\x02",
+    b"\x06\x00\xc9\x00\x2a",
+    b"\x10\x00\xcc\x00\x02\x04\x00\x07\x00\x08",
+    b"\x05\x00\x01\x00\x00",
+    b"\x03\x00\xc8\x00\x08",
+    b"\x01\x00\x00\x00\x0c",
+    b"\x03\x01\x00\x00\x01",
+):
+    a = request(plain, pdu)
+    b = request(banked, pdu)
+    print(a == b, b)
+
+# get/set keep working
+print(banked.get_hreg(201), banked.get_hreg(204), banked.get_ireg(0))
+banked.set_ireg(address=4, value=[7, 8])
+print(banked.get_ireg(4), banked.get_ireg(5))
+banked.set_coil(address=11, value=True)
+print(banked.get_coil(11), banked.get_coil(1), banked.get_ist(6))
+print(sorted(banked.hregs) == sorted(plain.hregs))
+print(banked.changed_hregs[201]["val"], banked.changed_coils[1]["val"])
+
+# callbacks registered on single addresses of a bank
+def on_set(reg_type, address, val):
+    print("set", reg_type, address, val)
+
+
+def on_get(reg_type, address, val):
+    print("get", reg_type, address, val)
+    banked.set_ireg(address=address, value=1234)
+
+
+banked.add_hreg(address=203, value=5, on_set_cb=on_set)
+banked.add_ireg(address=8, on_get_cb=on_get)
+request(banked, b"\x06\x00\xcb\x00\x09")
+print(request(banked, b"\x04\x00\x08\x00\x02"))
+
+# existing registers are moved into a new bank
+plain.add_hreg(address=300, value=11, on_set_cb=on_set)
+plain.add_bank("HREGS", 300, 2)
+print(plain.get_hreg(300), plain.get_hreg(301))
+request(plain, b"\x06\x01\x2c\x00\x01")
+
+try:
+    banked.add_bank("HREGS", 205, 4)
+except ValueError as e:
+    print("ValueError", e)
+
+try:
+    banked.remove_hreg(200)
+except KeyError:
+    print("KeyError")
+print(banked.remove_bank("HREGS", 200).length)
+print(request(banked, b"\x03\x00\xc8\x00\x01"))
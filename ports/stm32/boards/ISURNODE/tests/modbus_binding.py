@@ -0,0 +1,89 @@
+# Test live register bindings of umodbus.
+
+import gc
+import fakes
+
+fakes.install()
+
+from machine import Pin
+from fakes.modbus_link import frame, request
+from lib.umodbus.serial import ModbusRTU
+
+
+class Counters:
+    def __init__(self):
+        self.pulses = 0
+
+
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+server.add_bank("IREGS", 0, 4)
+server.add_bank("ISTS", 0, 2)
+
+counters = Counters()
+reads = [0]
+
+
+def temperature():
+    reads[0] += 1
+    return 2150 + reads[0]
+
+
+switch = Pin("SWITCH", Pin.IN)
+
+# a variable, a getter and a pin, inside a bank or as single register
+server.add_binding("IREGS", 0, counters, "pulses")
+server.add_binding("IREGS", 1, temperature)
+server.add_binding("IREGS", 10, counters, "pulses")
+server.add_binding("ISTS", 1, switch)
+
+# nothing is evaluated until a master reads the register
+counters.pulses = 70000
+switch.value(1)
+print(reads[0], server.get_ireg(0), server.get_ist(1))
+
+# words are served modulo 65536
+print(request(server, b"\x04\x00\x00\x00\x02"))
+print(reads[0], server.get_ireg(0), server.get_ireg(1))
+
+# only the bindings inside the requested range are evaluated
+print(request(server, b"\x04\x00\x00\x00\x01"))
+print(reads[0])
+print(request(server, b"\x04\x00\x0a\x00\x01"))
+print(request(server, b"\x02\x00\x00\x00\x02"))
+
+# a binding replaces the previous one of the address
+server.add_binding("IREGS", 10, lambda: 7)
+print(request(server, b"\x04\x00\x0a\x00\x01"))
+print(server.remove_binding("IREGS", 10), server.remove_binding("IREGS", 10))
+print(server.get_ireg(10))
+
+for args in (("FOO", 0, temperature), ("IREGS", 0, counters)):
+    try:
+        server.add_binding(*args)
+    except (KeyError, TypeError) as e:
+        print(type(e).__name__, e)
+
+
+def run(req, count):
+    for _ in range(count):
+        counters.pulses += 1
+        uart.feed(req)
+        server.process()
+
+
+def measure(req):
+    run(req, 10)
+    gc.collect()
+    gc.disable()
+    before = gc.mem_alloc()
+    run(req, 100)
+    delta = gc.mem_alloc() - before
+    gc.enable()
+    return delta
+
+
+# reading bound registers of a bank does not allocate
+uart.keep_tx = False
+print("allocated", measure(frame(server, b"\x04\x00\x00\x00\x02")))
+print(server.get_ireg(0))
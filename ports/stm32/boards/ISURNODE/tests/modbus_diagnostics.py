@@ -0,0 +1,99 @@
+# Test the bus health counters and their FC08 and FC0B requests.
+
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import frame, request
+from lib.umodbus.serial import ModbusRTU
+
+
+def diagnostic(sub_function, data=0):
+    pdu = bytes([0x08, sub_function >> 8, sub_function & 0xFF,
+                 data >> 8, data & 0xFF])
+    return request(server, pdu)
+
+
+def counters():
+    d = itf.diag
+    return (d.bus_message_count, d.bus_comm_error_count,
+            d.bus_exception_count, d.slave_message_count,
+            d.slave_no_response_count, d.bus_overrun_count, d.event_count)
+
+
+server = ModbusRTU(addr=1, uart_id=1)
+itf = server._itf
+uart = itf._uart
+server.add_hreg(address=0, value=7)
+
+print(counters())
+
+# a good request, a frame for another slave, a broken CRC, a short frame
+request(server, b"\x03\x00\x00\x00\x01")
+request(server, b"\x03\x00\x00\x00\x01", unit=2)
+bad = bytearray(frame(server, b"\x03\x00\x00\x00\x01", unit=2))
+bad[-1] ^= 0xFF
+uart.feed(bad)
+server.process()
+uart.feed(b"\x01\x03")
+server.process()
+# an unknown register and an unsupported function code
+request(server, b"\x03\x00\x10\x00\x01")
+request(server, b"\x41\x00\x00\x00\x00")
+print(counters(), uart.take())
+
+# the counters through FC08
+for sub_function in (0x0B, 0x0C, 0x0D, 0x0E, 0x0F, 0x12, 0x02, 0x10, 0x11):
+    print(hex(sub_function), diagnostic(sub_function))
+
+# return query data echoes any number of words
+print(request(server, b"\x08\x00\x00\xa5\x37\x12\x34"))
+
+# FC0B, the event counter does not count exceptions or FC0B polls
+print(request(server, b"\x0b"))
+print(request(server, b"\x0b"))
+print(itf.diag.event_count)
+
+# invalid sub-function, data or length
+print(diagnostic(0x03))
+print(diagnostic(0x0B, 1))
+print(diagnostic(0x01, 0x1234))
+print(request(server, b"\x08\x00\x0b\x00"))
+print(request(server, b"\x0b\x00"))
+
+# clear counters
+print(diagnostic(0x0A), counters())
+
+# listen only mode, requests are counted but not answered
+print(diagnostic(0x04))
+print(request(server, b"\x03\x00\x00\x00\x01"), diagnostic(0x0B))
+print(counters())
+
+# restart communications leaves it without a response and clears counters
+print(diagnostic(0x01, 0xFF00), counters())
+print(diagnostic(0x01), request(server, b"\x03\x00\x00\x00\x01"))
+
+# frames longer than the receive buffer count as overrun
+diagnostic(0x0A)
+uart.feed(frame(server, bytes(300)))
+server.process()
+print(uart.take(), counters())
+print(diagnostic(0x14), diagnostic(0x12))
+
+# interrupt mode, frames arriving while the queue is full are lost
+server = ModbusRTU(addr=1, uart_id=1, use_irq=True)
+itf = server._itf
+uart = itf._uart
+for i in range(3):
+    uart.feed(frame(server, b"\x0b"))
+    itf._silence_timer.fire()
+print(counters())
+for i in range(3):
+    server.process()
+print(uart.take())
+print(counters())
+
+# a truncated frame is dropped in interrupt mode too
+uart.feed(frame(server, bytes(300)))
+itf._silence_timer.fire()
+print(server.process(), counters())
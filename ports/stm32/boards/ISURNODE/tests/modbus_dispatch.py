@@ -0,0 +1,57 @@
+# Test the function code dispatch table and custom function handlers.
+
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import request
+from lib.umodbus.serial import ModbusRTU
+
+
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+server.add_bank("IREGS", 0, 4, value=[10, 20, 30, 40])
+server.add_bank("ISTS", 6, 2, value=[True, False])
+
+
+# vendor function code returning the whole node state in one response
+def read_node_state(request, reg_type):
+    print("node state", reg_type, request.data)
+    state = bytearray(10)
+    state[0] = 9
+    for i in range(4):
+        val = server.get_ireg(i)
+        state[1 + 2 * i] = val >> 8
+        state[2 + 2 * i] = val & 0xFF
+    state[9] = server.get_ist(6) | (server.get_ist(7) << 1)
+    request.send_pdu(bytes([request.function]) + state)
+
+
+print(request(server, b"\x41"))
+server.add_function_handler(0x41, read_node_state)
+print(request(server, b"\x41"))
+print(request(server, b"\x41\x00\x01"))
+
+# built-in codes can be overridden and removed
+def read_hregs(request, reg_type):
+    print("read hregs", reg_type, request.register_addr, request.quantity)
+    request.send_exception(0x04)
+
+
+server.add_function_handler(0x03, read_hregs, "HREGS")
+print(request(server, b"\x03\x00\x00\x00\x01"))
+print(server.remove_function_handler(0x03), server.remove_function_handler(0x03))
+print(request(server, b"\x03\x00\x00\x00\x01"))
+print(server.remove_function_handler(0x41))
+print(request(server, b"\x41"))
+
+# built-in codes still validate the request length
+print(request(server, b"\x04\x00\x00"))
+
+for args in ((0, read_hregs), (0x80, read_hregs), (0x43, read_hregs, "FOO")):
+    try:
+        server.add_function_handler(*args)
+    except ValueError as e:
+        print("ValueError", e)
+    except KeyError:
+        print("KeyError")
@@ -0,0 +1,83 @@
+# Test the in place response encoders and an allocation free poll cycle.
+
+import gc
+import struct
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import frame
+from lib.umodbus import functions
+from lib.umodbus.serial import ModbusRTU
+
+
+# reference encoding built with format strings, as umodbus used to do it
+def reference(function_code, values):
+    if function_code in (1, 2):
+        out = []
+        for i in range(0, len(values), 8):
+            byte = 0
+            for bit in values[i : i + 8]:
+                byte = (byte << 1) | bit
+            out.append(byte)
+        return struct.pack(">BB" + "B" * len(out), function_code, len(out), *out)
+    return struct.pack(">BB" + "h" * len(values), function_code, len(values) * 2, *values)
+
+
+buf = bytearray(256)
+ok = True
+for n in range(1, 20):
+    bits = [bool((i * 7) % 3) for i in range(n)]
+    length = functions.response_into(buf, 1, 1, 0, n, None, bits)
+    ok = ok and bytes(buf[1 : 1 + length]) == reference(1, bits)
+for n in (1, 10, 125):
+    regs = [i * 523 - 30000 for i in range(n)]
+    length = functions.response_into(buf, 0, 3, 0, n, None, regs)
+    ok = ok and bytes(buf[:length]) == reference(3, regs)
+print(ok)
+
+print(functions.response(6, 0x1234, None, b"\xab\xcd"))
+print(functions.response(16, 0x00C8, 8, None))
+print(functions.exception_response_into(buf, 0, 3, 2), bytes(buf[:2]))
+try:
+    functions.response_into(buf, 0, 3, 0, 126, None, [0] * 126)
+except ValueError as e:
+    print("ValueError", e)
+try:
+    functions.response_into(buf, 0, 0x41, 0, 1, None, None)
+except ValueError as e:
+    print("ValueError", e)
+
+
+server = ModbusRTU(addr=1, baudrate=115200, uart_id=1)
+server.add_bank("IREGS", 0, 10)
+server.add_bank("HREGS", 0, 125)
+server.add_bank("COILS", 0, 16)
+for i in range(10):
+    server.set_ireg(address=i, value=i * 100)
+uart = server._itf._uart
+
+polls = (
+    frame(server, b"\x04\x00\x00\x00\x0a"),
+    frame(server, b"\x03\x00\x00\x00\x7d"),
+    frame(server, b"\x01\x00\x00\x00\x0b"),
+    frame(server, b"\x04\x00\x0a\x00\x01"),
+)
+uart.feed(polls[0])
+server.process()
+print(uart.take())
+
+# steady state poll/response cycle, request and response, allocates nothing
+for f in polls:
+    uart.feed(f)
+    server.process()
+uart.keep_tx = False
+uart.tx_count = 0
+gc.collect()
+gc.disable()
+before = gc.mem_alloc()
+for i in range(1000):
+    uart.feed(polls[i & 3])
+    server.process()
+print(gc.mem_alloc() - before, uart.tx_count)
+gc.enable()
@@ -0,0 +1,59 @@
+# Test Mask Write Register (FC22) and Read/Write Multiple Registers (FC23)
+# through the serial interface, request frames are fed into the fake UART
+# and the response is taken from its TX side.
+
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import request
+from lib.umodbus.serial import ModbusRTU
+
+
+def on_set(reg_type, address, val):
+    print("set", reg_type, address, val)
+
+
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+
+# valve commands in a bank, status registers in the register dict
+server.add_bank("HREGS", 200, 8)
+server.add_hreg(address=300, value=[0x1111, 0x2222, 0x3333], on_set_cb=on_set)
+
+# FC22, (0x12 & 0xF2) | (0x25 & ~0xF2) = 0x17 as in the specification
+server.set_hreg(address=200, value=0x12)
+print(request(server, b"\x16\x00\xc8\x00\xf2\x00\x25"))
+print(hex(server.get_hreg(200)))
+
+# set and clear single bits, registers in the dict call on_set_cb
+print(request(server, b"\x16\x01\x2c\xff\xff\x00\x01"))
+print(request(server, b"\x16\x01\x2c\xff\xfe\x00\x00"))
+print(hex(server.get_hreg(300)), server.changed_hregs[300]["val"])
+
+# FC22 on an unknown register and with a malformed frame
+print(request(server, b"\x16\x00\x01\xff\xff\x00\x01"))
+print(request(server, b"\x16\x00\xc8\xff\xff\x00"))
+
+# FC23, write 2 valve commands and read back all 8 in one round trip
+print(request(server, b"\x17\x00\xc8\x00\x08\x00\xca"
+                      b"\x00\x02\x04\x00\x01\x00\x02"))
+print(server.get_hreg(202), server.get_hreg(203))
+
+# overlapping ranges read the values just written
+print(request(server, b"\x17\x01\x2c\x00\x03\x01\x2d\x00\x01\x02\xab\xcd"))
+
+# the write is not done if the read range is invalid
+print(request(server, b"\x17\x00\x01\x00\x01\x00\xc8\x00\x01\x02\x00\x09"))
+print(server.get_hreg(200))
+
+# byte count does not match the write quantity
+print(request(server, b"\x17\x00\xc8\x00\x01\x00\xc8\x00\x02\x02\x00\x09"))
+# read quantity out of range
+print(request(server, b"\x17\x00\xc8\x00\x7e\x00\xc8\x00\x01\x02\x00\x09"))
+
+# the write is not done if either range ends beyond the registers
+print(request(server, b"\x17\x00\xc8\x00\x01\x00\xce\x00\x04\x08"
+              b"\x00\x09\x00\x09\x00\x09\x00\x09"))
+print(request(server, b"\x17\x00\xcc\x00\x08\x00\xc8\x00\x01\x02\x00\x09"))
+print(server.get_hreg(206), server.get_hreg(200))
@@ -0,0 +1,81 @@
+# Test the journal of registers changed by a master.
+
+import gc
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import request
+from lib.umodbus.serial import ModbusRTU
+from lib.umodbus.journal import ChangeJournal
+
+
+def drain():
+    return [(reg_type, address, value)
+            for reg_type, address, value, ticks in server.drain_changes()]
+
+
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+server.add_bank("HREGS", 200, 8)
+server.add_bank("COILS", 0, 8)
+
+# changes are drained in the order they were written
+request(server, b"\x06\x00\xc9\x00\x05")
+request(server, b"\x0f\x00\x00\x00\x03\x01\x05")
+request(server, b"\x10\x00\xc8\x00\x02\x04\x00\x01\x00\x02")
+print(len(server.drain_changes()), server.changed_hregs[201]["val"])
+print(drain(), drain())
+
+# a register written again is reported once, with its latest value
+request(server, b"\x06\x00\xca\x00\x01")
+request(server, b"\x06\x00\xcb\x00\x01")
+request(server, b"\x06\x00\xca\x00\x07")
+print(drain())
+
+# the journal holds a fixed number of changes, the oldest ones are dropped
+journal = ChangeJournal(capacity=3)
+for address in range(5):
+    journal.record("HREGS", address, address * 10, address)
+print(len(journal), journal.lost, [list(entry) for entry in journal])
+
+# a removed change frees its slot for the next one
+for address in range(3):
+    journal.record("HREGS", address, 1, 100)
+print(journal.remove("HREGS", 1, 99), journal.remove("HREGS", 1, 100))
+journal.record("COILS", 7, True, 101)
+journal.record("COILS", 8, False, 102)
+print(journal.lost, journal.get("COILS"),
+      [list(entry) for entry in journal])
+
+
+def journal_alloc(count, drain):
+    values = [1, 2, 3, 4, 5, 6, 7, 8]
+    coil = [True]
+    gc.collect()
+    mem = gc.mem_alloc()
+    for _ in range(count):
+        server._set_changed_register("HREGS", 200, values)
+        server._set_changed_register("COILS", 0, coil)
+        drain()
+    return gc.mem_alloc() - mem
+
+
+def drain_pop():
+    change = changes.pop()
+    while change is not None:
+        change = changes.pop()
+
+
+def drain_loop():
+    for reg_type, address, value, ticks in changes:
+        pass
+
+
+# recording and popping the changes of a write does not allocate, ending
+# a for loop allocates the traceback of its StopIteration only
+changes = server.drain_changes()
+journal_alloc(1, drain_pop)
+journal_alloc(1, drain_loop)
+print(journal_alloc(100, drain_pop), journal_alloc(100, drain_loop) <= 100 * 32)
+print(server.changes_lost, len(server.drain_changes()))
@@ -0,0 +1,69 @@
+# Test the RTU master functions against a ModbusRTU slave on the same bus.
+
+import fakes
+
+machine = fakes.install()
+
+from fakes.modbus_link import Link
+from lib.umodbus import functions
+from lib.umodbus.serial import ModbusRTU, Serial
+
+slave = ModbusRTU(addr=1, uart_id=1, use_irq=True)
+slave.add_bank("COILS", 0, 16)
+slave.add_bank("ISTS", 0, 8, value=[1, 0, 1, 1, 0, 0, 0, 1])
+slave.add_bank("HREGS", 0, 16)
+slave.add_bank("IREGS", 0, 4, value=[10, 20, 30, -1])
+
+master = Serial(uart_id=2)
+link = Link(master, slave)
+
+# request PDUs are encoded by the shared functions
+print(functions.read_coils(5, 10))
+print(functions.write_single_coil(3, True), functions.write_single_coil(3, 0))
+print(functions.write_multiple_coils(0, [1, 0, 1, 1, 0, 0, 0, 0, 1]))
+print(functions.write_multiple_registers(2, [1, -2]))
+
+print(master.read_discrete_inputs(1, 0, 8))
+print(master.read_input_registers(1, 0, 4))
+print(master.read_input_registers(1, 0, 4, signed=False))
+
+print(master.write_single_register(1, 3, 1234), slave.get_hreg(3))
+print(master.write_multiple_registers(1, 4, [1, -2, 3]),
+      [slave.get_hreg(i) for i in range(4, 7)])
+print(master.read_holding_registers(1, 3, 4))
+
+print(master.write_single_coil(1, 2, True), slave.get_coil(2))
+print(master.write_multiple_coils(1, 4, [1, 1, 0, 1]),
+      [slave.get_coil(i) for i in range(4, 8)])
+print(master.read_coils(1, 0, 8))
+
+# exceptions of the slave are raised
+try:
+    master.read_holding_registers(1, 100, 2)
+except ValueError as e:
+    print("ValueError", e)
+
+# a unit that does not answer
+try:
+    master.read_input_registers(7, 0, 1)
+except OSError as e:
+    print("OSError", e)
+
+# a broadcast write is applied by the slave, which does not answer, and
+# the master does not wait for a response
+print(master.write_multiple_registers(0, 8, [5, 6]),
+      [slave.get_hreg(i) for i in range(8, 10)], master._uart.any())
+print(master.write_single_coil(0, 9, True), slave.get_coil(9),
+      master._uart.any())
+
+# invalid requests are refused before anything is sent
+for call in (lambda: master.read_coils(1, 0, 0),
+             lambda: master.write_single_coil(1, 0, 2),
+             lambda: master.write_multiple_registers(1, 0, [0] * 124),
+             lambda: master.read_holding_registers(0, 0, 1)):
+    try:
+        call()
+    except ValueError as e:
+        print("ValueError", e)
+
+print(slave._itf.diag.slave_message_count, slave._itf.diag.bus_exception_count)
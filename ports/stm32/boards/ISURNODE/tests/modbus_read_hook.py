@@ -0,0 +1,76 @@
+# Test range level read hooks of umodbus.
+
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import request
+from lib.umodbus.serial import ModbusRTU
+
+
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+server.add_bank("IREGS", 0, 10)
+
+# count how often a response list is built
+builds = [0]
+create_response = server._create_response
+
+
+def counting_create_response(request, reg_type):
+    builds[0] += 1
+    return create_response(request=request, reg_type=reg_type)
+
+
+server._create_response = counting_create_response
+
+samples = [0]
+
+
+def refresh_adc(reg_type, address, quantity):
+    print("adc", reg_type, address, quantity)
+    for channel in range(address, address + quantity):
+        samples[0] += 1
+        server.set_ireg(address=channel, value=1000 * channel + samples[0])
+
+
+def refresh_sht(reg_type, address, quantity):
+    print("sht", reg_type, address, quantity)
+    server.set_ireg(address=8, value=2150)
+    server.set_ireg(address=9, value=4525)
+
+
+server.add_read_hook("IREGS", 0, 4, refresh_adc)
+server.add_read_hook("IREGS", 8, 2, refresh_sht)
+
+# only the requested part of a hook range is refreshed
+print(request(server, b"\x04\x00\x00\x00\x04"))
+print(request(server, b"\x04\x00\x02\x00\x01"))
+print(request(server, b"\x04\x00\x09\x00\x01"))
+# one request spanning both hooks calls each of them once
+print(request(server, b"\x04\x00\x03\x00\x07"))
+# no hook for these registers
+print(request(server, b"\x04\x00\x04\x00\x04"))
+print(builds[0])
+
+# a legacy on_get_cb sees exactly the values sent, built once
+def on_get(reg_type, address, val):
+    print("get", reg_type, address, val)
+
+
+server.add_ireg(address=8, on_get_cb=on_get)
+print(request(server, b"\x04\x00\x08\x00\x02"))
+print(builds[0])
+
+# hooks are not called for illegal addresses or other register types
+print(request(server, b"\x04\x00\x64\x00\x01"))
+server.add_hreg(address=0, value=7)
+print(request(server, b"\x03\x00\x00\x00\x01"))
+
+print(server.remove_read_hook("IREGS", 0), server.remove_read_hook("IREGS", 0))
+print(request(server, b"\x04\x00\x00\x00\x01"))
+
+try:
+    server.add_read_hook("FOO", 0, 1, refresh_adc)
+except KeyError:
+    print("KeyError")
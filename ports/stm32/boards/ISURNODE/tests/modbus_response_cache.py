@@ -0,0 +1,90 @@
+# Test reusing the encoded responses of repeated bank reads.
+
+import gc
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import frame, request
+from lib.umodbus.serial import ModbusRTU
+
+
+def counters():
+    return itf.cache_hits, itf.cache_misses
+
+
+server = ModbusRTU(addr=1, uart_id=1)
+itf = server._itf
+uart = itf._uart
+server.add_bank("IREGS", 0, 10, value=list(range(10)))
+server.add_bank("HREGS", 100, 4)
+server.add_bank("COILS", 0, 8)
+
+# the same block polled again is sent from the cache
+read_block = b"\x04\x00\x00\x00\x0a"
+first = request(server, read_block)
+print(first, request(server, read_block) == first, counters())
+
+# a changed value of the bank encodes the block again, writing the same
+# value does not
+server.set_ireg(address=3, value=33)
+print(request(server, read_block), counters())
+server.set_ireg(address=3, value=33)
+request(server, read_block)
+print(counters())
+
+# a write of the master changes the bank as well
+print(request(server, b"\x03\x00\x64\x00\x02"))
+request(server, b"\x06\x00\x65\x00\x07")
+print(request(server, b"\x03\x00\x64\x00\x02"), counters())
+print(request(server, b"\x01\x00\x00\x00\x08"))
+request(server, b"\x05\x00\x02\xff\x00")
+print(request(server, b"\x01\x00\x00\x00\x08"), counters())
+
+# function code, start and quantity make a request, the oldest of the
+# kept responses is replaced
+itf.cache_hits = itf.cache_misses = 0
+for pdu in (b"\x04\x00\x00\x00\x01", b"\x04\x00\x00\x00\x02",
+            b"\x04\x00\x01\x00\x01", b"\x03\x00\x64\x00\x01"):
+    request(server, pdu)
+print(counters(),
+      request(server, read_block) == request(server, read_block),
+      counters())
+
+# FC23 writes first and a get callback sees every read, neither is kept
+itf.cache_hits = itf.cache_misses = 0
+for _ in range(2):
+    request(server, b"\x17\x00\x64\x00\x01\x00\x65\x00\x01\x02\x00\x09")
+print(counters())
+
+reads = []
+server.add_ireg(address=20, value=5,
+                on_get_cb=lambda reg_type, address, val: reads.append(val))
+request(server, b"\x04\x00\x14\x00\x01")
+request(server, b"\x04\x00\x14\x00\x01")
+print(reads, counters())
+
+
+def alloc_per_request(pdu, count):
+    data = frame(server, pdu)
+    request(server, pdu)
+    uart.keep_tx = False
+    gc.collect()
+    mem = gc.mem_alloc()
+    for _ in range(count):
+        uart.feed(data)
+        server.process()
+    uart.keep_tx = True
+    return (gc.mem_alloc() - mem) // count
+
+
+# a response sent from the cache does not allocate
+print(alloc_per_request(read_block, 100))
+
+# a removed bank leaves no kept responses behind, a new bank at the same
+# addresses is read
+request(server, read_block)
+removed = server.remove_bank("IREGS", 0)
+print(removed in itf._cache_bank)
+server.add_bank("IREGS", 0, 10, value=[7] * 10)
+print(request(server, read_block))
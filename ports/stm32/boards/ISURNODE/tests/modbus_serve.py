@@ -0,0 +1,156 @@
+# Test serving Modbus requests as asyncio task with coroutine callbacks.
+
+try:
+    import asyncio
+except ImportError:
+    print("SKIP")
+    raise SystemExit
+
+import fakes
+
+machine = fakes.install()
+
+from fakes.modbus_link import frame
+from lib.umodbus.serial import ModbusRTU
+from modules.runtime import Runtime
+
+
+async def request(uart, pdu, unit=1, pieces=1):
+    # the frame arrives in pieces, with less than the inter-frame delay
+    # between them
+    data = frame(server, pdu, unit)
+    size = (len(data) + pieces - 1) // pieces
+    for idx in range(0, len(data), size):
+        uart.feed(data[idx:idx + size])
+        await asyncio.sleep_ms(1)
+    await asyncio.sleep_ms(20)
+    return uart.take()
+
+
+events = []
+
+
+async def on_valve_set(reg_type, address, val):
+    events.append(("pulse", address, val))
+    await asyncio.sleep_ms(40)
+    events.append(("done", address))
+
+
+def on_level_set(reg_type, address, val):
+    events.append(("level", address, val))
+
+
+ticks = 0
+
+
+async def ticker():
+    global ticks
+    while True:
+        ticks += 1
+        await asyncio.sleep_ms(2)
+
+
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+server.add_bank("IREGS", 0, 4, value=[10, 11, 12, 13])
+server.add_hreg(address=200, value=0, on_set_cb=on_valve_set)
+server.add_hreg(address=201, value=0, on_set_cb=on_level_set)
+unit = server.add_unit(10)
+unit.add_hreg(address=200, value=0, on_set_cb=on_valve_set)
+
+
+async def main():
+    serve = asyncio.create_task(server.serve())
+    tick = asyncio.create_task(ticker())
+
+    # other tasks run while the server waits for a frame
+    await asyncio.sleep_ms(20)
+    print("ticks while idle", ticks > 3)
+
+    print(await request(uart, b"\x04\x00\x00\x00\x04"))
+    print(await request(uart, b"\x04\x00\x01\x00\x02", pieces=3))
+
+    # the response is sent before the coroutine callback is awaited
+    uart.feed(frame(server, b"\x06\x00\xc8\x00\x01"))
+    await asyncio.sleep_ms(15)
+    print(uart.take(), events)
+    await asyncio.sleep_ms(50)
+    print(events)
+
+    # plain callbacks and coroutine callbacks of a virtual unit
+    events.clear()
+    print(await request(uart, b"\x06\x00\xc9\x00\x05"))
+    print(await request(uart, b"\x06\x00\xc8\x00\x02", unit=10))
+    await asyncio.sleep_ms(50)
+    print(events)
+
+    # frames of other units and with a bad CRC are dropped
+    print(await request(uart, b"\x04\x00\x00\x00\x01", unit=2))
+    uart.feed(b"\x01\x04\x00\x00\x00\x01\x00\x00")
+    await asyncio.sleep_ms(20)
+    print(uart.take(), server._itf.diag.bus_comm_error_count)
+
+    serve.cancel()
+    tick.cancel()
+
+
+asyncio.run(main())
+
+# process() cannot await a coroutine callback
+uart.feed(frame(server, b"\x06\x00\xc8\x00\x03"))
+try:
+    server.process()
+except TypeError as e:
+    print("TypeError", e, uart.take())
+
+# in interrupt mode the receive queue is checked instead
+irq_server = ModbusRTU(addr=1, uart_id=2, use_irq=True)
+irq_uart = irq_server._itf._uart
+irq_server.add_ireg(address=0, value=42)
+
+
+async def irq_main():
+    serve = asyncio.create_task(irq_server.serve())
+    irq_uart.feed(frame(irq_server, b"\x04\x00\x00\x00\x01"))
+    machine.run_timers(10)
+    await asyncio.sleep_ms(20)
+    print(irq_uart.take())
+    serve.cancel()
+
+
+asyncio.run(irq_main())
+
+# the tasks of the runtime run next to the server
+runtime = Runtime(server, clock_ms=lambda: 0)
+samples = []
+
+
+def sample():
+    samples.append("sample")
+
+
+async def slow_sample():
+    await asyncio.sleep_ms(5)
+    samples.append("slow")
+
+
+def on_event():
+    samples.append("event")
+
+
+runtime.add_task(sample, period_ms=10)
+runtime.add_task(slow_sample, period_ms=30)
+runtime.add_task(on_event)
+
+
+async def runtime_main():
+    run = asyncio.create_task(runtime.run_async())
+    await asyncio.sleep_ms(15)
+    runtime.notify()
+    print(await request(uart, b"\x04\x00\x03\x00\x01"))
+    await asyncio.sleep_ms(10)
+    run.cancel()
+    print(samples.count("event"), samples.count("sample") > 2, "slow" in samples)
+
+
+asyncio.run(runtime_main())
@@ -0,0 +1,146 @@
+# Test the Modbus TCP and RTU over TCP servers on the loopback interface.
+
+import socket
+import struct
+import time
+
+import fakes
+
+machine = fakes.install()
+
+from lib.umodbus.serial import ModbusRTU
+from lib.umodbus.tcp import ModbusTCP, ModbusRTUOverTCP, TCPServer
+from lib.umodbus.functions import crc16_modbus
+
+PORT = 15020
+
+
+def connect(port):
+    sock = socket.socket()
+    sock.connect(socket.getaddrinfo("127.0.0.1", port)[0][-1])
+    sock.setblocking(False)
+    return sock
+
+
+def receive(server, sock, size=1):
+    # serve until the client got size bytes, None if there is no response
+    data = b""
+    for _ in range(200):
+        server.process()
+        try:
+            chunk = sock.recv(512)
+        except OSError:
+            chunk = None
+        if chunk == b"":
+            return "closed"
+        if chunk:
+            data += chunk
+        if len(data) >= size:
+            return data
+        time.sleep_ms(1)
+    return data or None
+
+
+def mbap(tid, unit, pdu):
+    return struct.pack(">HHHB", tid, 0, len(pdu) + 1, unit) + pdu
+
+
+def rtu(frame):
+    frame = bytearray(frame)
+    crc = crc16_modbus(frame)
+    frame.append(crc & 0xFF)
+    frame.append(crc >> 8)
+    return bytes(frame)
+
+
+# --- Modbus TCP, every unit address is served ---
+server = ModbusTCP()
+server.add_bank("HREGS", 0, 8, value=[10, 20, 30, 40, 50, 60, 70, 80])
+server.bind("127.0.0.1", PORT, max_connections=2)
+print(server.get_bound_status())
+
+c1 = connect(PORT)
+c2 = connect(PORT)
+
+# the transaction identifier and unit address are echoed
+c1.send(mbap(0x1234, 1, b"\x03\x00\x00\x00\x02"))
+print(receive(server, c1))
+c2.send(mbap(7, 0xFF, b"\x06\x00\x03\x04\xd2"))
+print(receive(server, c2), server.get_hreg(3))
+print(server._itf.connections)
+
+# requests sent back to back are answered one by one
+c1.send(mbap(1, 1, b"\x03\x00\x03\x00\x01") + mbap(2, 1, b"\x03\x00\x07\x00\x01"))
+print(receive(server, c1, size=22))
+
+# a request split across segments
+frame = mbap(3, 1, b"\x10\x00\x00\x00\x02\x04\x00\x01\x00\x02")
+c2.send(frame[:5])
+print(receive(server, c2))
+c2.send(frame[5:])
+print(receive(server, c2), server.get_hreg(0), server.get_hreg(1))
+
+# exceptions
+c1.send(mbap(4, 1, b"\x03\x00\x10\x00\x01"))
+print(receive(server, c1))
+c1.send(mbap(5, 1, b"\x03\x00\x00\x00\x00"))
+print(receive(server, c1))
+
+# a third client is refused
+c3 = connect(PORT)
+print(receive(server, c3), server._itf.connections)
+c3.close()
+
+# a frame that is not Modbus ends the connection
+c1.send(b"GET / HTTP/1.0\r\n\r\n")
+print(receive(server, c1), server._itf.connections)
+c1.close()
+c2.close()
+receive(server, c2)
+print(server._itf.connections, server._itf.diag.bus_comm_error_count,
+      server._itf.diag.bus_exception_count)
+server.close()
+
+# --- RTU frames over TCP ---
+server = ModbusRTUOverTCP([1])
+server.add_bank("IREGS", 0, 4, value=[1, 2, 3, 4])
+server.add_bank("COILS", 0, 8)
+server.bind("127.0.0.1", PORT + 1)
+c1 = connect(PORT + 1)
+c1.send(rtu(b"\x01\x04\x00\x00\x00\x04"))
+print(receive(server, c1))
+
+# the length of a write request is taken from its byte count
+frame = rtu(b"\x01\x0f\x00\x00\x00\x03\x01\x05")
+c1.send(frame[:7])
+print(receive(server, c1))
+c1.send(frame[7:])
+print(receive(server, c1), server.get_coil(0), server.get_coil(1), server.get_coil(2))
+
+# a bad CRC or another unit address gets no response
+c1.send(b"\x01\x04\x00\x00\x00\x04\x00\x00")
+c1.send(rtu(b"\x02\x04\x00\x00\x00\x04"))
+print(receive(server, c1), server._itf.diag.bus_comm_error_count)
+c1.close()
+server.close()
+
+# --- the registers of an RTU slave served over Modbus TCP as well ---
+slave = ModbusRTU(addr=1, uart_id=1)
+uart = slave._itf._uart
+slave.add_bank("HREGS", 0, 4)
+itf = TCPServer()
+itf.bind("127.0.0.1", PORT + 2)
+slave.add_interface(itf)
+
+c1 = connect(PORT + 2)
+c1.send(mbap(9, 1, b"\x06\x00\x02\x00\x2a"))
+print(receive(slave, c1))
+uart.feed(rtu(b"\x01\x03\x00\x02\x00\x01"))
+slave.process()
+print(uart.take())
+
+# each interface keeps its own counters
+c1.send(mbap(10, 1, b"\x0b"))
+print(receive(slave, c1), slave._itf.diag.event_count, itf.diag.event_count)
+c1.close()
+itf.close()
@@ -0,0 +1,85 @@
+# Test virtual unit addresses and broadcast requests.
+
+import gc
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import frame, request
+from lib.umodbus.serial import ModbusRTU
+
+
+server = ModbusRTU(addr=1, uart_id=1)
+itf = server._itf
+uart = itf._uart
+server.add_bank("HREGS", 200, 2)
+
+# one virtual unit per valve group, each with its own registers
+group_a = server.add_unit(10)
+group_a.add_bank("HREGS", 200, 4)
+group_b = server.add_unit(11)
+group_b.add_bank("HREGS", 200, 4)
+group_b.add_ireg(address=0, value=1111)
+
+print(request(server, b"\x06\x00\xc9\x00\x01", unit=10))
+print(request(server, b"\x06\x00\xcb\x00\x02", unit=11))
+print(server.get_hreg(201), group_a.get_hreg(201), group_b.get_hreg(203))
+print(list(group_a.changed_hregs), list(server.changed_hregs))
+print(request(server, b"\x03\x00\xc8\x00\x04", unit=11))
+print(request(server, b"\x04\x00\x00\x00\x01", unit=11))
+print(request(server, b"\x04\x00\x00\x00\x01", unit=10))
+print(request(server, b"\x03\x00\xc8\x00\x01", unit=12))
+
+# broadcast writes are executed by every unit and never answered
+print(request(server, b"\x10\x00\xc8\x00\x02\x04\x00\x07\x00\x08", unit=0))
+print(server.get_hreg(200), group_a.get_hreg(201), group_b.get_hreg(200))
+# units without the register ignore it
+print(request(server, b"\x06\x00\xcb\x00\x09", unit=0))
+print(group_a.get_hreg(203), group_b.get_hreg(203))
+# reads are not executed for broadcasts
+server.add_read_hook("HREGS", 200, 2, lambda **kw: print("hook", kw))
+print(request(server, b"\x03\x00\xc8\x00\x01", unit=0))
+d = itf.diag
+print(d.slave_message_count, d.slave_no_response_count)
+
+
+# custom function codes opt in to broadcasts
+def sync_time(request, reg_type):
+    print("sync", request.unit_addr, request.data)
+    request.send_pdu(b"\x41")
+
+
+server.add_function_handler(0x41, sync_time, broadcast=True)
+print(request(server, b"\x41\x12\x34", unit=0))
+print(request(server, b"\x41\x12\x34", unit=1))
+
+print(server.remove_unit(11), server.remove_unit(11))
+print(request(server, b"\x03\x00\xc8\x00\x01", unit=11))
+
+for addr in (0, 1, 10, 248):
+    try:
+        server.add_unit(addr)
+    except ValueError as e:
+        print("ValueError", e)
+
+# requests to a virtual unit do not allocate
+group_a.add_bank("IREGS", 0, 4)
+req = frame(server, b"\x04\x00\x00\x00\x04", unit=10)
+uart.keep_tx = False
+uart.feed(req)
+server.process()
+
+
+def run(count):
+    gc.collect()
+    gc.disable()
+    before = gc.mem_alloc()
+    for i in range(count):
+        uart.feed(req)
+        server.process()
+    allocated = gc.mem_alloc() - before
+    gc.enable()
+    return allocated
+
+
+print(run(100), uart.tx_count)
@@ -0,0 +1,81 @@
+# Test the event driven low-power main loop.
+
+import fakes
+
+machine = fakes.install()
+
+from machine import Pin
+from fakes.modbus_link import frame
+from lib.umodbus.serial import ModbusRTU
+from modules.runtime import Runtime, rtc_ms
+
+
+def step(note):
+    runtime.run_once()
+    print("{:12} t={:5} awake={:4} asleep={:5} wakeups={}".format(
+        note, machine.now_ms(), runtime.awake_ms, runtime.asleep_ms,
+        runtime.wakeups))
+
+
+server = ModbusRTU(addr=1, uart_id=1, use_irq=True)
+uart = server._itf._uart
+server.add_ireg(address=0, value=0)
+
+runtime = Runtime(server, max_sleep_ms=1000, ticks_ms=machine.ticks_ms)
+runtime.add_registers(10)
+
+counter = Pin("COUNTER", Pin.IN)
+counter.irq(trigger=Pin.IRQ_RISING, handler=runtime.notify_cb)
+edges = 0
+
+
+def count():
+    global edges
+    edges += 1
+    server.set_ireg(address=0, value=edges)
+
+
+def sample():
+    print("sample at", runtime.ticks())
+
+
+runtime.add_task(count)
+runtime.add_task(sample, period_ms=300)
+
+# the RTC time of day includes the milliseconds
+print(rtc_ms(machine.RTC()))
+
+# nothing pending, the MCU sleeps until the periodic task is due
+step("idle")
+step("task")
+
+# an edge ends the sleep early and runs the event task once
+machine.wake_after(100, lambda: counter.drive(1))
+step("edge")
+step("after edge")
+counter.drive(0)
+
+# a frame wakes the MCU, the loop idles until its end is detected
+poll = frame(server, b"\x04\x00\x00\x00\x01")
+machine.wake_after(50, lambda: uart.feed(poll))
+step("frame start")
+print(server.rx_idle(), server.frame_pending())
+machine.run_timers(5)
+print(server.rx_idle(), server.frame_pending())
+step("frame")
+print(uart.take())
+
+# a busy guard keeps the MCU awake
+busy = [True]
+runtime.add_guard(lambda: busy[0])
+slept = runtime.wakeups
+runtime.run_once()
+print("guarded", runtime.wakeups == slept)
+busy[0] = False
+
+# the statistics are refreshed when read
+machine.run_timers(20)
+uart.feed(frame(server, b"\x04\x00\x0a\x00\x04"))
+machine.run_timers(5)
+runtime.run_once()
+print(uart.take())
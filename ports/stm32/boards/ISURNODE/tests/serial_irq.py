@@ -0,0 +1,76 @@
+# Test the interrupt driven RTU receive mode.
+
+import gc
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import frame
+from lib.umodbus.serial import ModbusRTU
+
+
+server = ModbusRTU(addr=1, uart_id=1, use_irq=True)
+itf = server._itf
+uart = itf._uart
+timer = itf._silence_timer
+for i in range(4):
+    server.add_ireg(address=i, value=i + 10)
+
+latencies = []
+server.set_latency_hook(latencies.append)
+
+print(itf._silence_ms, timer.armed)
+
+# nothing queued: process returns at once without waiting
+print(server.process(), server.wait_for_frame(timeout_ms=5))
+
+# a frame split over two idle interrupts is only queued after the silence
+uart.feed(frame(server, b"\x04\x00\x00\x00\x04")[:5])
+print(timer.armed, server.process())
+uart.feed(frame(server, b"\x04\x00\x00\x00\x04")[5:])
+print(timer.armed, itf._rx_received)
+timer.fire()
+print(server.wait_for_frame(timeout_ms=5), server.process())
+print(uart.take())
+print(len(latencies), latencies[0] >= 0)
+
+# silence timer does not complete a frame while bytes are still pending
+req = frame(server, b"\x04\x00\x01\x00\x01")
+uart.feed(req[:3])
+uart._irq_handler = None
+uart.feed(req[3:])
+uart._irq_handler = itf._on_rx_idle_cb
+timer.fire()
+print(itf._frame_pending(), uart.any())
+uart.feed(b"")
+timer.fire()
+print(server.process(), uart.take())
+
+# two queued frames, the third one is dropped while the queue is full
+uart.feed(frame(server, b"\x04\x00\x01\x00\x01"))
+timer.fire()
+uart.feed(frame(server, b"\x04\x00\x02\x00\x01"))
+timer.fire()
+uart.feed(frame(server, b"\x04\x00\x03\x00\x01"))
+print(timer.armed, uart.any())
+print(server.process(), uart.take())
+print(server.process(), uart.take())
+print(server.process(), uart.take())
+
+# queued frames with a wrong unit address or CRC are ignored
+uart.feed(frame(server, b"\x04\x00\x00\x00\x01", unit=9))
+timer.fire()
+print(server.process(), uart.take())
+
+# the interrupt path does not allocate either
+req = frame(server, b"\x04\x00\x00\x00\x04")
+unit_map = server._unit_map
+gc.collect()
+gc.disable()
+before = gc.mem_alloc()
+for i in range(100):
+    uart.feed(req)
+    timer.fire()
+    itf.get_request(unit_addr_map=unit_map)
+print(gc.mem_alloc() - before)
+gc.enable()
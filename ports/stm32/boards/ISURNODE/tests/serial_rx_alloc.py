@@ -0,0 +1,67 @@
+# Test that receiving and decoding RTU requests does not allocate.
+
+import gc
+import fakes
+
+fakes.install()
+
+from fakes.modbus_link import frame
+from lib.umodbus.serial import ModbusRTU
+
+
+server = ModbusRTU(addr=1, baudrate=115200, uart_id=1)
+itf = server._itf
+uart = itf._uart
+unit_map = server._unit_map
+
+frames = (
+    frame(server, b"\x03\x00\xc8\x00\x7d"),
+    frame(server, b"\x04\x00\x00\x00\x0a"),
+    frame(server, b"\x01\x00\x00\x07\xd0"),
+    frame(server, b"\x02\x00\x06\x00\x02"),
+    frame(server, b"\x03\x00\xc8\x00\x01", unit=2),
+)
+bad_crc = bytearray(frames[0])
+bad_crc[-1] ^= 0xFF
+bad_crc = bytes(bad_crc)
+
+# decoded fields
+for f in frames:
+    uart.feed(f)
+    req = itf.get_request(unit_addr_map=unit_map, timeout=0)
+    if req is None:
+        print(None)
+    else:
+        print(req.unit_addr, req.function, req.register_addr, req.quantity, req.data)
+
+uart.feed(bad_crc)
+print(itf.get_request(unit_addr_map=unit_map, timeout=0))
+
+# a write request still carries its data
+uart.feed(frame(server, b"\x10\x00\xc8\x00\x02\x04\x00\x01\x00\x02"))
+req = itf.get_request(unit_addr_map=unit_map, timeout=0)
+print(req.function, req.register_addr, req.quantity, bytes(req.data))
+
+# steady state: 1000 requests, no heap allocation at all
+gc.collect()
+gc.disable()
+before = gc.mem_alloc()
+count = 0
+for i in range(1000):
+    uart.feed(frames[i % 5] if i % 100 else bad_crc)
+    if itf.get_request(unit_addr_map=unit_map, timeout=0) is not None:
+        count += 1
+delta = gc.mem_alloc() - before
+gc.enable()
+print(count, delta)
+
+# a frame too short for its function is refused before it is decoded, the
+# receive buffer still holds the longer frame before it
+longer = frame(server, b"\x17\x00\xc8\x00\x01\x00\xc8\x00\x01\x02\x00\x09")
+for pdu in (b"\x03\x00\xc8", b"\x10\x00\xc8\x00\x02",
+            b"\x16\x00\xc8\x00\xff\x00",
+            b"\x17\x00\xc8\x00\x01\x00\xc8\x00"):
+    uart.feed(longer)
+    itf.get_request(unit_addr_map=unit_map, timeout=0)
+    uart.feed(frame(server, pdu))
+    print(itf.get_request(unit_addr_map=unit_map, timeout=0), uart.take())
@@ -0,0 +1,72 @@
+# Test the SHT30 periodic mode and its integer x100 values.
+
+import fakes
+
+machine = fakes.install()
+
+from machine import I2C
+from fakes.sht30 import SHT30 as FakeSHT30
+from fakes.modbus_link import request
+from lib.SHT30 import SHT30
+from lib.umodbus.serial import ModbusRTU
+from modules import utils
+from modules.sht30_sensor import SHT30Sensor, SHT30Periodic
+
+utils.LOG_LEVEL = "CRITICAL"
+
+
+fake = FakeSHT30()
+I2C.attach(1, 0x44, fake)
+
+server = ModbusRTU(addr=1, uart_id=1)
+uart = server._itf._uart
+server.add_bank("IREGS", 0, 10)
+
+sensor = SHT30Sensor(i2c_bus=I2C(1))
+periodic = SHT30Periodic(sensor, server, address=8, mps=2)
+print(periodic.running, fake.periodic, fake.commands)
+
+# no measurement taken yet, poll() does not wait for one
+print(periodic.poll(), periodic.misses)
+
+fake.t_raw = 0x6666
+fake.rh_raw = 0x8000
+fake.measure()
+print(periodic.poll(), periodic.temperature, periodic.humidity)
+print(request(server, b"\x04\x00\x08\x00\x02"))
+
+# a measurement is only fetched once
+print(periodic.poll(), periodic.fetches, periodic.misses)
+
+# below 0 C the register holds the two's complement
+fake.t_raw = 0x1000
+fake.measure()
+print(periodic.poll(), periodic.temperature, server.get_ireg(8))
+
+# the integer values are the float conversion rounded down to 2 decimals
+for raw in (0, 1, 0x1000, 0x4000, 0x6666, 0x8000, 0xFFFF):
+    data = bytes([raw >> 8, raw & 0xFF, 0, raw >> 8, raw & 0xFF, 0])
+    t = ((raw * 175) / 0xFFFF) - 45
+    rh = (raw * 100.0) / 0xFFFF
+    print(raw, SHT30.temperature_x100(data), "%.3f" % t,
+          SHT30.humidity_x100(data), "%.3f" % rh)
+
+# a corrupted response is counted as an error
+fake.measure()
+fake._latest[2] ^= 1
+print(periodic.poll(), periodic.errors, periodic.temperature)
+
+# only the supported rates
+try:
+    sensor.sensor.start_periodic(3)
+except ValueError as e:
+    print("ValueError", e)
+
+periodic.stop()
+fake.measure()
+print(periodic.poll(), fake.periodic, fake.commands[-1])
+
+# without the sensor nothing is polled
+del I2C._buses[1][0x44]
+missing = SHT30Periodic(SHT30Sensor(i2c_bus=I2C(1)), server)
+print(missing.running, missing.poll())
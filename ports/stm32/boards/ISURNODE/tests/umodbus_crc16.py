@@ -0,0 +1,41 @@
+# Test the Python and, if built in, the native Modbus CRC16.
+
+import fakes
+
+fakes.install()
+
+from lib.umodbus import functions
+from lib.umodbus.serial import Serial
+
+implementations = [functions.crc16_modbus]
+try:
+    from _umodbus import crc16_modbus
+
+    implementations.append(crc16_modbus)
+except ImportError:
+    pass
+
+buf = bytearray(range(256))
+
+
+def vectors(crc16):
+    return (
+        crc16(b"123456789"),
+        crc16(b"xx123456789", offset=2),
+        crc16(b"123456789", 0xFFFF, 0, 4),
+        crc16(memoryview(buf)[10:], length=20),
+        crc16(b""),
+        crc16(buf, 0x1234, 256),
+        crc16(buf, crc16(buf, 0xFFFF, 0, 100), 100, 153),
+        crc16(buf, 0xFFFF, 0, 253),
+    )
+
+
+results = [vectors(crc16) for crc16 in implementations]
+print([hex(crc) for crc in results[0]])
+# the native version, if present, gives the same results
+print(all(r == results[0] for r in results))
+
+itf = Serial(uart_id=1)
+print(itf._calculate_crc16(b"\x01\x04\x00\x00\x00\x04"))
+print(hex(itf._crc16(b"\x01\x04\x00\x00\x00\x04\xff\xff", 6)))
@@ -0,0 +1,83 @@
+# Test the timer driven valve pulse scheduler.
+
+import fakes
+
+machine = fakes.install()
+
+from machine import Pin
+from modules.valves import ValveScheduler, OPEN, CLOSE
+
+
+def pins(n):
+    return [(Pin("IN1_{}".format(i), Pin.OUT), Pin("IN2_{}".format(i), Pin.OUT))
+            for i in range(n)]
+
+
+def outputs():
+    return " ".join("{}{}".format(a.value(), b.value()) for a, b in bridges)
+
+
+def step(ms):
+    machine.run_timers(ms)
+    print("t={:4} {} active={}".format(machine.now_ms(), outputs(),
+                                       valves.active))
+
+
+bridges = pins(4)
+valves = ValveScheduler(bridges, queue_size=2)
+
+# an open pulse drives IN1, the close pulse queued behind it IN2
+print(valves.open(0, duration_ms=100), valves.close(0, duration_ms=50, delay_ms=20))
+print(valves.open(0), valves.valves[0].queued())
+step(1)
+step(99)
+step(20)
+step(50)
+print(valves.busy(), valves.valves[0].pulse_count)
+
+# several valves pulse concurrently
+valves.open(1, duration_ms=100)
+valves.close(2, duration_ms=100)
+step(1)
+step(100)
+
+# staggered pulses of all valves
+print(valves.pulse_all(OPEN, duration_ms=30, stagger_ms=20))
+for i in range(6):
+    step(20)
+print(valves.busy())
+
+# limit the number of drivers on at the same time
+valves = ValveScheduler(bridges, max_active=2)
+print(valves.pulse_all(CLOSE, duration_ms=40))
+step(1)
+step(40)
+step(40)
+print(valves.busy(), [v.pulse_count for v in valves.valves])
+
+# cancel switches the driver off and frees its slot
+valves.open(0, duration_ms=100)
+valves.open(1, duration_ms=100)
+valves.open(2, duration_ms=100)
+step(1)
+valves.cancel(0)
+print(outputs(), valves.active, valves.busy(0))
+step(1)
+valves.cancel()
+print(outputs(), valves.active, valves.busy())
+
+# Modbus requests are served while a valve is driven
+from fakes.modbus_link import request
+from lib.umodbus.serial import ModbusRTU
+
+server = ModbusRTU(addr=1, uart_id=1)
+server.add_hreg(address=200, value=0)
+valves.open(3, duration_ms=500)
+step(1)
+print(request(server, b"\x03\x00\xc8\x00\x01"), outputs())
+step(500)
+
+try:
+    ValveScheduler(bridges, queue_size=0)
+except ValueError as e:
+    print("ValueError", e)